@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from bench_length import hamiltonian_cycle, place_snake, MOVES
+
+# Suite de benchmarks des environnements, avec garde-fou contre les régressions.
+#
+#   python bench_envs.py                      -> mesure et compare à bench_baseline.json
+#   python bench_envs.py --save-baseline      -> mesure et enregistre la référence
+#   python bench_envs.py --quick              -> version courte (quelques secondes)
+#
+# Le script sort avec le code 1 si une mesure est plus lente que la référence
+# au-delà du seuil (--threshold), pour le lancer avant un long entraînement.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SCRIPT_DIR, "bench_baseline.json")
+DEFAULT_OUTPUT = os.path.join(SCRIPT_DIR, "bench_results.json")
+
+ENV_CLASSES = [SnakeEnv, SnakeEnvCnn]
+LENGTHS = {"court": 3, "long": 500}
+
+
+def summarize(durations_ns):
+    """
+    Débit et percentiles de latence à partir des durées de chaque appel (ns).
+    Le débit est calculé sur la latence médiane : bien moins bruité que la moyenne,
+    c'est lui qui sert de garde-fou contre les régressions.
+    """
+    d = np.asarray(durations_ns, dtype=np.float64) / 1e3  # en µs
+    return {
+        "ops_per_sec": float(1e6 / np.median(d)),
+        "mean_us": float(d.mean()),
+        "p50_us": float(np.percentile(d, 50)),
+        "p90_us": float(np.percentile(d, 90)),
+        "p99_us": float(np.percentile(d, 99)),
+        "n": int(d.size),
+    }
+
+
+def time_calls(fn, n, setup=None, setup_every=None):
+    """Chronomètre `n` appels de fn(i) un par un ; `setup` est relancé hors chrono"""
+    durations = []
+    clock = time.perf_counter_ns
+    for i in range(n):
+        if setup is not None and setup_every and i % setup_every == 0:
+            setup()
+        start = clock()
+        fn(i)
+        durations.append(clock() - start)
+    return durations
+
+
+def bench_env(env_cls, length, n):
+    """Step, observation, collision, pomme et snapshot/restore pour un serpent de `length` cases"""
+    env = env_cls()
+    env.reset(seed=0)
+    cycle = hamiltonian_cycle(env.grid_w, env.grid_h)
+    actions = [MOVES[(cycle[(i + 1) % len(cycle)][0] - x, cycle[(i + 1) % len(cycle)][1] - y)]
+               for i, (x, y) in enumerate(cycle)]
+    # Le serpent suit le cycle : il ne meurt pas et ne mange pas pendant une série
+    steps_per_setup = 200
+    state = {"pos": 0}
+
+    def setup():
+        place_snake(env, cycle, length)
+        state["pos"] = length - 1
+
+    def step(_):
+        env.step(actions[state["pos"]])
+        state["pos"] = (state["pos"] + 1) % len(cycle)
+
+    def collision(i):
+        hx, hy = env.head
+        env._is_collision([hx + (i % 3) - 1, hy + 1])
+
+    results = {}
+    results["step"] = summarize(time_calls(step, n, setup, steps_per_setup))
+    setup()
+    results["observation"] = summarize(time_calls(lambda _: env._get_observation(), n))
+    results["collision"] = summarize(time_calls(collision, n))
+    results["food"] = summarize(time_calls(lambda _: env._place_food(), n))
+    # Snapshot / restore / clone : le coût d'une branche pour un planificateur
+    state = env.snapshot()
+    results["snapshot"] = summarize(time_calls(lambda _: env.snapshot(), n))
+    results["restore"] = summarize(time_calls(lambda _: env.restore(state), n))
+    results["clone"] = summarize(time_calls(lambda _: env.clone(), max(n // 10, 100)))
+    env.close()
+    return results
+
+
+def bench_vec_env(env_cls, vec_env_cls, n_envs, n_steps):
+    """Débit d'un env vectorisé (pas d'env par seconde) avec des actions aléatoires"""
+    env = make_vec_env(env_cls, n_envs=n_envs, seed=0, vec_env_cls=vec_env_cls)
+    actions = np.random.default_rng(0).integers(0, 4, size=(n_steps, n_envs))
+    env.reset()
+    for t in range(min(50, n_steps)):  # Échauffement
+        env.step(actions[t])
+    durations = time_calls(lambda t: env.step(actions[t]), n_steps)
+    env.close()
+    result = summarize(durations)
+    # Un appel step() fait avancer n_envs parties
+    result["ops_per_sec"] *= n_envs
+    return result
+
+
+def run_suite(quick, workers):
+    n = 2000 if quick else 20000
+    n_vec = 200 if quick else 2000
+    results = {}
+    for env_cls in ENV_CLASSES:
+        env = env_cls()
+        stats = summarize(time_calls(lambda i: env.reset(seed=i), max(n // 10, 100)))
+        results[f"{env_cls.__name__}/reset"] = stats
+        print(f"{env_cls.__name__:>12} {'reset':>11} {'':>5} : "
+              f"{stats['ops_per_sec']:>12.0f} ops/s  p50 {stats['p50_us']:7.2f} us  p99 {stats['p99_us']:7.2f} us")
+        env.close()
+        for label, length in LENGTHS.items():
+            for op, stats in bench_env(env_cls, length, n).items():
+                results[f"{env_cls.__name__}/{op}/{label}"] = stats
+                print(f"{env_cls.__name__:>12} {op:>11} {label:>5} : "
+                      f"{stats['ops_per_sec']:>12.0f} ops/s  p50 {stats['p50_us']:7.2f} us  p99 {stats['p99_us']:7.2f} us")
+    for env_cls in ENV_CLASSES:
+        for vec_env_cls in (DummyVecEnv, SubprocVecEnv):
+            for n_envs in workers:
+                key = f"{env_cls.__name__}/{vec_env_cls.__name__}/{n_envs}"
+                stats = bench_vec_env(env_cls, vec_env_cls, n_envs, n_vec)
+                results[key] = stats
+                print(f"{key:>32} : {stats['ops_per_sec']:>12.0f} pas/s  p50 {stats['p50_us']:8.1f} us/appel")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Liste des mesures dont le débit a baissé de plus de `threshold` (ex: 0.2 = 20%)"""
+    regressions = []
+    for key, ref in baseline["results"].items():
+        if key not in results:
+            continue
+        ratio = results[key]["ops_per_sec"] / ref["ops_per_sec"]
+        if ratio < 1 - threshold:
+            regressions.append((key, ref["ops_per_sec"], results[key]["ops_per_sec"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de SnakeEnv / SnakeEnvCnn")
+    parser.add_argument("--quick", action="store_true", help="Moins d'itérations (test rapide)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Nombres d'envs pour DummyVecEnv / SubprocVecEnv")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Fichier JSON des résultats")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichier JSON de référence")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Baisse de débit tolérée (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistrer ces mesures comme référence")
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # --quick fait moins d'itérations : ses débits ne sont pas comparables à ceux d'un run complet
+        baseline_quick = baseline.get("meta", {}).get("quick", False)
+        if baseline_quick != args.quick:
+            print(f"!!! {args.baseline} a été mesurée {'avec' if baseline_quick else 'sans'} --quick : "
+                  f"relancez {'avec' if baseline_quick else 'sans'} --quick, "
+                  f"ou refaites la référence avec --save-baseline.")
+            return 2
+
+    results = run_suite(args.quick, args.workers)
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRésultats enregistrés dans : {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Référence enregistrée dans : {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("Pas de référence : lancez avec --save-baseline pour en créer une.")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n!!! {len(regressions)} RÉGRESSION(S) (seuil {args.threshold:.0%}) :")
+        for key, ref, new, ratio in regressions:
+            print(f"  {key} : {ref:.0f} -> {new:.0f} ops/s ({ratio - 1:+.0%})")
+        return 1
+    print(f"\nAucune régression par rapport à {args.baseline} (seuil {args.threshold:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":  # Obligatoire pour SubprocVecEnv
+    sys.exit(main())
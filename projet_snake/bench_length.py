@@ -0,0 +1,66 @@
+import time
+from collections import deque
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from expert import hamiltonian_cycle
+
+# Benchmark : temps moyen d'un step() selon la longueur du serpent.
+# Le serpent suit un cycle hamiltonien de la grille : il ne se mord jamais,
+# on peut donc mesurer des serpents très longs sans qu'ils meurent.
+
+LENGTHS = [3, 50, 100, 200, 300, 400, 500]
+STEPS_PER_RUN = 200
+RUNS = 20
+
+# Direction (0: Gauche, 1: Droite, 2: Haut, 3: Bas) pour aller d'une case voisine à l'autre
+MOVES = {(-1, 0): 0, (1, 0): 1, (0, -1): 2, (0, 1): 3}
+
+
+def place_snake(env, cycle, length):
+    """Place un serpent de `length` cases le long du cycle (tête = cycle[length - 1])"""
+    env.reset()
+    body = [cycle[i] for i in range(length - 1, -1, -1)]
+    env.snake = deque(env._cell(x, y) for x, y in body)
+    env.occupied = bytearray(env.grid_w * env.grid_h)
+    env.free_cells.reset()
+    for cell in env.snake:
+        env.occupied[cell] = 1
+        env.free_cells.remove(cell)
+    env.head = list(body[0])
+    dx, dy = body[0][0] - body[1][0], body[0][1] - body[1][1]
+    env.direction = MOVES[(dx, dy)]
+    # Pomme juste derrière la queue : le serpent ne la mange pas pendant la mesure
+    env.food = list(cycle[-1])
+    env.frame_iteration = 0
+    if hasattr(env, "prev_distance"):
+        env.prev_distance = env._get_distance()
+    if hasattr(env, "grid"):
+        env._draw_grid()
+
+
+def bench(env_cls, length):
+    env = env_cls()
+    cycle = hamiltonian_cycle(env.grid_w, env.grid_h)
+    actions = []
+    for i in range(len(cycle)):
+        (x0, y0), (x1, y1) = cycle[i], cycle[(i + 1) % len(cycle)]
+        actions.append(MOVES[(x1 - x0, y1 - y0)])
+
+    total = 0.0
+    for _ in range(RUNS):
+        place_snake(env, cycle, length)
+        pos = length - 1
+        start = time.perf_counter()
+        for _ in range(STEPS_PER_RUN):
+            _, _, done, _, _ = env.step(actions[pos])
+            pos = (pos + 1) % len(cycle)
+            assert not done, "Le serpent ne devrait jamais mourir sur le cycle"
+        total += time.perf_counter() - start
+    return total / (RUNS * STEPS_PER_RUN) * 1e6
+
+
+if __name__ == "__main__":
+    print(f"{'Longueur':>8} | {'SnakeEnv (us/step)':>18} | {'SnakeEnvCnn (us/step)':>21}")
+    print("-" * 54)
+    for length in LENGTHS:
+        print(f"{length:>8} | {bench(SnakeEnv, length):>18.2f} | {bench(SnakeEnvCnn, length):>21.2f}")
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import numpy as np
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from envs.thread_vec_env import ThreadVecEnv, gil_enabled
+
+# Benchmark : débit (pas/s) de DummyVecEnv vs SubprocVecEnv vs ThreadVecEnv, pour SnakeEnv et SnakeEnvCnn.
+# ThreadVecEnv n'est parallèle que sur un CPython free-threaded sans GIL (ex: python3.14t) :
+#   python3.14t -X gil=0 bench_thread_vec_env.py
+# Avec le GIL, il retombe sur le pas séquentiel de DummyVecEnv ; la colonne "forcé" montre
+# alors ce que coûtent des threads qui se disputent le GIL.
+
+N_ENVS = [4, 8, 16]
+STEPS = 2000  # Pas par environnement (après échauffement)
+
+
+def bench(env_cls, vec_env_cls, n_envs, **vec_env_kwargs):
+    env = make_vec_env(env_cls, n_envs=n_envs, seed=0, vec_env_cls=vec_env_cls, vec_env_kwargs=vec_env_kwargs)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 4, size=(STEPS + 100, n_envs))
+    env.reset()
+    for t in range(100):
+        env.step(actions[t])
+    start = time.perf_counter()
+    for t in range(100, STEPS + 100):
+        env.step(actions[t])
+    elapsed = time.perf_counter() - start
+    env.close()
+    return STEPS * n_envs / elapsed
+
+
+if __name__ == "__main__":  # Obligatoire pour SubprocVecEnv (pas pour ThreadVecEnv)
+    print(f"Python {sys.version.split()[0]}, GIL {'actif' if gil_enabled() else 'désactivé'}, "
+          f"{os.cpu_count()} coeurs\n")
+    print(f"{'Env':>11} | {'Envs':>4} | {'Dummy (pas/s)':>13} | {'Subproc (pas/s)':>15} | "
+          f"{'Thread (pas/s)':>14} | {'Thread forcé (pas/s)':>20}")
+    print("-" * 94)
+    for env_cls in (SnakeEnv, SnakeEnvCnn):
+        for n_envs in N_ENVS:
+            dummy = bench(env_cls, DummyVecEnv, n_envs)
+            subproc = bench(env_cls, SubprocVecEnv, n_envs)
+            thread = bench(env_cls, ThreadVecEnv, n_envs)
+            forced = bench(env_cls, ThreadVecEnv, n_envs, force_threads=True)
+            print(f"{env_cls.__name__:>11} | {n_envs:>4} | {dummy:>13.0f} | {subproc:>15.0f} | "
+                  f"{thread:>14.0f} | {forced:>20.0f}")
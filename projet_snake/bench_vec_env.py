@@ -0,0 +1,37 @@
+import time
+import numpy as np
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import SubprocVecEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from envs.shared_memory_vec_env import SharedMemoryVecEnv
+
+# Benchmark : débit (pas/s) de SubprocVecEnv vs SharedMemoryVecEnv sur SnakeEnvCnn.
+# SubprocVecEnv picke chaque observation (1, 30, 30) dans un pipe à chaque pas,
+# SharedMemoryVecEnv la laisse en mémoire partagée.
+
+N_WORKERS = [8, 16, 32]
+STEPS = 2000  # Pas par environnement (après échauffement)
+
+
+def bench(vec_env_cls, n_envs):
+    env = make_vec_env(SnakeEnvCnn, n_envs=n_envs, seed=0, vec_env_cls=vec_env_cls)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 4, size=(STEPS + 100, n_envs))
+    env.reset()
+    for t in range(100):
+        env.step(actions[t])
+    start = time.perf_counter()
+    for t in range(100, STEPS + 100):
+        env.step(actions[t])
+    elapsed = time.perf_counter() - start
+    env.close()
+    return STEPS * n_envs / elapsed
+
+
+if __name__ == "__main__":  # Obligatoire : les workers sont des processus
+    print(f"{'Workers':>7} | {'SubprocVecEnv (pas/s)':>21} | {'SharedMemoryVecEnv (pas/s)':>26} | {'Gain':>5}")
+    print("-" * 70)
+    for n_envs in N_WORKERS:
+        subproc = bench(SubprocVecEnv, n_envs)
+        shared = bench(SharedMemoryVecEnv, n_envs)
+        print(f"{n_envs:>7} | {subproc:>21.0f} | {shared:>26.0f} | x{shared / subproc:.2f}")
@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+from stable_baselines3.common.buffers import RolloutBuffer
+
+from envs.snake_env_cnn import CELL_VALUES
+
+# Tableaux d'un RolloutBuffer, tous de forme (n_steps, n_envs, ...)
+ROLLOUT_ARRAYS = ("observations", "actions", "rewards", "returns", "episode_starts", "values", "log_probs", "advantages")
+# Ceux que get() lit pour les minibatchs
+SAMPLED_ARRAYS = ("observations", "actions", "values", "log_probs", "advantages", "returns")
+
+
+def palette_tables(cell_values):
+    """
+    Tables de compactage pour une palette de valeurs de cases :
+    (bits par case, cases par octet, décalages, valeur -> numéro, octet -> ses cases en valeurs).
+    """
+    cell_values = np.asarray(cell_values, dtype=np.uint8)
+    bits = max(int(np.ceil(np.log2(len(cell_values)))), 1)
+    bits = 1 << int(np.ceil(np.log2(bits)))  # 1, 2, 4 ou 8 : un octet = un nombre entier de cases
+    per_byte = 8 // bits
+    shifts = (np.arange(per_byte) * bits).astype(np.uint8)
+    codes = np.full(256, len(cell_values), dtype=np.uint8)  # Valeur -> numéro (hors palette : len)
+    codes[cell_values] = np.arange(len(cell_values))
+    # Octet -> ses per_byte cases, déjà en valeurs de l'env
+    byte_codes = (np.arange(256, dtype=np.uint8)[:, None] >> shifts) & ((1 << bits) - 1)
+    decode = np.append(cell_values, 0).astype(np.uint8)[np.minimum(byte_codes, len(cell_values))]
+    return bits, per_byte, shifts, codes, decode
+
+
+class PackedRolloutBuffer(RolloutBuffer):
+    """
+    RolloutBuffer qui garde les observations compactées : plusieurs cases par octet au lieu d'une.
+
+    Une case de SnakeEnvCnn ne prend que len(cell_values) valeurs (vide, corps/mur, tête, pomme) :
+    on stocke son numéro dans la palette sur `bits` bits (2 ici, donc 4 cases par octet).
+    Une observation (K, 30, 30) passe de 900*K octets (uint8 ; 3600*K en float32 dans les SB3 plus
+    anciens) à 225*K. Les minibatchs sont décodés à la sortie (_get_samples) par une table
+    octet -> cases, en uint8 comme avant : le réseau voit exactement les mêmes observations,
+    l'apprentissage ne change pas.
+
+    À passer à PPO : rollout_buffer_class=PackedRolloutBuffer (SnakeEnvCnn ou SnakeVecEnv "grid").
+    """
+
+    def __init__(self, *args, cell_values=CELL_VALUES, **kwargs):
+        self.cell_values = np.asarray(cell_values, dtype=np.uint8)
+        self.bits, self.per_byte, self.shifts, self.codes, self.decode = palette_tables(self.cell_values)
+        super().__init__(*args, **kwargs)  # Appelle reset() : tout doit être prêt avant
+        self.n_cells = int(np.prod(self.obs_shape))
+
+    def reset(self):
+        super().reset()
+        n_bytes = -(-int(np.prod(self.obs_shape)) // self.per_byte)
+        # Remplace le tableau (buffer_size, n_envs, *obs_shape) alloué par RolloutBuffer
+        self.observations = np.zeros((self.buffer_size, self.n_envs, n_bytes), dtype=np.uint8)
+
+    def pack(self, obs):
+        """(n, *obs_shape) -> (n, octets)"""
+        obs = np.asarray(obs).reshape(len(obs), -1)
+        codes = self.codes[obs]
+        if codes.max() >= len(self.cell_values):
+            raise ValueError(f"Valeur de case hors palette {self.cell_values.tolist()} : "
+                             f"{sorted(set(obs.ravel().tolist()) - set(self.cell_values.tolist()))}")
+        padding = -codes.shape[1] % self.per_byte
+        if padding:
+            codes = np.pad(codes, ((0, 0), (0, padding)))
+        packed = codes[:, ::self.per_byte].copy()
+        for i in range(1, self.per_byte):
+            packed |= codes[:, i::self.per_byte] << self.shifts[i]
+        return packed
+
+    def unpack(self, packed):
+        """(n, octets) -> (n, *obs_shape), mêmes valeurs uint8 que l'env"""
+        cells = self.decode[packed].reshape(len(packed), -1)[:, :self.n_cells]
+        return cells.reshape(len(packed), *self.obs_shape)
+
+    def add(self, obs, *args, **kwargs):
+        # RolloutBuffer.add recopie obs dans self.observations[pos] : on lui donne la version compacte
+        super().add(self.pack(obs), *args, **kwargs)
+
+    def _get_samples(self, batch_inds, env=None):
+        samples = super()._get_samples(batch_inds, env)
+        return samples._replace(observations=self.to_torch(self.unpack(self.observations[batch_inds])))
+
+
+class MemmapStorage:
+    """
+    À mettre devant un RolloutBuffer (voir MemmapRolloutBuffer) : tous ses tableaux (observations,
+    actions, récompenses, valeurs...) vivent dans des fichiers .npy ouverts en np.memmap sur le disque
+    local, au lieu de la RAM. Le système garde en cache ce qu'il peut et écrit le reste sur le disque :
+    n_steps x n_envs n'est plus limité par la mémoire.
+
+    Deux différences avec get() de SB3, pour ne jamais recopier le buffer entier en RAM :
+      - pas de swap_and_flatten (une copie) : les minibatchs lisent des vues à plat (pas * n_envs + env) ;
+      - chaque minibatch est fait de blocs CONTIGUS de chunk_size lignes (défaut : batch_size, donc une
+        seule lecture séquentielle), tirés dans un ordre aléatoire. Un bloc = plusieurs pas de toutes
+        les parties à la suite ; un chunk_size plus petit mélange davantage (plus de lectures).
+
+    Avec persist_dir, chaque rollout terminé (retours et avantages calculés) est gardé dans
+    persist_dir/rollout_000000/, ... : les fichiers sont simplement déplacés (pas de copie) et
+    relus avec StoredRollout, pour l'analyse hors ligne ou le rejeu.
+    """
+
+    def __init__(self, *args, storage_dir=None, persist_dir=None, chunk_size=None, **kwargs):
+        # Un dossier par buffer (plusieurs entraînements peuvent partager storage_dir), effacé avec lui
+        if storage_dir is not None:
+            os.makedirs(storage_dir, exist_ok=True)
+        self.storage_dir = tempfile.mkdtemp(prefix="rollout_", dir=storage_dir)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.storage_dir, True)
+        self.persist_dir = persist_dir
+        self.chunk_size = chunk_size
+        self.maps = {}
+        self.rollouts_saved = 0
+        super().__init__(*args, **kwargs)  # Appelle reset()
+
+    def reset(self):
+        super().reset()  # Tableaux en RAM (np.zeros : pages jamais touchées, donc jamais allouées)
+        for name in ROLLOUT_ARRAYS:
+            array = self.__dict__[name]
+            mapped = self.maps.get(name)
+            if mapped is None or mapped.shape != array.shape or mapped.dtype != array.dtype:
+                # Pas besoin de remettre à zéro : add() réécrit chaque ligne avant que le buffer soit plein
+                mapped = np.lib.format.open_memmap(os.path.join(self.storage_dir, name + ".npy"),
+                                                   mode="w+", dtype=array.dtype, shape=array.shape)
+                self.maps[name] = mapped
+            self.__dict__[name] = mapped
+
+    def compute_returns_and_advantage(self, *args, **kwargs):
+        super().compute_returns_and_advantage(*args, **kwargs)
+        if self.persist_dir is not None:
+            self.persist()
+
+    def persist(self):
+        """Déplace les fichiers du rollout en cours dans persist_dir (ils restent lisibles par get())"""
+        path = os.path.join(self.persist_dir, f"rollout_{self.rollouts_saved:06d}")
+        os.makedirs(path, exist_ok=True)
+        for name, mapped in self.maps.items():
+            mapped.flush()
+            shutil.move(mapped.filename, os.path.join(path, name + ".npy"))
+        meta = {"buffer_size": self.buffer_size, "n_envs": self.n_envs, "obs_shape": list(self.obs_shape),
+                "obs_dtype": self.observation_space.dtype.name, "gamma": self.gamma, "gae_lambda": self.gae_lambda}
+        if isinstance(self, PackedRolloutBuffer):
+            meta["cell_values"] = self.cell_values.tolist()
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        self.maps = {}  # Le prochain reset() crée de nouveaux fichiers
+        self.rollouts_saved += 1
+        return path
+
+    def get(self, batch_size=None):
+        assert self.full, ""
+        n = self.buffer_size * self.n_envs
+        if not self.generator_ready:
+            for name in SAMPLED_ARRAYS:
+                array = self.__dict__[name]
+                self.__dict__[name] = array.reshape(n, *array.shape[2:])  # Vue, pas de copie
+            self.generator_ready = True
+        if batch_size is None:
+            batch_size = n
+        chunk = min(self.chunk_size or batch_size, batch_size)
+        per_batch = max(batch_size // chunk, 1)
+        starts = np.random.permutation(-(-n // chunk)) * chunk
+        for i in range(0, len(starts), per_batch):
+            group = np.sort(starts[i:i + per_batch])  # Lus dans l'ordre du fichier
+            if len(group) == 1:
+                batch_inds = slice(group[0], min(group[0] + chunk, n))
+            else:
+                batch_inds = np.concatenate([np.arange(start, min(start + chunk, n)) for start in group])
+            yield self._get_samples(batch_inds)
+
+
+class MemmapRolloutBuffer(MemmapStorage, RolloutBuffer):
+    """
+    RolloutBuffer sur disque (voir MemmapStorage). À passer à PPO :
+      rollout_buffer_class=MemmapRolloutBuffer,
+      rollout_buffer_kwargs=dict(storage_dir="/chemin/disque/local", persist_dir=None, chunk_size=None)
+    """
+
+
+class PackedMemmapRolloutBuffer(MemmapStorage, PackedRolloutBuffer):
+    """PackedRolloutBuffer sur disque : observations à 2 bits par case, dans des fichiers memmap"""
+
+
+class StoredRollout:
+    """
+    Un rollout gardé par MemmapStorage(persist_dir=...) : chaque tableau (n_steps, n_envs, ...) est
+    ouvert en lecture seule sans être chargé (rollout.rewards, rollout.values...).
+    observations_at(pas) renvoie les observations décodées, comme l'env les a données.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in ROLLOUT_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+        self.obs_shape = tuple(self.meta["obs_shape"])
+        self.decode = palette_tables(self.meta["cell_values"])[4] if "cell_values" in self.meta else None
+
+    def observations_at(self, steps):
+        """Observations des pas demandés (entier, slice ou indices) : (..., n_envs, *obs_shape)"""
+        obs = np.asarray(self.observations[steps])
+        if self.decode is None:
+            return obs
+        cells = self.decode[obs].reshape(*obs.shape[:-1], -1)[..., :int(np.prod(self.obs_shape))]
+        return cells.reshape(*obs.shape[:-1], *self.obs_shape)
@@ -0,0 +1,468 @@
+import json
+import os
+import pickle
+import queue
+import signal
+import threading
+import time
+import zipfile
+from collections import deque
+
+import numpy as np
+import stable_baselines3 as sb3
+import torch as th
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import data_to_json
+from stable_baselines3.common.utils import get_system_info
+
+from envs.snake_env import board_dims
+from resume import RESUME_FILE, capture_training_state
+
+
+class TimingCallback(BaseCallback):
+    """
+    Découpe le temps d'entraînement PPO en :
+      - env_step       : env.step() (inclut l'attente des sous-processus avec SubprocVecEnv)
+      - policy_forward : passe avant du réseau pendant la collecte
+      - buffer_add     : ajout des transitions dans le rollout buffer
+      - train          : optimisation (epochs de descente de gradient)
+    et loggue tout dans TensorBoard (section "timing/"), à chaque mise à jour.
+
+    Pour mesurer sans toucher à SB3, le callback enveloppe les 3 appels de la collecte
+    au début de l'entraînement et les restaure à la fin. SB3 n'appelle pas la fin de
+    l'entraînement si learn() lève une exception : utilisé dans un `with`, le callback
+    restaure aussi les méthodes dans ce cas (restore() peut être appelé plusieurs fois).
+    L'optimisation est le temps
+    entre la fin d'une collecte et le début de la suivante ; elle est logguée avec la
+    collecte suivante, comme les métriques "train/" de SB3.
+    Coût : 2 appels à perf_counter par appel mesuré, négligeable devant un pas d'env :
+    on peut le laisser en production.
+
+    Utilisation :
+        with TimingCallback() as timing:
+            model.learn(..., callback=[checkpoint_callback, timing])
+    """
+
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self._totals = {"env_step": 0.0, "policy_forward": 0.0, "buffer_add": 0.0}
+        self._originals = []
+        self._rollout_start = 0.0
+        self._rollout_end = None
+        self._rollout_steps = 0
+
+    def _timed(self, obj, attr, key):
+        """Remplace obj.attr par une version chronométrée (cumul dans self._totals[key])"""
+        original = getattr(obj, attr)
+        totals = self._totals
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            result = original(*args, **kwargs)
+            totals[key] += clock() - start
+            return result
+
+        setattr(obj, attr, wrapper)
+        self._originals.append((obj, attr, wrapper))
+
+    def restore(self):
+        """Rend les méthodes d'origine (instance propre pour un model.save ou un autre learn)"""
+        for obj, attr, wrapper in reversed(self._originals):
+            # Seulement si notre version est encore en place : sans effet au deuxième appel
+            if vars(obj).get(attr) is wrapper:
+                delattr(obj, attr)
+        self._originals = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.restore()
+        return False
+
+    def _on_training_start(self):
+        # Un learn() précédent a pu s'arrêter sur une exception sans passer par _on_training_end
+        self.restore()
+        self._rollout_end = None
+        self._timed(self.model.env, "step", "env_step")
+        self._timed(self.model.policy, "forward", "policy_forward")
+        self._timed(self.model.rollout_buffer, "add", "buffer_add")
+
+    def _on_rollout_start(self):
+        if self._rollout_end is not None:
+            self._record_train(time.perf_counter() - self._rollout_end)
+        for key in self._totals:
+            self._totals[key] = 0.0
+        self._rollout_steps = 0
+        self._rollout_start = time.perf_counter()
+
+    def _on_step(self):
+        self._rollout_steps += 1
+        return True
+
+    def _on_rollout_end(self):
+        self._rollout_end = time.perf_counter()
+        rollout = self._rollout_end - self._rollout_start
+        env_step = self._totals["env_step"]
+        samples = self._rollout_steps * self.model.n_envs
+        self.logger.record("timing/rollout_s", rollout)
+        self.logger.record("timing/env_step_s", env_step)
+        self.logger.record("timing/policy_forward_s", self._totals["policy_forward"])
+        self.logger.record("timing/buffer_add_s", self._totals["buffer_add"])
+        # Le reste : conversions, callbacks, calcul des avantages...
+        self.logger.record("timing/rollout_other_s", rollout - sum(self._totals.values()))
+        # Vitesse des envs seuls, et vitesse de collecte complète (env + réseau + buffer)
+        self.logger.record("timing/env_steps_per_sec", samples / max(env_step, 1e-9))
+        self.logger.record("timing/rollout_samples_per_sec", samples / max(rollout, 1e-9))
+
+    def _record_train(self, elapsed):
+        # Chaque epoch repasse sur tout le rollout buffer
+        n_samples = self.model.n_epochs * self.model.n_steps * self.model.n_envs
+        self.logger.record("timing/train_s", elapsed)
+        self.logger.record("timing/train_samples_per_sec", n_samples / max(elapsed, 1e-9))
+
+    def _on_training_end(self):
+        # Dernière optimisation : plus de collecte après elle, on l'écrit tout de suite
+        if self._rollout_end is not None:
+            self._record_train(time.perf_counter() - self._rollout_end)
+            self.logger.dump(self.num_timesteps)
+        self.restore()
+
+
+def _copy_to_cpu(obj, out=None, memo=None):
+    """
+    Copie CPU de tous les tenseurs d'un state_dict (dicts et listes imbriqués compris).
+    Les tenseurs de `out` (copie précédente, même structure) sont réutilisés quand c'est
+    possible : recopier dans une mémoire déjà allouée est ~3x plus rapide (pas de défauts de page).
+    Un tenseur présent sous plusieurs noms (features extractor partagé de CnnPolicy)
+    n'est copié qu'une fois, et reste partagé dans le fichier comme avec model.save().
+    """
+    if memo is None:
+        memo = {}
+    if isinstance(obj, th.Tensor):
+        key = (obj.data_ptr(), obj.shape, obj.stride(), obj.dtype, obj.device)
+        if key not in memo:
+            if isinstance(out, th.Tensor) and out.shape == obj.shape and out.dtype == obj.dtype:
+                memo[key] = out.copy_(obj.detach())
+            else:
+                memo[key] = obj.detach().to("cpu", copy=True)
+        return memo[key]
+    if isinstance(obj, dict):
+        out = out if isinstance(out, dict) else {}
+        return {k: _copy_to_cpu(v, out.get(k), memo) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        out = out if isinstance(out, (list, tuple)) and len(out) == len(obj) else [None] * len(obj)
+        return type(obj)(_copy_to_cpu(v, o, memo) for v, o in zip(obj, out))
+    return obj
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Remplace CheckpointCallback sans bloquer l'entraînement : au moment de la sauvegarde,
+    on ne fait que copier les poids en mémoire (quelques ms) ; l'écriture du .zip se fait
+    dans un thread d'arrière-plan pendant que la collecte continue.
+
+    Deux formats, tous deux lisibles par PPO.load() (evaluate_checkpoints.py, test_play...) :
+      - "weights" : réseau seul, l'état d'Adam est remplacé par un état vide (fichier ~3x
+                    plus petit). Suffit pour évaluer ou jouer : {prefix}_weights_{pas}_steps.zip
+      - "full"    : comme model.save(), optimiseur compris, pour reprendre l'entraînement.
+                    Une sauvegarde sur `full_every` : {prefix}_{pas}_steps.zip
+
+    Rétention : on garde les `keep_last` derniers fichiers, le meilleur selon le score
+    (si keep_best) et toujours le dernier "full". Les autres sont supprimés au fil de l'eau.
+    Score : `eval_callback.last_mean_reward` si on passe un EvalCallback (placé AVANT ce
+    callback dans la liste), sinon la récompense moyenne des dernières parties d'entraînement.
+    La liste des fichiers gardés et leurs scores est dans {prefix}_checkpoints.json.
+
+    resumable=True : les sauvegardes "full" sont repoussées au début de la collecte suivante
+    (rollout buffer vide) et contiennent de quoi reprendre exactement l'entraînement (voir
+    resume.py). Un SIGTERM (préemption, kill) fait alors une dernière sauvegarde "full" à ce
+    même moment, puis arrête model.learn() proprement.
+
+    Utilisation : model.learn(..., callback=[AsyncCheckpointCallback(save_freq, save_path, "snake_cnn")])
+    """
+
+    def __init__(self, save_freq, save_path, name_prefix="rl_model", full_every=5, keep_last=5,
+                 keep_best=True, eval_callback=None, resumable=False, verbose=0):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.full_every = full_every
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.eval_callback = eval_callback
+        self.resumable = resumable
+        self.n_saves = 0
+        self.kept = []  # [{"path", "timesteps", "kind", "score", "n_saves"}], du plus ancien au plus récent
+        self.stopped = False  # True si l'entraînement a été arrêté par un SIGTERM
+        self._full_pending = False
+        self._stop_requested = False
+        self._previous_handler = None
+        self._queue = queue.Queue()
+        # Deux jeux de tenseurs CPU réutilisés d'une sauvegarde à l'autre : au plus 2 sauvegardes
+        # en cours, si le disque ne suit pas l'entraînement attend
+        self._buffers = queue.Queue()
+        for _ in range(2):
+            self._buffers.put({})
+        self._thread = None
+        self._error = None
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+        self._load_index()
+        self._thread = threading.Thread(target=self._writer, daemon=True, name="AsyncCheckpointWriter")
+        self._thread.start()
+
+    def _on_training_start(self):
+        self.stopped = self._stop_requested = False
+        if self.resumable and threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGTERM, self._on_sigterm)
+
+    def _on_sigterm(self, signum, frame):
+        print("SIGTERM reçu : dernier checkpoint à la fin de la mise à jour en cours, puis arrêt")
+        self._stop_requested = True
+
+    def _on_rollout_start(self):
+        # Entre deux mises à jour : le seul moment où l'état complet tient dans le checkpoint
+        if self._full_pending or self._stop_requested:
+            self.save(full=True, counted=not self._stop_requested)
+            self._full_pending = False
+            self.stopped = self._stop_requested
+
+    def _on_step(self):
+        if self._error is not None:
+            raise self._error
+        if self.stopped:
+            return False  # Arrête model.learn() : le checkpoint de reprise est déjà pris
+        if self.n_calls % self.save_freq == 0 and not self._full_pending:
+            if self.resumable and (self.n_saves + 1) % self.full_every == 0:
+                self._full_pending = True
+            else:
+                self.save()
+        return True
+
+    def _on_training_end(self):
+        if self._full_pending:
+            self.save(full=True)  # Fin d'entraînement : aussi entre deux mises à jour
+            self._full_pending = False
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
+        self.flush()
+
+    def save(self, full=None, counted=True):
+        """
+        Photo du modèle maintenant, écrite plus tard par le thread d'arrière-plan.
+        full=None : "full" une fois sur `full_every`. counted=False : sauvegarde en plus
+        (SIGTERM), qui ne décale pas la suite des sauvegardes.
+        """
+        if counted:
+            self.n_saves += 1
+        if full is None:
+            full = self.n_saves % self.full_every == 0
+        kind = "full" if full else "weights"
+        name = self.name_prefix if full else f"{self.name_prefix}_weights"
+        path = os.path.join(self.save_path, f"{name}_{self.num_timesteps}_steps.zip")
+
+        # Même contenu que BaseAlgorithm.save(), figé tout de suite (l'entraînement continue)
+        data = self.model.__dict__.copy()
+        exclude = set(self.model._excluded_save_params())
+        state_dicts_names, torch_variable_names = self.model._get_torch_save_params()
+        for torch_var in state_dicts_names + torch_variable_names:
+            exclude.add(torch_var.split(".")[0])
+        for param_name in exclude:
+            data.pop(param_name, None)
+        params = self.model.get_parameters()  # Références, copiées juste en dessous
+        if not full:
+            # Optimiseur "neuf" : mêmes hyperparamètres, sans les moments d'Adam (ni leur copie)
+            for name_ in params:
+                if name_.endswith("optimizer"):
+                    params[name_] = {"state": {}, "param_groups": params[name_]["param_groups"]}
+        buffers = self._buffers.get()
+        buffers[kind] = params = _copy_to_cpu(params, buffers.get(kind))
+        pytorch_variables = {name_: _copy_to_cpu(getattr(self.model, name_)) for name_ in torch_variable_names}
+        extra = {}
+        if full and self.resumable:
+            extra[RESUME_FILE] = pickle.dumps(capture_training_state(self.model))
+        entry = {"path": path, "timesteps": int(self.num_timesteps), "kind": kind, "score": self._score(),
+                 "n_saves": self.n_saves}
+        self._queue.put((entry, data_to_json(data), params, pytorch_variables or None, extra, buffers))
+
+    def flush(self):
+        """Attend que toutes les sauvegardes en attente soient écrites"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def _score(self):
+        if self.eval_callback is not None and np.isfinite(self.eval_callback.last_mean_reward):
+            return float(self.eval_callback.last_mean_reward)
+        episodes = self.model.ep_info_buffer
+        return float(np.mean([ep["r"] for ep in episodes])) if episodes else None
+
+    # ------------------------------------------------------------------
+    # Thread d'arrière-plan
+    # ------------------------------------------------------------------
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            entry, serialized_data, params, pytorch_variables, extra, buffers = item
+            try:
+                self._write_zip(entry, serialized_data, params, pytorch_variables, extra)
+                self._apply_retention(entry)
+            except Exception as error:  # Remonté au prochain pas d'entraînement
+                self._error = error
+            self._buffers.put(buffers)
+
+    def _write_zip(self, entry, serialized_data, params, pytorch_variables, extra):
+        """
+        Même archive que save_util.save_to_zip_file (+ les fichiers de `extra`, ignorés
+        par PPO.load), écrite à côté puis renommée (atomique)
+        """
+        tmp_path = entry["path"] + ".tmp"
+        with zipfile.ZipFile(tmp_path, mode="w") as archive:
+            archive.writestr("data", serialized_data)
+            if pytorch_variables is not None:
+                with archive.open("pytorch_variables.pth", mode="w", force_zip64=True) as f:
+                    th.save(pytorch_variables, f)
+            for file_name, state_dict in params.items():
+                with archive.open(file_name + ".pth", mode="w", force_zip64=True) as f:
+                    th.save(state_dict, f)
+            archive.writestr("_stable_baselines3_version", sb3.__version__)
+            archive.writestr("system_info.txt", get_system_info(print_info=False)[1])
+            for file_name, content in extra.items():
+                archive.writestr(file_name, content)
+        os.replace(tmp_path, entry["path"])
+        if self.verbose >= 1:
+            print(f"Checkpoint ({entry['kind']}) enregistré : {entry['path']}")
+
+    def _apply_retention(self, entry):
+        # Même nom (deux sauvegardes au même pas) : le fichier a été écrasé par la dernière
+        self.kept = [e for e in self.kept if e["path"] != entry["path"]] + [entry]
+        keep = {id(e) for e in self.kept[-self.keep_last:]}
+        fulls = [e for e in self.kept if e["kind"] == "full"]
+        if fulls:
+            keep.add(id(fulls[-1]))
+        scored = [e for e in self.kept if e["score"] is not None]
+        if self.keep_best and scored:
+            keep.add(id(max(scored, key=lambda e: (e["score"], e["timesteps"]))))
+        for e in self.kept:
+            if id(e) not in keep and os.path.exists(e["path"]):
+                os.remove(e["path"])
+        self.kept = [e for e in self.kept if id(e) in keep]
+
+        index_path = self._index_path()
+        with open(index_path + ".tmp", "w") as f:
+            json.dump([{**e, "path": os.path.basename(e["path"])} for e in self.kept], f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+
+    def _index_path(self):
+        return os.path.join(self.save_path, f"{self.name_prefix}_checkpoints.json")
+
+    def _load_index(self):
+        """
+        Reprise (resume.py) : on retrouve les fichiers gardés et le compte des sauvegardes
+        jusqu'au pas du modèle. Ceux d'après (perdus avec le run interrompu) seront réécrits.
+        """
+        self.kept = []
+        self.n_saves = 0
+        if not os.path.exists(self._index_path()) or self.model.num_timesteps == 0:
+            return
+        with open(self._index_path()) as f:
+            entries = json.load(f)
+        for e in entries:
+            path = os.path.join(self.save_path, e["path"])
+            if e["timesteps"] <= self.model.num_timesteps and os.path.exists(path):
+                self.kept.append({**e, "path": path})
+                self.n_saves = max(self.n_saves, e.get("n_saves", 0))
+
+
+class CurriculumCallback(BaseCallback):
+    """
+    Curriculum sur la taille du plateau : on commence sur un petit plateau (parties courtes,
+    la pomme est vite trouvée) et on l'agrandit quand le score moyen des `window` dernières
+    parties jouées sur le plateau actuel dépasse un seuil.
+
+        stages = [(8, 8), (12, 12), (20, 16), (30, None)]   # (taille, score pour passer au suivant)
+
+    Le nouveau plateau s'applique à chaque env à son prochain reset (set_grid_size de SnakeEnv /
+    SnakeEnvCnn). Pour le CNN, créer les envs avec obs_size = plateau final : les petits plateaux
+    sont centrés dans la même observation, le même réseau continue de s'entraîner.
+    L'env doit être créé directement sur le premier plateau (ou celui où une reprise s'est arrêtée).
+    SnakeVecEnv (toujours 30x30, sans set_grid_size) ne peut pas suivre un curriculum : ValueError.
+
+    target_score : note le nombre de pas et le temps d'entraînement (logs "curriculum/") quand le
+    score moyen sur le plateau final l'atteint. Avec stages = [(30, None)] (pas de curriculum),
+    on mesure la même chose : c'est la référence à battre.
+    Le score vient de info["score"] en fin de partie (SnakeEnv, SnakeEnvCnn et SnakeVecEnv le donnent).
+    """
+
+    def __init__(self, stages, window=100, target_score=None, verbose=0):
+        super().__init__(verbose)
+        self.stages = [(board_dims(size), threshold) for size, threshold in stages]
+        self.window = window
+        self.target_score = target_score
+        self.stage = 0
+        self.steps_to_target = None
+        self.time_to_target = None
+        self._scores = deque(maxlen=window)
+        self._start = None
+
+    def _on_training_start(self):
+        self._start = time.perf_counter()
+        self._scores.clear()
+        # Reprise d'un entraînement : on repart du plateau sur lequel jouent les envs
+        current = (self.training_env.get_attr("grid_w")[0], self.training_env.get_attr("grid_h")[0])
+        sizes = [size for size, _ in self.stages]
+        if any(size != current for size in sizes) and not self.training_env.has_attr("set_grid_size"):
+            # Sinon le curriculum serait sauté sans rien dire (entraînement directement sur le plateau actuel)
+            raise ValueError(f"Curriculum {[f'{w}x{h}' for w, h in sizes]} impossible : les envs "
+                             f"({type(self.training_env.unwrapped).__name__}, plateau {current[0]}x{current[1]}) "
+                             f"n'ont pas de set_grid_size")
+        self.stage = sizes.index(current) if current in sizes else 0
+        if current != sizes[self.stage]:
+            self._set_stage(self.stage)
+
+    def _set_stage(self, stage):
+        self.stage = stage
+        self._scores.clear()
+        self.training_env.env_method("set_grid_size", self.stages[stage][0])
+        if self.verbose >= 1:
+            w, h = self.stages[stage][0]
+            print(f"Curriculum : plateau {w}x{h} à partir de {self.num_timesteps} pas")
+
+    def _on_step(self):
+        size, threshold = self.stages[self.stage]
+        for done, info in zip(self.locals["dones"], self.locals["infos"]):
+            # Les parties commencées sur l'ancien plateau ne comptent pas
+            if done and info.get("grid_size") == size:
+                self._scores.append(info["score"])
+        if len(self._scores) < self.window:
+            return True
+        mean = sum(self._scores) / self.window
+        if threshold is not None and mean >= threshold and self.stage + 1 < len(self.stages):
+            self._set_stage(self.stage + 1)
+        elif (self.target_score is not None and self.steps_to_target is None
+              and self.stage == len(self.stages) - 1 and mean >= self.target_score):
+            self.steps_to_target = self.num_timesteps
+            self.time_to_target = time.perf_counter() - self._start
+            print(f"Score moyen {mean:.1f} >= {self.target_score} sur le plateau final : "
+                  f"{self.steps_to_target} pas, {self.time_to_target / 60:.1f} min")
+        return True
+
+    def _on_rollout_end(self):
+        w, h = self.stages[self.stage][0]
+        self.logger.record("curriculum/stage", self.stage)
+        self.logger.record("curriculum/grid_size", w * h)  # Nombre de cases du plateau
+        if self._scores:
+            self.logger.record("curriculum/score_mean", sum(self._scores) / len(self._scores))
+        if self.steps_to_target is not None:
+            self.logger.record("curriculum/steps_to_target", self.steps_to_target)
+            self.logger.record("curriculum/time_to_target_s", self.time_to_target)
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import sys
+
+import numpy as np
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from envs.snake_vec_env import SnakeVecEnv
+from envs.thread_vec_env import ThreadVecEnv
+
+# Vérifie que les mêmes seeds donnent les mêmes parties, quelle que soit la façon de les lancer.
+#
+#   python check_determinism.py                     -> 8 envs, 2000 pas, seed 0
+#   python check_determinism.py --envs 16 --steps 5000 --seed 3
+#
+# Pour SnakeEnv et SnakeEnvCnn, avec les mêmes actions, on compare pas à pas (observations,
+# récompenses, fins de partie et observations finales) :
+#   DummyVecEnv, SubprocVecEnv, ThreadVecEnv et SnakeVecEnv (mêmes règles, moteur NumPy).
+# On vérifie aussi qu'une autre seed donne d'autres parties (la seed sert vraiment).
+# Code de sortie 1 si une trajectoire diffère : à lancer avant de comparer deux entraînements.
+
+ENVS = {SnakeEnv: "vector", SnakeEnvCnn: "grid"}  # Classe -> obs_type de SnakeVecEnv
+
+
+def make(env_cls, runner, n_envs, seed):
+    if runner == "SnakeVecEnv":
+        env = SnakeVecEnv(num_envs=n_envs, obs_type=ENVS[env_cls])
+        env.seed(seed)  # Partie i : seed + i, comme make_vec_env
+        return env
+    vec_env_cls = {"DummyVecEnv": DummyVecEnv, "SubprocVecEnv": SubprocVecEnv, "ThreadVecEnv": ThreadVecEnv}[runner]
+    return make_vec_env(env_cls, n_envs=n_envs, seed=seed, vec_env_cls=vec_env_cls)
+
+
+def trajectory(env_cls, runner, n_envs, n_steps, seed, actions):
+    """Une empreinte (sha1) par pas : observations, récompenses, fins de partie, observations finales"""
+    env = make(env_cls, runner, n_envs, seed)
+    dtype = env.observation_space.dtype
+    digests = []
+    obs = env.reset()
+    for t in range(n_steps):
+        h = hashlib.sha1(np.ascontiguousarray(obs, dtype=dtype).tobytes())
+        obs, rewards, dones, infos = env.step(actions[t])
+        h.update(np.asarray(rewards, dtype=np.float32).tobytes())
+        h.update(np.asarray(dones, dtype=bool).tobytes())
+        for i in np.flatnonzero(dones):
+            h.update(np.ascontiguousarray(infos[i]["terminal_observation"], dtype=dtype).tobytes())
+        digests.append(h.hexdigest())
+    env.close()
+    return digests
+
+
+def first_difference(a, b):
+    for t, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return t
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Même seed -> mêmes parties (Dummy, Subproc, Thread, SnakeVecEnv)")
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    actions = np.random.default_rng(args.seed).integers(0, 4, size=(args.steps, args.envs))
+    ok = True
+    for env_cls in ENVS:
+        name = env_cls.__name__
+        reference = trajectory(env_cls, "DummyVecEnv", args.envs, args.steps, args.seed, actions)
+        for runner in ("DummyVecEnv", "SubprocVecEnv", "ThreadVecEnv", "SnakeVecEnv"):
+            other = trajectory(env_cls, runner, args.envs, args.steps, args.seed, actions)
+            t = first_difference(reference, other)
+            print(f"{name:>12} {runner:>13} : " + ("identique" if t is None else f"DIFFÉRENT à partir du pas {t}"))
+            ok &= t is None
+        other_seed = trajectory(env_cls, "DummyVecEnv", args.envs, args.steps, args.seed + 1000, actions)
+        t = first_difference(reference, other_seed)
+        print(f"{name:>12} {'autre seed':>13} : " + ("IDENTIQUE (la seed ne sert pas)" if t is None else "différent"))
+        ok &= t is not None
+
+    print("\nDéterministe." if ok else "\n!!! Les trajectoires dépendent d'autre chose que la seed.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":  # Obligatoire pour SubprocVecEnv
+    sys.exit(main())
@@ -0,0 +1,39 @@
+FOOD_BLOCK = 64  # Tirages demandés d'un coup au générateur
+
+
+class FoodStream:
+    """
+    Tirages uniformes dans [0, 1) pour placer les pommes, pré-calculés par blocs de FOOD_BLOCK :
+    un seul appel au générateur pour 64 pommes, au lieu d'un rng.integers() par pomme.
+    La pomme tombe sur la case libre free_cells.cells[int(u * n_libres)].
+
+    La suite des u est exactement celle de rng.random() appelé une fois par pomme : elle ne
+    dépend que de la seed. SnakeVecEnv garde un flux par partie avec la même règle, donc ses
+    parties tombent sur les mêmes pommes que SnakeEnv / SnakeEnvCnn avec la même seed.
+
+    Le générateur n'est pas gardé ici (gym remplace env.np_random à chaque reset(seed=...)) :
+    on le passe à next(), et clear() jette le bloc en cours quand la seed change.
+    """
+    __slots__ = ("block", "pos")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.block = ()
+        self.pos = 0
+
+    def next(self, rng):
+        pos = self.pos
+        if pos == len(self.block):
+            self.block = rng.random(FOOD_BLOCK).tolist()
+            pos = 0
+        self.pos = pos + 1
+        return self.block[pos]
+
+    def snapshot(self):
+        """État du flux (voir GameState) : le bloc n'est jamais modifié en place, pas de copie"""
+        return self.block, self.pos
+
+    def restore(self, snapshot):
+        self.block, self.pos = snapshot
@@ -0,0 +1,59 @@
+class FreeCells:
+    """
+    Ensemble des cases libres de la grille : retrait, ajout et tirage uniforme en O(1).
+
+    Les cases libres sont rangées au début de `cells` (les `n` premières), les cases
+    occupées à la fin. `pos[cell]` donne la place de chaque case dans `cells` :
+    retirer ou ajouter une case revient à l'échanger avec la frontière (swap-remove).
+    """
+    __slots__ = ("n_cells", "cells", "pos", "n")
+
+    def __init__(self, n_cells):
+        self.n_cells = n_cells
+        self.reset()
+
+    def reset(self):
+        """Toutes les cases redeviennent libres"""
+        self.cells = list(range(self.n_cells))
+        self.pos = list(range(self.n_cells))
+        self.n = self.n_cells
+
+    def __len__(self):
+        return self.n
+
+    def remove(self, cell):
+        """La case devient occupée (elle doit être libre)"""
+        i = self.pos[cell]
+        last = self.n - 1
+        last_cell = self.cells[last]
+        self.cells[i] = last_cell
+        self.pos[last_cell] = i
+        self.cells[last] = cell
+        self.pos[cell] = last
+        self.n = last
+
+    def add(self, cell):
+        """La case redevient libre (elle doit être occupée)"""
+        i = self.pos[cell]
+        first = self.n
+        first_cell = self.cells[first]
+        self.cells[i] = first_cell
+        self.pos[first_cell] = i
+        self.cells[first] = cell
+        self.pos[cell] = first
+        self.n = first + 1
+
+    def snapshot(self):
+        """Copie de l'état (voir GameState)"""
+        return self.cells[:], self.pos[:], self.n
+
+    def restore(self, snapshot):
+        """Revient à un état de snapshot() (qui reste utilisable ensuite)"""
+        cells, pos, n = snapshot
+        self.cells = cells[:]
+        self.pos = pos[:]
+        self.n = n
+
+    def pick(self, u):
+        """Case libre pour un tirage uniforme u dans [0, 1) (voir FoodStream)"""
+        return self.cells[int(u * self.n)]
@@ -0,0 +1,95 @@
+import copy
+from collections import deque
+import numpy as np
+
+# SeedSequence fixe pour créer vite le générateur d'un clone : son état est de toute
+# façon écrasé juste après par celui de l'env copié (éviter l'entropie de l'OS, ~20 µs)
+_CLONE_SEED = np.random.SeedSequence(0)
+
+
+class GameState:
+    """
+    Photo complète d'une partie de SnakeEnv / SnakeEnvCnn, en cases entières :
+    taille du plateau, tête, direction, corps (indices de cases, tête en premier), grille d'occupation,
+    cases libres, pomme, score, compteurs, état du générateur aléatoire et des tirages déjà faits
+    (les pommes suivantes tombent donc au même endroit), grille d'observation et pile d'images pour le CNN.
+
+    Sert aux planificateurs (MCTS, beam search, lookahead) : on essaie des coups sur l'env,
+    puis on revient en arrière avec restore(), sans deepcopy de l'env gym.
+
+        root = env.snapshot()
+        for action in range(4):
+            env.restore(root)
+            obs, reward, done, _, _ = env.step(action)
+        env.restore(root)
+
+    Un même snapshot peut être restauré autant de fois qu'on veut.
+    """
+    __slots__ = ("grid_size", "head", "direction", "snake", "occupied", "free_cells", "food", "score",
+                 "frame_iteration", "prev_distance", "rng_state", "food_stream", "grid", "frames", "slot")
+
+    @classmethod
+    def capture(cls, env):
+        state = cls.__new__(cls)
+        state.grid_size = (env.grid_w, env.grid_h)
+        state.head = tuple(env.head)
+        state.direction = env.direction
+        state.snake = tuple(env.snake)
+        state.occupied = bytes(env.occupied)
+        state.free_cells = env.free_cells.snapshot()
+        state.food = tuple(env.food)
+        state.score = env.score
+        state.frame_iteration = env.frame_iteration
+        state.prev_distance = getattr(env, "prev_distance", None)
+        state.rng_state = env.np_random.bit_generator.state
+        state.food_stream = env.food_stream.snapshot()
+        grid = getattr(env, "grid", None)
+        state.grid = None if grid is None else grid.copy()
+        frames = getattr(env, "frames", None)
+        state.frames = None if frames is None else frames.copy()
+        state.slot = getattr(env, "_slot", None)
+        return state
+
+    def restore(self, env):
+        if (env.grid_w, env.grid_h) != self.grid_size:
+            env._set_board(*self.grid_size)  # Partie prise sur un autre plateau (curriculum)
+        env.head = list(self.head)
+        env.direction = self.direction
+        env.snake = deque(self.snake)  # Aussi sur un env jamais reset (reprise d'entraînement)
+        env.occupied = bytearray(self.occupied)
+        env.free_cells.restore(self.free_cells)
+        env.food = list(self.food)
+        env.score = self.score
+        env.frame_iteration = self.frame_iteration
+        if self.prev_distance is not None:
+            env.prev_distance = self.prev_distance
+        env.np_random.bit_generator.state = self.rng_state
+        env.food_stream.restore(self.food_stream)
+        if self.grid is not None:
+            # En place : la grille peut être un buffer partagé (set_observation_buffer)
+            np.copyto(env.grid, self.grid)
+        if self.frames is not None:
+            np.copyto(env.frames, self.frames)
+            env._slot = self.slot
+
+
+def clone_env(env):
+    """
+    Copie indépendante d'un env en cours de partie, sans rendu (render_mode=None).
+    Pour des milliers de branches, préférer un seul clone + snapshot()/restore().
+    """
+    new = copy.copy(env)
+    new.render_mode = None
+    new.renderer = None
+    new.free_cells = copy.copy(env.free_cells)  # Ses listes sont remplacées par restore()
+    new.food_stream = copy.copy(env.food_stream)
+    bit_generator = type(env.np_random.bit_generator)(_CLONE_SEED)
+    new.np_random = np.random.Generator(bit_generator)
+    if getattr(env, "grid", None) is not None:
+        new.grid = np.empty_like(env.grid)
+        new.grid_flat = new.grid.reshape(-1)
+    if getattr(env, "frames", None) is not None:
+        new.frames = np.empty_like(env.frames)
+        new._obs_out = None  # Le buffer fourni par set_observation_buffer reste à l'original
+    GameState.capture(env).restore(new)
+    return new
@@ -0,0 +1,193 @@
+import numpy as np
+import pygame
+
+# Couleurs modernes
+WHITE = (255, 255, 255)
+BLACK = (15, 15, 25)
+DARK_GRAY = (30, 30, 40)
+RED = (255, 80, 80)
+ORANGE = (255, 165, 0)
+GREEN = (76, 175, 80)
+BLUE1 = (66, 165, 245)
+BLUE2 = (33, 150, 243)
+CYAN = (0, 188, 212)
+YELLOW = (255, 235, 59)
+GRID_COLOR = (50, 50, 70)
+GLOW = (255, 100, 0)
+
+PANEL_WIDTH = 180
+COMPACT_PANEL_WIDTH = 130  # Panneau réduit des petits plateaux (fenêtre de moins de PANEL_WIDTH + 20 px)
+
+
+class SnakeRenderer:
+    """
+    Rendu pygame partagé par SnakeEnv et SnakeEnvCnn.
+
+    Tout ce qui ne change pas est dessiné une seule fois : le fond et la grille,
+    le panneau du score, la pomme, la tête, et un sprite par couleur du dégradé du corps.
+    Les textes ne sont re-rendus que quand leur valeur change.
+
+    render_mode="human"     : fenêtre pygame (comme avant)
+    render_mode="rgb_array" : aucune fenêtre, render() renvoie l'image (H, W, 3) en uint8.
+                              Marche sur un serveur sans écran.
+    """
+
+    def __init__(self, w, h, block_size, grid_w, render_mode="human", fps=20, caption="🐍 Snake AI 🐍"):
+        self.w = w
+        self.h = h
+        self.block = block_size
+        self.grid_w = grid_w
+        self.render_mode = render_mode
+        self.fps = fps
+
+        if render_mode == "human":
+            pygame.init()
+            self.window = pygame.display.set_mode((w, h))
+            pygame.display.set_caption(caption)
+            self.clock = pygame.time.Clock()
+            self.canvas = self.window
+        else:
+            # Pas besoin d'écran pour dessiner sur une Surface : seul le module font est nécessaire
+            pygame.font.init()
+            self.window = None
+            self.clock = None
+            self.canvas = pygame.Surface((w, h))
+        # Taille du panneau selon la largeur de la fenêtre : normal, réduit, ou aucun s'il ne tient pas
+        if w >= PANEL_WIDTH + 20:
+            self.panel_size, self.text_rows = (PANEL_WIDTH, 90), (10, 45, 70)
+            self.font, self.small_font = pygame.font.Font(None, 48), pygame.font.Font(None, 32)
+        else:
+            self.panel_size, self.text_rows = (COMPACT_PANEL_WIDTH, 70), (10, 35, 52)
+            self.font, self.small_font = pygame.font.Font(None, 32), pygame.font.Font(None, 24)
+        self.show_panel = w >= self.panel_size[0] + 20
+
+        self.background = self._make_background()
+        self.panel = self._make_panel()
+        self.apple = self._make_apple()
+        self.head = self._make_head()
+        self._segments = {}   # couleur -> sprite d'un segment du corps
+        self._palettes = {}   # longueur du serpent -> liste des sprites du dégradé
+        self._texts = {}      # (police, texte, couleur) -> Surface déjà rendue
+
+    # ------------------------------------------------------------------
+    # Éléments pré-rendus (une seule fois)
+    # ------------------------------------------------------------------
+    def _make_background(self):
+        """Fond + grille légère"""
+        surface = pygame.Surface((self.w, self.h))
+        surface.fill(BLACK)
+        for x in range(0, self.w, self.block):
+            pygame.draw.line(surface, GRID_COLOR, (x, 0), (x, self.h), 1)
+        for y in range(0, self.h, self.block):
+            pygame.draw.line(surface, GRID_COLOR, (0, y), (self.w, y), 1)
+        return surface
+
+    def _make_panel(self):
+        """Fond du panneau de score en haut à droite"""
+        surface = pygame.Surface(self.panel_size, pygame.SRCALPHA)
+        pygame.draw.rect(surface, DARK_GRAY, (0, 0, *self.panel_size), border_radius=5)
+        pygame.draw.rect(surface, CYAN, (0, 0, *self.panel_size), 2, border_radius=5)
+        return surface
+
+    def _make_apple(self):
+        """Pomme avec son halo (le halo déborde de 3 pixels autour de la case)"""
+        b = self.block
+        margin = 3
+        surface = pygame.Surface((b + 2 * margin, b + 2 * margin), pygame.SRCALPHA)
+        center = (margin + b // 2, margin + b // 2)
+        pygame.draw.circle(surface, GLOW, center, b // 2 + margin)
+        pygame.draw.rect(surface, RED, pygame.Rect(margin + 2, margin + 2, b - 4, b - 4), border_radius=4)
+        pygame.draw.rect(surface, ORANGE, pygame.Rect(margin + 3, margin + 3, b - 6, b - 6), border_radius=3)
+        pygame.draw.circle(surface, YELLOW, (margin + 7, margin + 7), 3)
+        return surface
+
+    def _make_head(self):
+        """Tête : plus grande et brillante, avec les yeux"""
+        b = self.block
+        surface = pygame.Surface((b, b), pygame.SRCALPHA)
+        pygame.draw.rect(surface, CYAN, pygame.Rect(1, 1, b - 2, b - 2), border_radius=3)
+        pygame.draw.rect(surface, CYAN, pygame.Rect(0, 0, b, b), border_radius=4)
+        pygame.draw.circle(surface, WHITE, (6, 6), 2)
+        pygame.draw.circle(surface, WHITE, (14, 6), 2)
+        return surface
+
+    def _segment(self, color):
+        sprite = self._segments.get(color)
+        if sprite is None:
+            sprite = pygame.Surface((self.block, self.block), pygame.SRCALPHA)
+            pygame.draw.rect(sprite, color, pygame.Rect(1, 1, self.block - 2, self.block - 2), border_radius=3)
+            self._segments[color] = sprite
+        return sprite
+
+    def _palette(self, length):
+        """Sprites du dégradé (cyan pour la tête, bleu pour la queue), calculés une fois par longueur"""
+        palette = self._palettes.get(length)
+        if palette is None:
+            palette = [self.head]
+            for i in range(1, length):
+                ratio = i / max(length - 1, 1)
+                color = (
+                    int(BLUE1[0] + (CYAN[0] - BLUE1[0]) * (1 - ratio)),
+                    int(BLUE1[1] + (CYAN[1] - BLUE1[1]) * (1 - ratio)),
+                    int(BLUE1[2] + (CYAN[2] - BLUE1[2]) * (1 - ratio))
+                )
+                palette.append(self._segment(color))
+            self._palettes[length] = palette
+        return palette
+
+    def _text(self, font, text, color):
+        key = (id(font), text, color)
+        surface = self._texts.get(key)
+        if surface is None:
+            # On ne garde que les textes récents (le numéro de frame change à chaque image)
+            if len(self._texts) > 256:
+                self._texts.clear()
+            surface = font.render(text, True, color)
+            self._texts[key] = surface
+        return surface
+
+    # ------------------------------------------------------------------
+    # Dessin d'une image
+    # ------------------------------------------------------------------
+    def render(self, snake, food, score, frame_iteration):
+        """
+        Dessine une image. `snake` : indices de cases (tête en premier), `food` : case [x, y].
+        Renvoie l'image (H, W, 3) en mode "rgb_array", None en mode "human".
+        """
+        if self.window is not None:
+            pygame.event.pump()
+        canvas = self.canvas
+        b = self.block
+        canvas.blit(self.background, (0, 0))
+
+        # Pomme
+        canvas.blit(self.apple, (food[0] * b - 3, food[1] * b - 3))
+
+        # Serpent : un blit par segment, sprites déjà prêts
+        length = len(snake)
+        palette = self._palette(length)
+        grid_w = self.grid_w
+        canvas.blits([(palette[i], ((cell % grid_w) * b, (cell // grid_w) * b)) for i, cell in enumerate(snake)],
+                     doreturn=False)
+
+        # Score (pas de panneau sur les plus petits plateaux : il cacherait presque tout)
+        if self.show_panel:
+            panel_x = self.w - self.panel_size[0] - 10
+            rows = self.text_rows
+            canvas.blit(self.panel, (panel_x, 5))
+            canvas.blit(self._text(self.font, f"Score: {score}", GREEN), (panel_x + 10, rows[0]))
+            canvas.blit(self._text(self.small_font, f"Length: {length}", CYAN), (panel_x + 10, rows[1]))
+            canvas.blit(self._text(self.small_font, f"Frame: {frame_iteration}", WHITE), (panel_x + 10, rows[2]))
+
+        if self.render_mode == "human":
+            pygame.display.flip()
+            self.clock.tick(self.fps)
+            return None
+        # tobytes donne directement les lignes de pixels : (H, W, 3) sans transposition
+        return np.frombuffer(pygame.image.tobytes(canvas, "RGB"), dtype=np.uint8).reshape(self.h, self.w, 3)
+
+    def close(self):
+        if self.window is not None:
+            pygame.display.quit()
+            pygame.quit()
+            self.window = None
@@ -0,0 +1,296 @@
+import gc
+import multiprocessing as mp
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+from stable_baselines3.common.vec_env.patch_gym import _patch_env
+
+# Commandes écrites dans la mémoire partagée par le processus principal
+CMD_STEP = 0   # Faire un pas avec l'action de la mémoire partagée
+CMD_PIPE = 1   # La commande (reset, get_attr...) arrive par le pipe, comme SubprocVecEnv
+
+ALIGN = 64  # Chaque tableau commence sur une ligne de cache
+
+
+def _layout(n_envs, observation_space, action_space):
+    """Liste (nom, forme, dtype) des tableaux rangés dans le bloc de mémoire partagée"""
+    return [
+        ("command", (n_envs,), np.int8),
+        ("actions", (n_envs,) + action_space.shape, action_space.dtype),
+        ("rewards", (n_envs,), np.float32),
+        ("dones", (n_envs,), np.bool_),
+        ("has_info", (n_envs,), np.bool_),
+        ("obs", (n_envs,) + observation_space.shape, observation_space.dtype),
+        ("terminal_obs", (n_envs,) + observation_space.shape, observation_space.dtype),
+    ]
+
+
+def _block_size(layout):
+    size = 0
+    for _, shape, dtype in layout:
+        size += -size % ALIGN
+        size += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return max(size, 1)
+
+
+def _shared_arrays(buf, layout):
+    """Vues NumPy (sans copie) sur le bloc de mémoire partagée"""
+    arrays = {}
+    offset = 0
+    for name, shape, dtype in layout:
+        offset += -offset % ALIGN
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        offset += arrays[name].nbytes
+    return arrays
+
+
+def _attach(name):
+    """Ouvre le bloc créé par le processus principal (seul lui le détruit, dans close())"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        # Avant 3.13 : les workers partagent le resource_tracker du parent, l'enregistrement
+        # est donc sans effet et le unlink() du parent suffit
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker(remote, parent_remote, env_fn_wrapper, index, step_sem, done_sem):
+    # Import ici pour éviter un import circulaire (comme dans SubprocVecEnv)
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    env = _patch_env(env_fn_wrapper.var())
+    remote.send((env.observation_space, env.action_space))
+    shm_name, n_envs = remote.recv()
+    shm = _attach(shm_name)
+    arrays = _shared_arrays(shm.buf, _layout(n_envs, env.observation_space, env.action_space))
+    obs_slot = arrays["obs"][index]
+
+    # Si l'env sait écrire son observation en place (SnakeEnvCnn), il écrit
+    # directement dans la mémoire partagée : aucune copie du tout
+    if hasattr(env.unwrapped, "set_observation_buffer"):
+        env.unwrapped.set_observation_buffer(obs_slot)
+
+    while True:
+        step_sem.acquire()
+        if arrays["command"][index] == CMD_STEP:
+            try:
+                observation, reward, terminated, truncated, info = env.step(arrays["actions"][index])
+                done = terminated or truncated
+                reset_info = {}
+                if done:
+                    arrays["terminal_obs"][index] = observation
+                    observation, reset_info = env.reset()
+                if observation is not obs_slot:
+                    obs_slot[...] = observation
+                arrays["rewards"][index] = reward
+                arrays["dones"][index] = done
+                # Le dict d'infos n'est envoyé (picklé) que s'il contient quelque chose,
+                # c'est-à-dire presque uniquement en fin de partie
+                send_info = done or bool(info)
+                arrays["has_info"][index] = send_info
+                done_sem.release()
+                if send_info:
+                    info["TimeLimit.truncated"] = truncated and not terminated
+                    remote.send((info, reset_info))
+            except Exception:
+                arrays["has_info"][index] = True
+                done_sem.release()
+                remote.send(RuntimeError(f"Erreur dans le worker {index} :\n{traceback.format_exc()}"))
+            continue
+
+        try:
+            cmd, data = remote.recv()
+            if cmd == "reset":
+                maybe_options = {"options": data[1]} if data[1] else {}
+                observation, reset_info = env.reset(seed=data[0], **maybe_options)
+                if observation is not obs_slot:
+                    obs_slot[...] = observation
+                remote.send(reset_info)
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "env_method":
+                method = env.get_wrapper_attr(data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(env.get_wrapper_attr(data))
+            elif cmd == "has_attr":
+                try:
+                    env.get_wrapper_attr(data)
+                    remote.send(True)
+                except AttributeError:
+                    remote.send(False)
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
+
+    # Les vues NumPy doivent disparaître avant de fermer le bloc
+    del env, arrays, obs_slot
+    gc.collect()
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Variante de SubprocVecEnv : un processus par environnement, mais les observations,
+    récompenses, dones et actions passent par un bloc `multiprocessing.shared_memory`
+    au lieu d'être picklés dans un pipe à chaque pas.
+
+    La synchronisation se fait avec des sémaphores : un par worker pour lancer le pas,
+    un commun que chaque worker libère quand il a fini. Le pipe ne sert plus que pour les
+    commandes rares (reset, get_attr...) et les infos de fin de partie.
+
+    S'utilise comme SubprocVecEnv :
+        make_vec_env(SnakeEnvCnn, n_envs=16, vec_env_cls=SharedMemoryVecEnv)
+
+    :param env_fns: Fonctions créant les environnements (un processus chacun)
+    :param start_method: Méthode de démarrage des processus ('forkserver' par défaut si dispo, sinon 'spawn')
+    """
+
+    def __init__(self, env_fns, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.step_sems = [ctx.Semaphore(0) for _ in range(n_envs)]
+        self.done_sem = ctx.Semaphore(0)
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), index, self.step_sems[index], self.done_sem)
+            # daemon=True : si le processus principal plante, les workers ne restent pas bloqués
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        observation_space, action_space = [remote.recv() for remote in self.remotes][0]
+        if not isinstance(observation_space, spaces.Box):
+            raise ValueError("SharedMemoryVecEnv ne gère que les espaces d'observation Box")
+
+        layout = _layout(n_envs, observation_space, action_space)
+        self.shm = shared_memory.SharedMemory(create=True, size=_block_size(layout))
+        self._arrays = _shared_arrays(self.shm.buf, layout)
+        for remote in self.remotes:
+            remote.send((self.shm.name, n_envs))
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions):
+        self._arrays["actions"][:] = np.asarray(actions).reshape(self._arrays["actions"].shape)
+        self._arrays["command"][:] = CMD_STEP
+        for sem in self.step_sems:
+            sem.release()
+        self.waiting = True
+
+    def step_wait(self):
+        for _ in range(self.num_envs):
+            self.done_sem.acquire()
+        self.waiting = False
+
+        infos = [{} for _ in range(self.num_envs)]
+        error = None
+        for i in np.flatnonzero(self._arrays["has_info"]):
+            message = self.remotes[i].recv()
+            if isinstance(message, Exception):
+                error = message
+                continue
+            infos[i], self.reset_infos[i] = message
+            if self._arrays["dones"][i]:
+                infos[i]["terminal_observation"] = self._arrays["terminal_obs"][i].copy()
+        if error is not None:
+            raise error
+
+        # Copie : la mémoire partagée sera réécrite au prochain pas
+        return (
+            self._arrays["obs"].copy(),
+            self._arrays["rewards"].copy(),
+            self._arrays["dones"].copy(),
+            infos,
+        )
+
+    def reset(self):
+        for env_idx in range(self.num_envs):
+            self._send(env_idx, "reset", (self._seeds[env_idx], self._options[env_idx]))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        # Seeds et options ne servent qu'une fois
+        self._reset_seeds()
+        self._reset_options()
+        return self._arrays["obs"].copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.step_wait()
+        for env_idx in range(self.num_envs):
+            self._send(env_idx, "close", None)
+        for process in self.processes:
+            process.join()
+        self._arrays = None
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
+
+    def get_images(self):
+        if self.render_mode != "rgb_array":
+            return [None for _ in self.remotes]
+        for env_idx in range(self.num_envs):
+            self._send(env_idx, "render", None)
+        return [remote.recv() for remote in self.remotes]
+
+    def has_attr(self, attr_name):
+        for env_idx in range(self.num_envs):
+            self._send(env_idx, "has_attr", attr_name)
+        return all([remote.recv() for remote in self.remotes])
+
+    def get_attr(self, attr_name, indices=None):
+        indices = list(self._get_indices(indices))
+        for env_idx in indices:
+            self._send(env_idx, "get_attr", attr_name)
+        return [self.remotes[i].recv() for i in indices]
+
+    def set_attr(self, attr_name, value, indices=None):
+        indices = list(self._get_indices(indices))
+        for env_idx in indices:
+            self._send(env_idx, "set_attr", (attr_name, value))
+        for env_idx in indices:
+            self.remotes[env_idx].recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = list(self._get_indices(indices))
+        for env_idx in indices:
+            self._send(env_idx, "env_method", (method_name, method_args, method_kwargs))
+        return [self.remotes[i].recv() for i in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        indices = list(self._get_indices(indices))
+        for env_idx in indices:
+            self._send(env_idx, "is_wrapped", wrapper_class)
+        return [self.remotes[i].recv() for i in indices]
+
+    def _send(self, env_idx, cmd, data):
+        """Commande rare : on réveille le worker puis on lui envoie la commande par le pipe"""
+        self._arrays["command"][env_idx] = CMD_PIPE
+        self.step_sems[env_idx].release()
+        self.remotes[env_idx].send((cmd, data))
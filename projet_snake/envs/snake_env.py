@@ -1,46 +1,70 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import random
-import pygame
+from collections import deque
+from .food_stream import FoodStream
+from .free_cells import FreeCells
+from .game_state import GameState, clone_env
+from .renderer import SnakeRenderer
 
 # Constantes du jeu
 WINDOW_WIDTH = 600
 WINDOW_HEIGHT = 600
 BLOCK_SIZE = 20  # Taille d'une case (le serpent fait 20x20 pixels)
 SPEED = 20       # Vitesse de rendu pour l'humain (pas pour l'IA)
+MIN_GRID = 5     # Plus petit plateau : le serpent de départ (3 cases) tient au centre
+
+# Mode d'observation "lidar" : 8 rayons partant de la tête.
+# COMPASS = les 8 directions dans le sens horaire en partant du Nord (y vers le bas, comme l'écran).
+# Comme le vecteur de 11 valeurs, tout est donné dans le repère du plateau : les actions sont absolues.
+COMPASS = np.array([(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)])
+COMPASS_INDEX = {tuple(d): i for i, d in enumerate(COMPASS.tolist())}
+LIDAR_SIZE = 8 * 3 + 4 + 1 + 2 + 2
+
+
+def board_dims(grid_size):
+    """
+    Taille du plateau en cases (largeur, hauteur) : None = 30x30 (fenêtre 600x600),
+    un entier = plateau carré, ou un couple (largeur, hauteur).
+    """
+    if grid_size is None:
+        return WINDOW_WIDTH // BLOCK_SIZE, WINDOW_HEIGHT // BLOCK_SIZE
+    w, h = (grid_size, grid_size) if np.isscalar(grid_size) else grid_size
+    if w < MIN_GRID or h < MIN_GRID:
+        raise ValueError(f"Plateau {w}x{h} trop petit (au moins {MIN_GRID}x{MIN_GRID})")
+    return int(w), int(h)
+
+
+def _unit(dx, dy):
+    """Direction de (dx, dy), la plus grande composante ramenée à ±1 ((0, 0) reste (0, 0))"""
+    scale = max(abs(dx), abs(dy)) or 1
+    return dx / scale, dy / scale
 
-# Couleurs modernes
-WHITE = (255, 255, 255)
-BLACK = (15, 15, 25)
-DARK_GRAY = (30, 30, 40)
-RED = (255, 80, 80)
-ORANGE = (255, 165, 0)
-GREEN = (76, 175, 80)
-BLUE1 = (66, 165, 245)
-BLUE2 = (33, 150, 243)
-CYAN = (0, 188, 212)
-YELLOW = (255, 235, 59)
 
 class SnakeEnv(gym.Env):
     """
     Environnement Custom pour Snake compatible avec OpenAI Gym / Stable Baselines 3
     """
-    metadata = {'render_modes': ['human'], 'render_fps': SPEED}
+    metadata = {'render_modes': ['human', 'rgb_array'], 'render_fps': SPEED}
 
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, grid_size=None, obs_mode="vector"):
         super(SnakeEnv, self).__init__()
-        
-        # Dimensions de la grille
-        self.w = WINDOW_WIDTH
-        self.h = WINDOW_HEIGHT
         self.render_mode = render_mode
+        if obs_mode not in ("vector", "lidar"):
+            raise ValueError(f"obs_mode inconnu : {obs_mode!r} (attendu 'vector' ou 'lidar')")
+        self.obs_mode = obs_mode
+        
+        # Rendu pygame (fenêtre ou images rgb_array), créé seulement si nécessaire
+        self.renderer = None
         
-        # Init Pygame seulement si nécessaire
-        self.window = None
-        self.clock = None
-        self.font = None
-        self.small_font = None
+        # Nombre de cases (30x30 par défaut, voir board_dims). Toute la logique du jeu
+        # travaille en cases, les pixels ne servent qu'au rendu.
+        # set_grid_size() change la taille au prochain reset (curriculum, voir callbacks.py)
+        self._set_board(*board_dims(grid_size))
+        self._next_board = None
+        
+        # Tirages des pommes faits d'avance, par blocs, avec self.np_random (voir FoodStream)
+        self.food_stream = FoodStream()
         
         # ACTION SPACE : 
         # 0: Gauche, 1: Droite, 2: Haut, 3: Bas
@@ -50,17 +74,51 @@ class SnakeEnv(gym.Env):
         # [Danger Tout Droit, Danger Droite, Danger Gauche, 
         #  Direction G, Direction D, Direction H, Direction B,
         #  Pomme G, Pomme D, Pomme H, Pomme B]
-        self.observation_space = spaces.Box(low=0, high=1, shape=(11,), dtype=np.int8)
+        # ou, avec obs_mode="lidar", LIDAR_SIZE réels (voir _get_lidar_observation)
+        if obs_mode == "lidar":
+            self.observation_space = spaces.Box(low=-1, high=1, shape=(LIDAR_SIZE,), dtype=np.float32)
+        else:
+            self.observation_space = spaces.Box(low=0, high=1, shape=(11,), dtype=np.int8)
+
+    def _set_board(self, grid_w, grid_h):
+        self.grid_w = grid_w
+        self.grid_h = grid_h
+        # Dimensions de la fenêtre (rendu seulement)
+        self.w = grid_w * BLOCK_SIZE
+        self.h = grid_h * BLOCK_SIZE
+        # Cases libres (hors serpent) : tirage de la pomme en O(1) même sur une grille presque pleine
+        self.free_cells = FreeCells(grid_w * grid_h)
+        if self.obs_mode == "lidar":
+            self._build_rays()
+        self.close()  # La fenêtre n'a plus la bonne taille : recréée au prochain rendu
+
+    def set_grid_size(self, grid_size):
+        """Taille du plateau à partir du prochain reset (la partie en cours n'est pas touchée)"""
+        self._next_board = board_dims(grid_size)
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        if seed is not None:
+            self.food_stream.clear()  # Nouveau générateur : les tirages d'avance ne valent plus
+        if self._next_board is not None:
+            if self._next_board != (self.grid_w, self.grid_h):
+                self._set_board(*self._next_board)
+            self._next_board = None
         
         # État initial du serpent (au centre)
         self.direction = 1 # Commence vers la Droite
-        self.head = [self.w/2, self.h/2]
-        self.snake = [self.head, 
-                      [self.head[0]-BLOCK_SIZE, self.head[1]],
-                      [self.head[0]-(2*BLOCK_SIZE), self.head[1]]]
+        self.head = [self.grid_w // 2, self.grid_h // 2]
+        
+        # Corps = deque d'indices de cases (tête à gauche) + grille d'occupation.
+        # Avancer la tête, retirer la queue et tester une collision sont tous en O(1).
+        self.occupied = bytearray(self.grid_w * self.grid_h)
+        self.snake = deque()
+        self.free_cells.reset()
+        for i in range(3):
+            cell = self._cell(self.head[0] - i, self.head[1])
+            self.snake.append(cell)
+            self.occupied[cell] = 1
+            self.free_cells.remove(cell)
         
         self.score = 0
         self.frame_iteration = 0
@@ -84,19 +142,29 @@ class SnakeEnv(gym.Env):
         reward = 0
         
         # Condition de défaite : Collision mur ou soi-même
-        if self._is_collision() or self.frame_iteration > 100*len(self.snake):
+        # (+1 : la nouvelle tête n'est pas encore ajoutée au corps)
+        if self._is_collision() or self.frame_iteration > 100*(len(self.snake) + 1):
             game_over = True
             reward = -10 # Punition forte
-            return self._get_observation(), reward, game_over, False, {}
+            return self._get_observation(), reward, game_over, False, self._end_info()
+        
+        # La tête avance
+        head_cell = self._cell(*self.head)
+        self.snake.appendleft(head_cell)
+        self.occupied[head_cell] = 1
+        self.free_cells.remove(head_cell)
             
         # 3. Manger la Pomme
         if self.head == self.food:
             self.score += 1
             reward = 10 # Récompense forte
-            self._place_food()
+            if not self._place_food():
+                game_over = True # Plus aucune case libre : partie gagnée !
         else:
             # Si on ne mange pas, on retire la queue (mouvement normal)
-            self.snake.pop()
+            tail = self.snake.pop()
+            self.occupied[tail] = 0
+            self.free_cells.add(tail)
             
         # 4. Petit Reward Shaping (Optionnel)
         # On peut donner une petite récompense si on se rapproche de la pomme, 
@@ -106,17 +174,23 @@ class SnakeEnv(gym.Env):
         if self.render_mode == "human":
             self._render_frame()
             
-        return self._get_observation(), reward, game_over, False, {}
+        return self._get_observation(), reward, game_over, False, self._end_info() if game_over else {}
+
+    def _end_info(self):
+        """Infos de fin de partie (lues par CurriculumCallback, les récompenses ne donnent pas le score)"""
+        return {"score": self.score, "grid_size": (self.grid_w, self.grid_h)}
 
     def _get_observation(self):
         # C'est ici que l'IA "voit". On construit le vecteur de 11 valeurs.
+        if self.obs_mode == "lidar":
+            return self._get_lidar_observation()
         
-        # Coordonnées des points autour de la tête
-        head = self.snake[0]
-        point_l = [head[0] - BLOCK_SIZE, head[1]]
-        point_r = [head[0] + BLOCK_SIZE, head[1]]
-        point_u = [head[0], head[1] - BLOCK_SIZE]
-        point_d = [head[0], head[1] + BLOCK_SIZE]
+        # Danger sur les cases autour de la tête (4 tests O(1))
+        head = self.head
+        danger_l = self._is_collision([head[0] - 1, head[1]])
+        danger_r = self._is_collision([head[0] + 1, head[1]])
+        danger_u = self._is_collision([head[0], head[1] - 1])
+        danger_d = self._is_collision([head[0], head[1] + 1])
         
         # Directions actuelles (Booléens)
         dir_l = self.direction == 0
@@ -126,22 +200,22 @@ class SnakeEnv(gym.Env):
 
         state = [
             # Danger Tout Droit
-            (dir_r and self._is_collision(point_r)) or 
-            (dir_l and self._is_collision(point_l)) or 
-            (dir_u and self._is_collision(point_u)) or 
-            (dir_d and self._is_collision(point_d)),
+            (dir_r and danger_r) or 
+            (dir_l and danger_l) or 
+            (dir_u and danger_u) or 
+            (dir_d and danger_d),
 
             # Danger à Droite (relativement à la tête)
-            (dir_u and self._is_collision(point_r)) or 
-            (dir_d and self._is_collision(point_l)) or 
-            (dir_l and self._is_collision(point_u)) or 
-            (dir_r and self._is_collision(point_d)),
+            (dir_u and danger_r) or 
+            (dir_d and danger_l) or 
+            (dir_l and danger_u) or 
+            (dir_r and danger_d),
 
             # Danger à Gauche (relativement à la tête)
-            (dir_d and self._is_collision(point_r)) or 
-            (dir_u and self._is_collision(point_l)) or 
-            (dir_r and self._is_collision(point_u)) or 
-            (dir_l and self._is_collision(point_d)),
+            (dir_d and danger_r) or 
+            (dir_u and danger_l) or 
+            (dir_r and danger_u) or 
+            (dir_l and danger_d),
             
             # Direction actuelle
             dir_l,
@@ -158,22 +232,77 @@ class SnakeEnv(gym.Env):
         
         return np.array(state, dtype=np.int8)
 
+    def _build_rays(self):
+        """
+        Tables du mode "lidar", calculées une fois par taille de plateau, pour chaque case de tête :
+          ray_cells[case] : (8, pas) cases traversées par chaque rayon (COMPASS), n'importe laquelle après le mur ;
+          ray_length[case] : (8,) cases du plateau avant le mur ; ray_wall[case] : 1 / distance au mur.
+        Au plus max(w, h) - 1 cases avant le mur : la dernière colonne (pas max(w, h)) est toujours après.
+        """
+        w, h = self.grid_w, self.grid_h
+        steps = np.arange(1, max(w, h) + 1)
+        heads = np.arange(w * h)
+        xs = (heads % w)[:, None, None] + COMPASS[:, 0, None] * steps  # (cases, 8, pas)
+        ys = (heads // w)[:, None, None] + COMPASS[:, 1, None] * steps
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        self.ray_cells = np.where(inside, ys * w + xs, 0).astype(np.intp)  # intp : indexation sans conversion
+        self.ray_length = inside.sum(axis=2)
+        self.ray_wall = (1 / (self.ray_length + 1)).astype(np.float32)
+        self.ray_inverse = (1 / steps).astype(np.float32)  # Pas k -> 1/k
+
+    def _get_lidar_observation(self):
+        """
+        8 rayons depuis la tête (dans l'ordre de COMPASS), chacun avec 1/distance au mur, puis au corps,
+        puis à la pomme (0 = rien sur le rayon), la direction actuelle (G, D, H, B), la longueur
+        (/ nombre de cases) et la direction (dx, dy) de la queue et de la pomme, la plus grande
+        des deux composantes valant ±1.
+        Les 8 rayons sont lus d'un coup dans la grille d'occupation (tables de _build_rays).
+        """
+        w, h = self.grid_w, self.grid_h
+        hx, hy = self.head
+        fx, fy = self.food
+        obs = np.zeros(LIDAR_SIZE, dtype=np.float32)
+
+        if 0 <= hx < w and 0 <= hy < h:  # Sinon la partie est perdue (tête dans le mur) : rayons à 0
+            head = hy * w + hx
+            obs[0:8] = self.ray_wall[head]
+            hits = np.frombuffer(self.occupied, dtype=np.uint8)[self.ray_cells[head]]
+            hits[:, -1] = 1  # Butée après le mur : argmax trouve toujours une case
+            first = hits.argmax(axis=1)
+            obs[8:16] = self.ray_inverse[first] * (first < self.ray_length[head])
+            # Pomme : sur un rayon seulement si elle est alignée (même ligne, colonne ou diagonale)
+            dx, dy = fx - hx, fy - hy
+            if (dx or dy) and (dx == 0 or dy == 0 or abs(dx) == abs(dy)):  # (0, 0) : plateau plein
+                obs[16 + COMPASS_INDEX[((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))]] = 1 / max(abs(dx), abs(dy))
+
+        obs[24 + self.direction] = 1
+        obs[28] = len(self.snake) / (w * h)
+        tail = self.snake[-1]
+        obs[29:31] = _unit(tail % w - hx, tail // w - hy)
+        obs[31:33] = _unit(fx - hx, fy - hy)
+        return obs
+
+    def _cell(self, x, y):
+        """Indice à plat d'une case (x, y) de la grille"""
+        return y * self.grid_w + x
+
     def _place_food(self):
-        x = random.randint(0, (self.w-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE 
-        y = random.randint(0, (self.h-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-        self.food = [x, y]
-        # Vérifier que la pomme n'est pas SUR le serpent
-        if self.food in self.snake:
-            self._place_food()
+        # Tirage direct parmi les cases libres : jamais sur le serpent, pas de nouvel essai.
+        # Tout vient de self.np_random (initialisé par reset(seed=...)) : reproductible.
+        if len(self.free_cells) == 0:
+            return False
+        cell = self.free_cells.pick(self.food_stream.next(self.np_random))
+        self.food = [cell % self.grid_w, cell // self.grid_w]
+        return True
 
     def _is_collision(self, pt=None):
         if pt is None:
             pt = self.head
         # Collision Mur
-        if pt[0] > self.w - BLOCK_SIZE or pt[0] < 0 or pt[1] > self.h - BLOCK_SIZE or pt[1] < 0:
+        if pt[0] >= self.grid_w or pt[0] < 0 or pt[1] >= self.grid_h or pt[1] < 0:
             return True
-        # Collision Soi-même
-        if pt in self.snake[1:]:
+        # Collision Soi-même (la tête n'est jamais encore marquée quand on la teste)
+        if self.occupied[self._cell(pt[0], pt[1])]:
             return True
         return False
 
@@ -187,108 +316,43 @@ class SnakeEnv(gym.Env):
         elif action == 2 and self.direction != 3: self.direction = 2
         elif action == 3 and self.direction != 2: self.direction = 3
             
-        # Calcul de la nouvelle tête
+        # Calcul de la nouvelle tête (en cases)
+        # Elle n'est ajoutée au corps qu'une fois la collision vérifiée (voir step)
         x = self.head[0]
         y = self.head[1]
         
-        if self.direction == 1: x += BLOCK_SIZE
-        elif self.direction == 0: x -= BLOCK_SIZE
-        elif self.direction == 3: y += BLOCK_SIZE
-        elif self.direction == 2: y -= BLOCK_SIZE
+        if self.direction == 1: x += 1
+        elif self.direction == 0: x -= 1
+        elif self.direction == 3: y += 1
+        elif self.direction == 2: y -= 1
             
         self.head = [x, y]
-        self.snake.insert(0, self.head) # On ajoute la tête au début
 
-    def _render_frame(self):
-        if self.window is None:
-            pygame.init()
-            self.window = pygame.display.set_mode((self.w, self.h))
-            self.clock = pygame.time.Clock()
-            self.font = pygame.font.Font(None, 48)
-            self.small_font = pygame.font.Font(None, 32)
-            pygame.display.set_caption("🐍 Snake AI Training 🐍")
-        
-        # Fond
-        pygame.event.pump()
-        self.window.fill(BLACK)
-        
-        # Grille légère en arrière-plan (optionnel, pour voir les cases)
-        grid_color = (50, 50, 70)
-        for x in range(0, self.w, BLOCK_SIZE):
-            pygame.draw.line(self.window, grid_color, (x, 0), (x, self.h), 1)
-        for y in range(0, self.h, BLOCK_SIZE):
-            pygame.draw.line(self.window, grid_color, (0, y), (self.w, y), 1)
-        
-        # Dessiner la Pomme (avec un effet de glow)
-        self._draw_apple()
-        
-        # Dessiner le Serpent avec dégradé de couleur
-        self._draw_snake()
-        
-        # Afficher le Score
-        self._draw_score()
-        
-        pygame.display.flip()
-        self.clock.tick(self.metadata["render_fps"])
+    # --- Snapshot / restore : pour les planificateurs (MCTS, beam search, lookahead) ---
+    def snapshot(self):
+        """État complet de la partie (GameState), générateur aléatoire compris"""
+        return GameState.capture(self)
 
-    def _draw_apple(self):
-        """Dessiner la pomme avec un effet visuel amélioré"""
-        x, y = int(self.food[0]), int(self.food[1])
-        
-        # Lueur autour de la pomme
-        glow_radius = BLOCK_SIZE // 2 + 3
-        pygame.draw.circle(self.window, (255, 100, 0, 50), (x + BLOCK_SIZE//2, y + BLOCK_SIZE//2), glow_radius)
-        
-        # Pomme principale (dégradé simulé)
-        pygame.draw.rect(self.window, RED, pygame.Rect(x+2, y+2, BLOCK_SIZE-4, BLOCK_SIZE-4), border_radius=4)
-        pygame.draw.rect(self.window, ORANGE, pygame.Rect(x+3, y+3, BLOCK_SIZE-6, BLOCK_SIZE-6), border_radius=3)
-        
-        # Brillance
-        pygame.draw.circle(self.window, YELLOW, (x + 7, y + 7), 3)
+    def restore(self, state):
+        """Remet la partie dans l'état `state` (un snapshot peut resservir plusieurs fois)"""
+        state.restore(self)
 
-    def _draw_snake(self):
-        """Dessiner le serpent avec dégradé de couleur"""
-        snake_length = len(self.snake)
-        
-        for i, pt in enumerate(self.snake):
-            x, y = int(pt[0]), int(pt[1])
-            
-            # Couleur dégradée : cyan pour la tête, bleu pour la queue
-            ratio = i / max(snake_length - 1, 1)
-            color = (
-                int(BLUE1[0] + (CYAN[0] - BLUE1[0]) * (1 - ratio)),
-                int(BLUE1[1] + (CYAN[1] - BLUE1[1]) * (1 - ratio)),
-                int(BLUE1[2] + (CYAN[2] - BLUE1[2]) * (1 - ratio))
-            )
-            
-            # Corps du serpent (arrondi pour plus joli)
-            pygame.draw.rect(self.window, color, pygame.Rect(x+1, y+1, BLOCK_SIZE-2, BLOCK_SIZE-2), border_radius=3)
-            
-            # Tête du serpent (plus grande et brillante)
-            if i == 0:
-                pygame.draw.rect(self.window, CYAN, pygame.Rect(x, y, BLOCK_SIZE, BLOCK_SIZE), border_radius=4)
-                pygame.draw.circle(self.window, WHITE, (x + 6, y + 6), 2)
-                pygame.draw.circle(self.window, WHITE, (x + 14, y + 6), 2)
-
-    def _draw_score(self):
-        """Afficher le score et les informations en haut à droite"""
-        score_text = self.font.render(f"Score: {self.score}", True, GREEN)
-        length_text = self.small_font.render(f"Length: {len(self.snake)}", True, CYAN)
-        frame_text = self.small_font.render(f"Frame: {self.frame_iteration}", True, WHITE)
-        
-        # Position en haut à droite
-        panel_width = 180
-        panel_x = self.w - panel_width - 10
-        
-        # Fond semi-transparent pour la lisibilité
-        pygame.draw.rect(self.window, DARK_GRAY, (panel_x, 5, panel_width, 90), border_radius=5)
-        pygame.draw.rect(self.window, CYAN, (panel_x, 5, panel_width, 90), 2, border_radius=5)
-        
-        self.window.blit(score_text, (panel_x + 10, 10))
-        self.window.blit(length_text, (panel_x + 10, 45))
-        self.window.blit(frame_text, (panel_x + 10, 70))
+    def clone(self):
+        """Copie indépendante de l'env, sans rendu, pour simuler sans toucher à la vraie partie"""
+        return clone_env(self)
+
+    def render(self):
+        # En mode "human", l'image est déjà dessinée à chaque step
+        if self.render_mode == "rgb_array":
+            return self._render_frame()
+
+    def _render_frame(self):
+        if self.renderer is None:
+            self.renderer = SnakeRenderer(self.w, self.h, BLOCK_SIZE, self.grid_w, self.render_mode,
+                                          self.metadata["render_fps"], "🐍 Snake AI Training 🐍")
+        return self.renderer.render(self.snake, self.food, self.score, self.frame_iteration)
 
     def close(self):
-        if self.window is not None:
-            pygame.display.quit()
-            pygame.quit()
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
\ No newline at end of file
@@ -1,43 +1,37 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import random
-import pygame
+from collections import deque
+from .food_stream import FoodStream
+from .free_cells import FreeCells
+from .game_state import GameState, clone_env
+from .renderer import SnakeRenderer
+from .snake_env import board_dims
 
 # Mêmes constantes qu'avant
 WINDOW_WIDTH = 600
 WINDOW_HEIGHT = 600
 BLOCK_SIZE = 20
 SPEED = 20
+WALL = 80  # Hors du plateau (padding d'un petit plateau) : même valeur que le corps, case mortelle
+CELL_VALUES = (0, 80, 180, 255)  # Vide, corps/mur, tête, pomme : 2 bits par case (PackedRolloutBuffer)
 
-# Couleurs modernes
-WHITE = (255, 255, 255)
-BLACK = (15, 15, 25)
-DARK_GRAY = (30, 30, 40)
-RED = (255, 80, 80)
-ORANGE = (255, 165, 0)
-GREEN = (76, 175, 80)
-BLUE1 = (66, 165, 245)
-BLUE2 = (33, 150, 243)
-CYAN = (0, 188, 212)
-YELLOW = (255, 235, 59)
 
 class SnakeEnvCnn(gym.Env):
-    metadata = {'render_modes': ['human'], 'render_fps': SPEED}
+    metadata = {'render_modes': ['human', 'rgb_array'], 'render_fps': SPEED}
 
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, frame_stack=1, grid_size=None, obs_size=None):
         super(SnakeEnvCnn, self).__init__()
-        self.w = WINDOW_WIDTH
-        self.h = WINDOW_HEIGHT
+        if frame_stack < 1:
+            raise ValueError(f"frame_stack doit valoir au moins 1 (reçu {frame_stack})")
         self.render_mode = render_mode
-        self.window = None
-        self.clock = None
-        self.font = None
-        self.small_font = None
+        self.renderer = None
         
-        # Calcul du nombre de cases (ex: 30x30)
-        self.grid_w = int(self.w / BLOCK_SIZE)
-        self.grid_h = int(self.h / BLOCK_SIZE)
+        # Taille de l'observation (fixe) et du plateau (30x30 par défaut, voir board_dims).
+        # Un plateau plus petit que l'observation est centré, entouré de murs (WALL) : le même
+        # CNN joue sur toutes les tailles (curriculum, voir set_grid_size et callbacks.py)
+        board = board_dims(grid_size)
+        self.obs_w, self.obs_h = board_dims(obs_size) if obs_size is not None else board
 
         # ACTION : inchangé
         self.action_space = spaces.Discrete(4)
@@ -45,30 +39,107 @@ class SnakeEnvCnn(gym.Env):
         # OBSERVATION : C'est là que tout change !
         # On renvoie une "Image" de taille (1, 30, 30) (1 canal, Hauteur, Largeur)
         # Valeurs : 0=Vide, 80=Corps, 180=Tête, 255=Pomme (Nuances de gris)
+        # frame_stack=K : les K dernières grilles, de la plus ancienne à la plus récente (K, 30, 30)
+        self.frame_stack = frame_stack
         self.observation_space = spaces.Box(
             low=0, high=255, 
-            shape=(1, self.grid_h, self.grid_w), 
+            shape=(frame_stack, self.obs_h, self.obs_w), 
             dtype=np.uint8
         )
         
         # Pour le reward shaping
         self.prev_distance = None
+        
+        # Grille d'observation PERSISTANTE : à chaque pas on ne modifie que les
+        # 3-4 cases qui changent (nouvelle tête, ancienne tête, queue, pomme)
+        self.grid = np.zeros((1, self.obs_h, self.obs_w), dtype=np.uint8)
+        self.grid_flat = self.grid.reshape(-1)  # Vue à plat (pas de copie)
+
+        # Empilement (frame_stack > 1) : buffer circulaire "miroir" de 2K images. L'image
+        # du pas t est écrite dans la case t % K et dans son miroir t % K + K, si bien que
+        # frames[slot + 1 : slot + 1 + K] contient toujours les K dernières images dans
+        # l'ordre : une vue contiguë, sans décaler la pile à chaque pas.
+        self.frames = None
+        self._slot = 0
+        self._obs_out = None
+        if frame_stack > 1:
+            self.frames = np.zeros((2 * frame_stack, self.obs_h, self.obs_w), dtype=np.uint8)
+
+        self._set_board(*board)
+        self._next_board = None
+        self.food_stream = FoodStream()  # Pommes tirées d'avance avec self.np_random
+
+    def _set_board(self, grid_w, grid_h):
+        if grid_w > self.obs_w or grid_h > self.obs_h:
+            raise ValueError(f"Plateau {grid_w}x{grid_h} plus grand que l'observation {self.obs_w}x{self.obs_h}")
+        self.grid_w = grid_w
+        self.grid_h = grid_h
+        self.w = grid_w * BLOCK_SIZE  # Fenêtre (rendu seulement)
+        self.h = grid_h * BLOCK_SIZE
+        # Cases libres (hors serpent) : tirage de la pomme en O(1) même sur une grille presque pleine
+        self.free_cells = FreeCells(grid_w * grid_h)
+        # Case du plateau -> indice dans la grille d'observation (plateau centré)
+        self.pad_x = (self.obs_w - grid_w) // 2
+        self.pad_y = (self.obs_h - grid_h) // 2
+        self.obs_index = [(y + self.pad_y) * self.obs_w + x + self.pad_x
+                          for y in range(grid_h) for x in range(grid_w)]
+        self.close()  # La fenêtre n'a plus la bonne taille : recréée au prochain rendu
+
+    def set_grid_size(self, grid_size):
+        """Taille du plateau à partir du prochain reset (la partie en cours n'est pas touchée)"""
+        self._next_board = board_dims(grid_size)
+
+    def set_observation_buffer(self, out):
+        """
+        Fait écrire l'observation directement dans `out` (ex: la case de cet env
+        dans le tableau d'observations d'un env vectorisé). `out` doit être un tableau
+        uint8 contigu de forme (K, H, W) ; il est mis à jour en place à chaque pas.
+        Avec frame_stack > 1, la pile y est recopiée à chaque pas (K images).
+        """
+        if out.shape != self.observation_space.shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            raise ValueError(f"Buffer d'observation invalide : attendu uint8 contigu de forme {self.observation_space.shape}")
+        if self.frame_stack > 1:
+            self._obs_out = out
+            if hasattr(self, "snake"):
+                np.copyto(out, self._stacked())
+            return
+        self.grid = out
+        self.grid_flat = out.reshape(-1)  # Vue à plat (pas de copie)
+        if hasattr(self, "snake"):
+            self._draw_grid()
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        if seed is not None:
+            self.food_stream.clear()  # Nouveau générateur : les tirages d'avance ne valent plus
+        if self._next_board is not None:
+            if self._next_board != (self.grid_w, self.grid_h):
+                self._set_board(*self._next_board)
+            self._next_board = None
         self.direction = 1
-        self.head = [self.w/2, self.h/2]
-        self.snake = [self.head, 
-                      [self.head[0]-BLOCK_SIZE, self.head[1]],
-                      [self.head[0]-(2*BLOCK_SIZE), self.head[1]]]
+        # Tout est en cases : corps = deque d'indices + grille d'occupation (O(1))
+        self.head = [self.grid_w // 2, self.grid_h // 2]
+        self.occupied = bytearray(self.grid_w * self.grid_h)
+        self.snake = deque()
+        self.free_cells.reset()
+        for i in range(3):
+            cell = self._cell(self.head[0] - i, self.head[1])
+            self.snake.append(cell)
+            self.occupied[cell] = 1
+            self.free_cells.remove(cell)
         self.score = 0
         self.frame_iteration = 0
         self._place_food()
         self.prev_distance = self._get_distance()
+        self._draw_grid()
+        if self.frames is not None:
+            # Début de partie : les images "avant" le reset sont noires (comme VecFrameStack)
+            self.frames.fill(0)
+            self._push_frame()
         return self._get_observation(), {}
 
     def _get_distance(self):
-        """Distance de Manhattan entre la tête et la pomme"""
+        """Distance de Manhattan (en cases) entre la tête et la pomme"""
         return abs(self.head[0] - self.food[0]) + abs(self.head[1] - self.food[1])
 
     def step(self, action):
@@ -78,11 +149,19 @@ class SnakeEnvCnn(gym.Env):
         game_over = False
         reward = 0
         
-        # Collision = Game Over
-        if self._is_collision() or self.frame_iteration > 100*len(self.snake):
+        # Collision = Game Over (+1 : la nouvelle tête n'est pas encore dans le corps)
+        if self._is_collision() or self.frame_iteration > 100*(len(self.snake) + 1):
             game_over = True
             reward = -10
-            return self._get_observation(), reward, game_over, False, {}
+            return self._get_terminal_observation(), reward, game_over, False, self._end_info()
+        
+        head_cell = self._cell(*self.head)
+        obs_index = self.obs_index
+        self.grid_flat[obs_index[self.snake[0]]] = 80   # L'ancienne tête devient du corps
+        self.grid_flat[obs_index[head_cell]] = 180
+        self.snake.appendleft(head_cell)
+        self.occupied[head_cell] = 1
+        self.free_cells.remove(head_cell)
         
         # Calculer la nouvelle distance
         new_distance = self._get_distance()
@@ -91,10 +170,16 @@ class SnakeEnvCnn(gym.Env):
         if self.head == self.food:
             self.score += 1
             reward = 20  # Augmenté de 10 à 20
-            self._place_food()
+            if self._place_food():
+                self.grid_flat[obs_index[self._cell(*self.food)]] = 255
+            else:
+                game_over = True  # Plus aucune case libre : partie gagnée !
             self.prev_distance = self._get_distance()
         else:
-            self.snake.pop()
+            tail = self.snake.pop()
+            self.occupied[tail] = 0
+            self.free_cells.add(tail)
+            self.grid_flat[obs_index[tail]] = 0
             
             # REWARD SHAPING : Récompense/punition basée sur la distance
             # Se rapprocher = +1, s'éloigner = -1
@@ -106,48 +191,98 @@ class SnakeEnvCnn(gym.Env):
             
             self.prev_distance = new_distance
             
+        if self.frames is not None:
+            self._push_frame()
+
         if self.render_mode == "human":
             self._render_frame()
             
+        if game_over:
+            # Partie gagnée : la grille persistante sera redessinée par le reset que fait le VecEnv
+            # juste après (avant de garder terminal_observation) : on renvoie une copie
+            return self._get_observation().copy(), reward, game_over, False, self._end_info()
         return self._get_observation(), reward, game_over, False, {}
 
+    def _end_info(self):
+        """Infos de fin de partie (score et plateau), lues par CurriculumCallback"""
+        return {"score": self.score, "grid_size": (self.grid_w, self.grid_h)}
+
     def _get_observation(self):
-        # On crée une grille vide (Fond noir = 0)
-        grid = np.zeros((self.grid_h, self.grid_w), dtype=np.uint8)
+        # La grille est déjà à jour (voir step) : aucune allocation, aucun calcul.
+        # ATTENTION : c'est toujours le même tableau, modifié en place au pas suivant.
+        # Les VecEnv de SB3 le copient, mais gardez une copie si vous stockez les observations.
+        if self.frames is None:
+            return self.grid
+        if self._obs_out is not None:
+            np.copyto(self._obs_out, self._stacked())
+            return self._obs_out
+        return self._stacked()
+
+    def _push_frame(self):
+        """Empilement : une seule nouvelle image par pas (dans sa case et son miroir)"""
+        k = self.frame_stack
+        self._slot = (self._slot + 1) % k
+        self.frames[self._slot] = self.grid[0]
+        self.frames[self._slot + k] = self.grid[0]
+
+    def _stacked(self):
+        """Les K dernières images, de la plus ancienne à la plus récente (vue, pas de copie)"""
+        return self.frames[self._slot + 1:self._slot + 1 + self.frame_stack]
+
+    def _draw_grid(self):
+        """Redessine toute la grille (seulement au reset)"""
+        # Image (1, 30, 30) exigée par PyTorch CNN. Fond noir = 0, murs autour d'un petit plateau
+        if (self.grid_w, self.grid_h) == (self.obs_w, self.obs_h):
+            self.grid.fill(0)
+        else:
+            self.grid.fill(WALL)
+            self.grid[0, self.pad_y:self.pad_y + self.grid_h, self.pad_x:self.pad_x + self.grid_w] = 0
+        obs_index = self.obs_index
         
         # On dessine le corps (Gris foncé = 80)
-        for pt in self.snake:
-            x = int(pt[0] / BLOCK_SIZE)
-            y = int(pt[1] / BLOCK_SIZE)
-            if 0 <= x < self.grid_w and 0 <= y < self.grid_h:
-                grid[y, x] = 80
+        for cell in self.snake:
+            self.grid_flat[obs_index[cell]] = 80
         
         # On dessine la tête (Gris clair = 180) pour qu'il sache où il est
-        hx = int(self.head[0] / BLOCK_SIZE)
-        hy = int(self.head[1] / BLOCK_SIZE)
-        if 0 <= hx < self.grid_w and 0 <= hy < self.grid_h:
-            grid[hy, hx] = 180
+        self.grid_flat[obs_index[self.snake[0]]] = 180
             
         # On dessine la pomme (Blanc = 255)
-        fx = int(self.food[0] / BLOCK_SIZE)
-        fy = int(self.food[1] / BLOCK_SIZE)
-        grid[fy, fx] = 255
-        
-        # On ajoute la dimension du canal (1, 30, 30) exigée par PyTorch CNN
-        return np.expand_dims(grid, axis=0)
+        self.grid_flat[obs_index[self._cell(*self.food)]] = 255
+
+    def _get_terminal_observation(self):
+        """
+        Observation du Game Over : la nouvelle tête (si elle est dans la grille) sur
+        l'ancien corps, queue comprise. On renvoie une copie pour ne pas toucher la grille
+        persistante, qui est de toute façon redessinée au reset.
+        """
+        grid = self.grid.copy()
+        flat = grid.reshape(-1)
+        obs_index = self.obs_index
+        flat[obs_index[self.snake[0]]] = 80
+        hx, hy = self.head
+        if 0 <= hx < self.grid_w and 0 <= hy < self.grid_h:
+            flat[obs_index[self._cell(hx, hy)]] = 180
+        flat[obs_index[self._cell(*self.food)]] = 255
+        if self.frames is not None:
+            # Les K - 1 images précédentes, puis celle du Game Over
+            return np.concatenate((self._stacked()[1:], grid))
+        return grid
 
     # ... Les méthodes _place_food, _is_collision, _move, _render_frame sont identiques à V1 ...
     # (Copiez-les depuis snake_env.py, elles ne changent pas)
+    def _cell(self, x, y):
+        return y * self.grid_w + x
+
     def _place_food(self):
-        x = random.randint(0, (self.w-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE 
-        y = random.randint(0, (self.h-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-        self.food = [x, y]
-        if self.food in self.snake: self._place_food()
+        if len(self.free_cells) == 0: return False
+        cell = self.free_cells.pick(self.food_stream.next(self.np_random))
+        self.food = [cell % self.grid_w, cell // self.grid_w]
+        return True
 
     def _is_collision(self, pt=None):
         if pt is None: pt = self.head
-        if pt[0] > self.w - BLOCK_SIZE or pt[0] < 0 or pt[1] > self.h - BLOCK_SIZE or pt[1] < 0: return True
-        if pt in self.snake[1:]: return True
+        if pt[0] >= self.grid_w or pt[0] < 0 or pt[1] >= self.grid_h or pt[1] < 0: return True
+        if self.occupied[self._cell(pt[0], pt[1])]: return True
         return False
 
     def _move(self, action):
@@ -158,102 +293,34 @@ class SnakeEnvCnn(gym.Env):
         elif action == 3 and self.direction != 2: self.direction = 3
         x = self.head[0]
         y = self.head[1]
-        if self.direction == 1: x += BLOCK_SIZE
-        elif self.direction == 0: x -= BLOCK_SIZE
-        elif self.direction == 3: y += BLOCK_SIZE
-        elif self.direction == 2: y -= BLOCK_SIZE
+        if self.direction == 1: x += 1
+        elif self.direction == 0: x -= 1
+        elif self.direction == 3: y += 1
+        elif self.direction == 2: y -= 1
         self.head = [x, y]
-        self.snake.insert(0, self.head)
 
-    def _render_frame(self):
-        if self.window is None:
-            pygame.init()
-            self.window = pygame.display.set_mode((self.w, self.h))
-            self.clock = pygame.time.Clock()
-            self.font = pygame.font.Font(None, 48)
-            self.small_font = pygame.font.Font(None, 32)
-            pygame.display.set_caption("🐍 Snake AI CNN Training 🐍")
-        
-        # Fond
-        self.window.fill(BLACK)
-        
-        # Grille légère en arrière-plan
-        grid_color = (50, 50, 70)
-        for x in range(0, self.w, BLOCK_SIZE):
-            pygame.draw.line(self.window, grid_color, (x, 0), (x, self.h), 1)
-        for y in range(0, self.h, BLOCK_SIZE):
-            pygame.draw.line(self.window, grid_color, (0, y), (self.w, y), 1)
-        
-        # Dessiner la Pomme
-        self._draw_apple()
-        
-        # Dessiner le Serpent
-        self._draw_snake()
-        
-        # Afficher le Score
-        self._draw_score()
-        
-        pygame.display.flip()
-        self.clock.tick(self.metadata["render_fps"])
+    # Snapshot / restore pour les planificateurs (voir snake_env.py et GameState)
+    def snapshot(self):
+        return GameState.capture(self)
 
-    def _draw_apple(self):
-        """Dessiner la pomme avec un effet visuel amélioré"""
-        x, y = int(self.food[0]), int(self.food[1])
-        
-        # Lueur autour de la pomme
-        glow_radius = BLOCK_SIZE // 2 + 3
-        pygame.draw.circle(self.window, (255, 100, 0, 50), (x + BLOCK_SIZE//2, y + BLOCK_SIZE//2), glow_radius)
-        
-        # Pomme principale (dégradé simulé)
-        pygame.draw.rect(self.window, RED, pygame.Rect(x+2, y+2, BLOCK_SIZE-4, BLOCK_SIZE-4), border_radius=4)
-        pygame.draw.rect(self.window, ORANGE, pygame.Rect(x+3, y+3, BLOCK_SIZE-6, BLOCK_SIZE-6), border_radius=3)
-        
-        # Brillance
-        pygame.draw.circle(self.window, YELLOW, (x + 7, y + 7), 3)
+    def restore(self, state):
+        state.restore(self)
 
-    def _draw_snake(self):
-        """Dessiner le serpent avec dégradé de couleur"""
-        snake_length = len(self.snake)
-        
-        for i, pt in enumerate(self.snake):
-            x, y = int(pt[0]), int(pt[1])
-            
-            # Couleur dégradée : cyan pour la tête, bleu pour la queue
-            ratio = i / max(snake_length - 1, 1)
-            color = (
-                int(BLUE1[0] + (CYAN[0] - BLUE1[0]) * (1 - ratio)),
-                int(BLUE1[1] + (CYAN[1] - BLUE1[1]) * (1 - ratio)),
-                int(BLUE1[2] + (CYAN[2] - BLUE1[2]) * (1 - ratio))
-            )
-            
-            # Corps du serpent (arrondi pour plus joli)
-            pygame.draw.rect(self.window, color, pygame.Rect(x+1, y+1, BLOCK_SIZE-2, BLOCK_SIZE-2), border_radius=3)
-            
-            # Tête du serpent (plus grande et brillante)
-            if i == 0:
-                pygame.draw.rect(self.window, CYAN, pygame.Rect(x, y, BLOCK_SIZE, BLOCK_SIZE), border_radius=4)
-                pygame.draw.circle(self.window, WHITE, (x + 6, y + 6), 2)
-                pygame.draw.circle(self.window, WHITE, (x + 14, y + 6), 2)
+    def clone(self):
+        return clone_env(self)
 
-    def _draw_score(self):
-        """Afficher le score et les informations en haut à droite"""
-        score_text = self.font.render(f"Score: {self.score}", True, GREEN)
-        length_text = self.small_font.render(f"Length: {len(self.snake)}", True, CYAN)
-        frame_text = self.small_font.render(f"Frame: {self.frame_iteration}", True, WHITE)
-        
-        # Position en haut à droite
-        panel_width = 180
-        panel_x = self.w - panel_width - 10
-        
-        # Fond semi-transparent pour la lisibilité
-        pygame.draw.rect(self.window, DARK_GRAY, (panel_x, 5, panel_width, 90), border_radius=5)
-        pygame.draw.rect(self.window, CYAN, (panel_x, 5, panel_width, 90), 2, border_radius=5)
-        
-        self.window.blit(score_text, (panel_x + 10, 10))
-        self.window.blit(length_text, (panel_x + 10, 45))
-        self.window.blit(frame_text, (panel_x + 10, 70))
+    def render(self):
+        # En mode "human", l'image est déjà dessinée à chaque step
+        if self.render_mode == "rgb_array":
+            return self._render_frame()
+
+    def _render_frame(self):
+        if self.renderer is None:
+            self.renderer = SnakeRenderer(self.w, self.h, BLOCK_SIZE, self.grid_w, self.render_mode,
+                                          self.metadata["render_fps"], "🐍 Snake AI CNN Training 🐍")
+        return self.renderer.render(self.snake, self.food, self.score, self.frame_iteration)
 
     def close(self):
-        if self.window is not None:
-            pygame.display.quit()
-            pygame.quit()
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
\ No newline at end of file
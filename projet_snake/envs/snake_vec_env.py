@@ -0,0 +1,404 @@
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from .food_stream import FOOD_BLOCK
+from .snake_env import WINDOW_WIDTH, WINDOW_HEIGHT, BLOCK_SIZE
+
+# Déplacement (en cases) pour chaque direction
+# 0: Gauche, 1: Droite, 2: Haut, 3: Bas
+DX = np.array([-1, 1, 0, 0], dtype=np.int64)
+DY = np.array([0, 0, -1, 1], dtype=np.int64)
+OPPOSITE = np.array([1, 0, 3, 2], dtype=np.int64)  # Demi-tour interdit
+RIGHT_OF = np.array([2, 3, 1, 0], dtype=np.int64)  # Case "à droite" de la tête
+LEFT_OF = np.array([3, 2, 0, 1], dtype=np.int64)   # Case "à gauche" de la tête
+
+# Tableaux qui décrivent complètement les parties en cours (voir snapshot)
+STATE_ARRAYS = ("body", "head_ptr", "length", "occupied", "free_cells", "free_pos", "n_free",
+                "head_x", "head_y", "direction", "food", "score", "frame_iteration", "prev_distance",
+                "food_u", "food_pos", "grid", "frames")
+
+# Valeurs de la grille (identiques à SnakeEnvCnn)
+EMPTY = 0
+BODY = 80
+HEAD = 180
+FOOD = 255
+
+
+class SnakeVecEnv(VecEnv):
+    """
+    N parties de Snake simulées dans UN SEUL processus, toutes avancées
+    en un seul appel NumPy vectorisé (pas de pickling, pas de pipe).
+
+    L'état est stocké en "struct of arrays" : une ligne par partie pour la
+    tête, la direction, le corps (buffer circulaire de cases), la pomme, le score...
+
+    obs_type="vector" : mêmes règles et observations que SnakeEnv (11 valeurs, MLP)
+    obs_type="grid"   : mêmes règles et observations que SnakeEnvCnn (grille 1x30x30, CNN)
+    frame_stack=K     : (mode "grid") les K dernières grilles, comme SnakeEnvCnn(frame_stack=K)
+
+    Chaque partie a son propre générateur aléatoire et son flux de pommes (FoodStream, en
+    tableaux) : avec seed(s), la partie i tombe sur les mêmes pommes que SnakeEnv(Cnn) avec
+    la seed s + i (convention de make_vec_env), quel que soit le moment où meurent les autres.
+    """
+
+    def __init__(self, num_envs=8, obs_type="grid", frame_stack=1):
+        self.grid_w = WINDOW_WIDTH // BLOCK_SIZE
+        self.grid_h = WINDOW_HEIGHT // BLOCK_SIZE
+        self.n_cells = self.grid_w * self.grid_h
+        self.obs_type = obs_type
+        self.frame_stack = frame_stack
+        self.render_mode = None
+        if frame_stack < 1 or (frame_stack > 1 and obs_type != "grid"):
+            raise ValueError(f"frame_stack={frame_stack} invalide (>= 1, et seulement en mode 'grid')")
+
+        if obs_type == "vector":
+            observation_space = spaces.Box(low=0, high=1, shape=(11,), dtype=np.int8)
+        elif obs_type == "grid":
+            observation_space = spaces.Box(
+                low=0, high=255,
+                shape=(frame_stack, self.grid_h, self.grid_w),
+                dtype=np.uint8
+            )
+        else:
+            raise ValueError(f"obs_type inconnu : {obs_type!r} (attendu 'vector' ou 'grid')")
+
+        super().__init__(num_envs, observation_space, spaces.Discrete(4))
+
+        n = num_envs
+        # Le corps tient au plus sur toutes les cases (+1 pour la nouvelle tête)
+        self.capacity = self.n_cells + 1
+        self.body = np.zeros((n, self.capacity), dtype=np.int64)  # Buffer circulaire (queue -> tête)
+        self.head_ptr = np.zeros(n, dtype=np.int64)               # Indice de la tête dans self.body
+        self.length = np.zeros(n, dtype=np.int64)
+        self.occupied = np.zeros((n, self.n_cells), dtype=bool)   # Cases occupées par le serpent
+
+        # Cases libres de chaque partie (même principe que FreeCells, vectorisé) :
+        # les n_free premières cases de free_cells sont libres, free_pos donne la place de chaque case
+        self.free_cells = np.zeros((n, self.n_cells), dtype=np.int32)
+        self.free_pos = np.zeros((n, self.n_cells), dtype=np.int32)
+        self.n_free = np.zeros(n, dtype=np.int64)
+
+        self.head_x = np.zeros(n, dtype=np.int64)
+        self.head_y = np.zeros(n, dtype=np.int64)
+        self.direction = np.zeros(n, dtype=np.int64)
+        self.food = np.zeros(n, dtype=np.int64)                   # Case de la pomme (y * grid_w + x)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.frame_iteration = np.zeros(n, dtype=np.int64)
+        self.prev_distance = np.zeros(n, dtype=np.int64)
+
+        # Grille persistante (mode "grid") : mise à jour case par case à chaque pas
+        if obs_type == "grid":
+            self.grid = np.zeros((n, 1, self.grid_h, self.grid_w), dtype=np.uint8)
+            self.grid_flat = self.grid.reshape(n, self.n_cells)  # Vue à plat (pas de copie)
+        # Pile d'images : buffer circulaire miroir de 2K images par partie (voir SnakeEnvCnn).
+        # Toutes les parties avancent ensemble, donc une seule case courante pour toutes.
+        self.frames = None
+        self._slot = 0
+        if frame_stack > 1:
+            self.frames = np.zeros((n, 2 * frame_stack, self.grid_h, self.grid_w), dtype=np.uint8)
+
+        # Un générateur par partie, et des tirages faits d'avance par blocs (voir FoodStream) :
+        # food_u[i, food_pos[i]] est le prochain tirage de la partie i (bloc vide : FOOD_BLOCK)
+        self.rngs = [np.random.default_rng() for _ in range(n)]
+        self.food_u = np.zeros((n, FOOD_BLOCK), dtype=np.float64)
+        self.food_pos = np.full(n, FOOD_BLOCK, dtype=np.int64)
+        self._all = np.arange(n)
+        self._actions = None
+
+    # ------------------------------------------------------------------
+    # API VecEnv
+    # ------------------------------------------------------------------
+    def reset(self):
+        for i, seed in enumerate(self._seeds):
+            if seed is not None:
+                self.rngs[i] = np.random.default_rng(seed)  # Comme SnakeEnv.reset(seed=seed)
+                self.food_pos[i] = FOOD_BLOCK
+        self._reset_seeds()
+        self._reset_options()
+        self._reset_games(self._all)
+        self._push_frames()
+        return self._get_observations()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        actions = self._actions
+        w, h = self.grid_w, self.grid_h
+        self.frame_iteration += 1
+
+        # 1. Mouvement (demi-tour interdit, comme SnakeEnv._move)
+        self.direction = np.where(actions != OPPOSITE[self.direction], actions, self.direction)
+        new_x = self.head_x + DX[self.direction]
+        new_y = self.head_y + DY[self.direction]
+
+        # 2. Game Over ? (mur, soi-même -- queue comprise -- ou partie trop longue)
+        out = (new_x < 0) | (new_x >= w) | (new_y < 0) | (new_y >= h)
+        new_cell = np.where(out, 0, new_y * w + new_x)
+        hit = ~out & self.occupied[self._all, new_cell]
+        timeout = self.frame_iteration > 100 * (self.length + 1)
+        dones = out | hit | timeout
+        eat = ~dones & (new_cell == self.food)
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        rewards[dones] = -10
+
+        # 3. Les parties vivantes avancent
+        alive = np.flatnonzero(~dones)
+        old_head = self.body[alive, self.head_ptr[alive]]
+        self.head_ptr[alive] = (self.head_ptr[alive] + 1) % self.capacity
+        self.body[alive, self.head_ptr[alive]] = new_cell[alive]
+        self.occupied[alive, new_cell[alive]] = True
+        self._remove_free(alive, new_cell[alive])
+        self.head_x[alive] = new_x[alive]
+        self.head_y[alive] = new_y[alive]
+
+        # Pas de pomme : on retire la queue
+        movers = alive[~eat[alive]]
+        tail = self.body[movers, (self.head_ptr[movers] - self.length[movers]) % self.capacity]
+        self.occupied[movers, tail] = False
+        self._add_free(movers, tail)
+
+        # Pomme : le serpent grandit et une nouvelle pomme apparaît
+        eaters = np.flatnonzero(eat)
+        self.length[eaters] += 1
+        self.score[eaters] += 1
+        placed = self._place_food(eaters)
+        won = eaters[~placed]  # Plus aucune case libre : partie gagnée !
+
+        if self.obs_type == "grid":
+            self.grid_flat[movers, tail] = EMPTY
+            self.grid_flat[alive, old_head] = BODY
+            self.grid_flat[alive, new_cell[alive]] = HEAD
+            self.grid_flat[eaters[placed], self.food[eaters[placed]]] = FOOD
+
+            # 4. Récompenses de SnakeEnvCnn (+20 pomme, reward shaping +-1 sinon)
+            new_distance = self._get_distance(self._all)
+            rewards[eaters] = 20
+            closer = new_distance[movers] < self.prev_distance[movers]
+            further = new_distance[movers] > self.prev_distance[movers]
+            rewards[movers] = closer.astype(np.float32) - further.astype(np.float32)
+            self.prev_distance[alive] = new_distance[alive]
+        else:
+            # 4. Récompenses de SnakeEnv (+10 pomme)
+            rewards[eaters] = 10
+
+        # 5. Parties terminées : observation finale puis reset automatique (convention SB3)
+        infos = [{} for _ in range(self.num_envs)]
+        dead = np.flatnonzero(dones)
+        if dead.size > 0:
+            terminal_obs = self._get_terminal_observations(dead, new_x[dead], new_y[dead], out[dead])
+            for i, env_idx in enumerate(dead):
+                infos[env_idx]["terminal_observation"] = terminal_obs[i]
+        if won.size > 0:
+            if self.obs_type == "grid":
+                terminal_obs = self._stack_terminal(won, self.grid[won])
+            else:
+                terminal_obs = self._get_vector_observations(won, self.head_x[won], self.head_y[won])
+            for i, env_idx in enumerate(won):
+                infos[env_idx]["terminal_observation"] = terminal_obs[i]
+            dones[won] = True
+        for env_idx in np.flatnonzero(dones):
+            # Comme SnakeEnv : score final (CurriculumCallback)
+            infos[env_idx]["score"] = int(self.score[env_idx])
+            infos[env_idx]["grid_size"] = (w, h)
+        self._reset_games(np.flatnonzero(dones))
+        self._push_frames()
+
+        return self._get_observations(), rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        indices = list(self._get_indices(indices))
+        # Les tableaux "une ligne par partie" sont découpés, le reste est partagé
+        if isinstance(value, np.ndarray) and value.ndim > 0 and value.shape[0] == self.num_envs:
+            return [value[i] for i in indices]
+        return [value for _ in indices]
+
+    def set_attr(self, attr_name, value, indices=None):
+        current = getattr(self, attr_name, None)
+        if isinstance(current, np.ndarray) and current.ndim > 0 and current.shape[0] == self.num_envs:
+            current[list(self._get_indices(indices))] = value
+        else:
+            setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # Il n'y a pas de sous-environnements : la méthode est appelée sur le moteur
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def get_images(self):
+        return [None for _ in range(self.num_envs)]
+
+    def snapshot(self):
+        """
+        Copie de l'état de toutes les parties (et du générateur aléatoire), comme
+        SnakeEnv.snapshot() mais pour tout le moteur : sert à reprendre un entraînement (resume.py).
+        """
+        state = {name: getattr(self, name).copy() for name in STATE_ARRAYS if getattr(self, name, None) is not None}
+        state["slot"] = self._slot
+        state["rng_states"] = [rng.bit_generator.state for rng in self.rngs]
+        return state
+
+    def restore(self, state):
+        """Revient à un état de snapshot() (en place : les tableaux gardent leur adresse)"""
+        for name in STATE_ARRAYS:
+            if name in state:
+                np.copyto(getattr(self, name), state[name])
+        self._slot = state["slot"]
+        for rng, rng_state in zip(self.rngs, state["rng_states"]):
+            rng.bit_generator.state = rng_state
+
+    # ------------------------------------------------------------------
+    # Logique du jeu (vectorisée sur un sous-ensemble de parties `idx`)
+    # ------------------------------------------------------------------
+    def _reset_games(self, idx):
+        w = self.grid_w
+        cx, cy = self.grid_w // 2, self.grid_h // 2
+        # Serpent initial au centre, vers la Droite (queue -> tête)
+        start = np.array([cy * w + cx - 2, cy * w + cx - 1, cy * w + cx], dtype=np.int64)
+
+        self.occupied[idx] = False
+        self.body[idx, :3] = start
+        self.occupied[idx[:, None], start] = True
+        self.free_cells[idx] = np.arange(self.n_cells, dtype=np.int32)
+        self.free_pos[idx] = np.arange(self.n_cells, dtype=np.int32)
+        self.n_free[idx] = self.n_cells
+        for cell in start[::-1]:  # Tête d'abord, comme SnakeEnv.reset : même ordre des cases libres
+            self._remove_free(idx, np.full(idx.size, cell))
+        self.head_ptr[idx] = 2
+        self.length[idx] = 3
+        self.head_x[idx] = cx
+        self.head_y[idx] = cy
+        self.direction[idx] = 1
+        self.score[idx] = 0
+        self.frame_iteration[idx] = 0
+        self._place_food(idx)
+        self.prev_distance[idx] = self._get_distance(idx)
+
+        if self.obs_type == "grid":
+            self.grid_flat[idx] = EMPTY
+            self.grid_flat[idx[:, None], start[:2]] = BODY
+            self.grid_flat[idx, start[2]] = HEAD
+            self.grid_flat[idx, self.food[idx]] = FOOD
+            if self.frames is not None:
+                self.frames[idx] = EMPTY  # Images "avant" le reset : noires (comme VecFrameStack)
+
+    def _remove_free(self, idx, cells):
+        """Retire une case libre par partie (swap avec la dernière case libre)"""
+        i = self.free_pos[idx, cells]
+        last = self.n_free[idx] - 1
+        last_cell = self.free_cells[idx, last]
+        self.free_cells[idx, i] = last_cell
+        self.free_pos[idx, last_cell] = i
+        self.free_cells[idx, last] = cells
+        self.free_pos[idx, cells] = last
+        self.n_free[idx] = last
+
+    def _add_free(self, idx, cells):
+        """Rend une case libre par partie (swap avec la première case occupée)"""
+        i = self.free_pos[idx, cells]
+        first = self.n_free[idx]
+        first_cell = self.free_cells[idx, first]
+        self.free_cells[idx, i] = first_cell
+        self.free_pos[idx, first_cell] = i
+        self.free_cells[idx, first] = cells
+        self.free_pos[idx, cells] = first
+        self.n_free[idx] = first + 1
+
+    def _place_food(self, idx):
+        """
+        Tirage uniforme parmi les cases libres, en O(1) quel que soit le remplissage.
+        Renvoie, pour chaque partie, False si la grille est pleine (pomme inchangée).
+        """
+        placed = self.n_free[idx] > 0
+        idx = idx[placed]
+        # Blocs épuisés : un tirage de FOOD_BLOCK valeurs par partie concernée (rare)
+        for i in idx[self.food_pos[idx] == FOOD_BLOCK]:
+            self.food_u[i] = self.rngs[i].random(FOOD_BLOCK)
+            self.food_pos[i] = 0
+        u = self.food_u[idx, self.food_pos[idx]]
+        self.food_pos[idx] += 1
+        r = (u * self.n_free[idx]).astype(np.int64)
+        self.food[idx] = self.free_cells[idx, r]
+        return placed
+
+    def _get_distance(self, idx):
+        """Distance de Manhattan (en cases) entre la tête et la pomme"""
+        food_x = self.food[idx] % self.grid_w
+        food_y = self.food[idx] // self.grid_w
+        return np.abs(self.head_x[idx] - food_x) + np.abs(self.head_y[idx] - food_y)
+
+    def _push_frames(self):
+        """Empilement : une seule nouvelle image par partie et par pas (dans sa case et son miroir)"""
+        if self.frames is None:
+            return
+        k = self.frame_stack
+        self._slot = (self._slot + 1) % k
+        self.frames[:, self._slot] = self.grid[:, 0]
+        self.frames[:, self._slot + k] = self.grid[:, 0]
+
+    def _stack_terminal(self, idx, grid):
+        """Observation finale empilée : les K - 1 images précédentes, puis `grid` (n, 1, H, W)"""
+        if self.frames is None:
+            return grid
+        s = self._slot
+        return np.concatenate((self.frames[idx, s + 2:s + 1 + self.frame_stack], grid), axis=1)
+
+    def _get_observations(self):
+        if self.frames is not None:
+            return self.frames[:, self._slot + 1:self._slot + 1 + self.frame_stack].copy()
+        if self.obs_type == "grid":
+            return self.grid.copy()
+        return self._get_vector_observations(self._all, self.head_x, self.head_y)
+
+    def _get_vector_observations(self, idx, head_x, head_y):
+        """Vecteur de 11 valeurs de SnakeEnv, pour plusieurs parties à la fois"""
+        w, h = self.grid_w, self.grid_h
+        direction = self.direction[idx]
+
+        # Danger dans les 4 directions absolues (G, D, H, B)
+        px = head_x[:, None] + DX[None, :]
+        py = head_y[:, None] + DY[None, :]
+        out = (px < 0) | (px >= w) | (py < 0) | (py >= h)
+        cells = np.where(out, 0, py * w + px)
+        danger = out | self.occupied[idx[:, None], cells]
+
+        rows = np.arange(idx.size)
+        food_x = self.food[idx] % w
+        food_y = self.food[idx] // w
+
+        obs = np.zeros((idx.size, 11), dtype=np.int8)
+        obs[:, 0] = danger[rows, direction]            # Danger Tout Droit
+        obs[:, 1] = danger[rows, RIGHT_OF[direction]]  # Danger à Droite
+        obs[:, 2] = danger[rows, LEFT_OF[direction]]   # Danger à Gauche
+        obs[rows, 3 + direction] = 1                   # Direction actuelle
+        obs[:, 7] = food_x < head_x                    # Pomme à Gauche
+        obs[:, 8] = food_x > head_x                    # Pomme à Droite
+        obs[:, 9] = food_y < head_y                    # Pomme en Haut
+        obs[:, 10] = food_y > head_y                   # Pomme en Bas
+        return obs
+
+    def _get_terminal_observations(self, idx, new_x, new_y, out):
+        """
+        Observation renvoyée au moment du Game Over, comme dans les envs mono-partie :
+        la nouvelle tête est ajoutée mais la queue n'est pas retirée.
+        """
+        if self.obs_type == "vector":
+            return self._get_vector_observations(idx, new_x, new_y)
+
+        grid = self.grid[idx].copy()
+        flat = grid.reshape(idx.size, self.n_cells)
+        rows = np.arange(idx.size)
+        flat[rows, self.body[idx, self.head_ptr[idx]]] = BODY
+        inside = ~out
+        flat[rows[inside], new_y[inside] * self.grid_w + new_x[inside]] = HEAD
+        flat[rows, self.food[idx]] = FOOD
+        return self._stack_terminal(idx, grid)
@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+import traceback
+from copy import deepcopy
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+
+def gil_enabled():
+    """False seulement sur un CPython "free-threaded" (3.13t, 3.14t...) lancé sans GIL"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)  # Python >= 3.13
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+class ThreadVecEnv(DummyVecEnv):
+    """
+    Variante de DummyVecEnv : les environnements sont répartis en blocs contigus, un
+    bloc par thread, et les blocs avancent en même temps. Sans GIL (CPython free-threaded),
+    c'est du vrai parallélisme sans processus, sans pickling ni copie des observations :
+    pas besoin du `if __name__ == "__main__"` de SubprocVecEnv.
+
+    Avec le GIL, les threads ne feraient que se passer la main : on revient alors au
+    pas séquentiel de DummyVecEnv (sauf force_threads=True, pour tester).
+
+    Les threads sont créés une fois pour toutes et synchronisés par deux barrières
+    (début / fin du pas) ; le thread principal avance lui-même le premier bloc.
+
+    S'utilise comme DummyVecEnv :
+        make_vec_env(SnakeEnvCnn, n_envs=16, vec_env_cls=ThreadVecEnv)
+
+    :param env_fns: Fonctions créant les environnements
+    :param n_threads: Nombre de threads (défaut : un par coeur, au plus un par env)
+    :param force_threads: Utiliser les threads même si le GIL est actif
+    """
+
+    def __init__(self, env_fns, n_threads=None, force_threads=False):
+        super().__init__(env_fns)
+        if n_threads is None:
+            n_threads = os.cpu_count() or 1
+        n_threads = max(1, min(n_threads, self.num_envs))
+        if gil_enabled() and not force_threads:
+            n_threads = 1
+        self.n_threads = n_threads
+        self.chunks = [range(c[0], c[-1] + 1) for c in np.array_split(np.arange(self.num_envs), n_threads)]
+
+        self._closing = False
+        self._errors = [None] * n_threads
+        self._threads = []
+        if n_threads > 1:
+            self._start = threading.Barrier(n_threads)
+            self._done = threading.Barrier(n_threads)
+            for i in range(1, n_threads):
+                # daemon=True : un programme qui oublie close() ne reste pas bloqué à la sortie
+                thread = threading.Thread(target=self._worker, args=(i,), daemon=True, name=f"ThreadVecEnv-{i}")
+                thread.start()
+                self._threads.append(thread)
+
+    def step_wait(self):
+        if self.n_threads == 1:
+            return super().step_wait()
+        self._start.wait()
+        self._run_chunk(0)
+        self._done.wait()
+        for error in self._errors:
+            if error is not None:
+                self._errors = [None] * self.n_threads
+                raise error
+        return (self._obs_from_buf(), np.copy(self.buf_rews), np.copy(self.buf_dones), deepcopy(self.buf_infos))
+
+    def close(self):
+        if self._threads:
+            self._closing = True
+            self._start.wait()  # Réveille les threads, qui voient _closing et s'arrêtent
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+            self.n_threads = 1
+        super().close()
+
+    def _worker(self, i):
+        while True:
+            self._start.wait()
+            if self._closing:
+                return
+            self._run_chunk(i)
+            self._done.wait()
+
+    def _run_chunk(self, i):
+        """Même boucle que DummyVecEnv.step_wait, sur le bloc d'envs du thread i"""
+        try:
+            for env_idx in self.chunks[i]:
+                obs, self.buf_rews[env_idx], terminated, truncated, self.buf_infos[env_idx] = self.envs[env_idx].step(
+                    self.actions[env_idx]
+                )
+                self.buf_dones[env_idx] = terminated or truncated
+                self.buf_infos[env_idx]["TimeLimit.truncated"] = truncated and not terminated
+                if self.buf_dones[env_idx]:
+                    self.buf_infos[env_idx]["terminal_observation"] = obs
+                    obs, self.reset_infos[env_idx] = self.envs[env_idx].reset()
+                self._save_obs(env_idx, obs)
+        except Exception:
+            self._errors[i] = RuntimeError(f"Erreur dans le thread {i} :\n{traceback.format_exc()}")
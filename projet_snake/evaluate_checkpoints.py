@@ -0,0 +1,260 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Évaluation non interactive de tous les checkpoints, en parallèle.
+#
+#   python evaluate_checkpoints.py                    -> évalue les nouveaux checkpoints, écrit le classement
+#   python evaluate_checkpoints.py --episodes 500     -> plus de parties par checkpoint
+#   python evaluate_checkpoints.py --dirs autre/dossier
+#
+# Chaque checkpoint joue les MÊMES parties (seeds seed, seed+1, ...) : les scores sont comparables.
+# Les résultats sont mis en cache par hash du fichier : une relance n'évalue que les nouveaux fichiers.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIRS = [os.path.join(SCRIPT_DIR, "checkpoints")]
+DEFAULT_CACHE = os.path.join(SCRIPT_DIR, "eval_cache.json")
+DEFAULT_CSV = os.path.join(SCRIPT_DIR, "leaderboard.csv")
+DEFAULT_JSON = os.path.join(SCRIPT_DIR, "leaderboard.json")
+
+COLUMNS = ["rank", "checkpoint", "env", "timesteps", "episodes",
+           "score_mean", "score_median", "score_max", "score_std", "length_mean", "sha256"]
+
+
+def find_checkpoints(dirs):
+    """Tous les .zip des dossiers (récursivement), comme test_play.py"""
+    paths = []
+    for folder in dirs:
+        for root, _, files in os.walk(folder):
+            paths.extend(os.path.join(root, f) for f in files if f.endswith(".zip"))
+    return sorted(paths)
+
+
+def display_name(path):
+    """Chemin relatif au projet (absolu si le fichier est ailleurs)"""
+    rel = os.path.relpath(os.path.abspath(path), SCRIPT_DIR)
+    return os.path.abspath(path) if rel.startswith("..") else rel
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def parse_timesteps(path):
+    """Nombre de pas dans le nom donné par CheckpointCallback (snake_cnn_200000_steps.zip)"""
+    match = re.search(r"_(\d+)_steps\.zip$", path)
+    return int(match.group(1)) if match else None
+
+
+# ----------------------------------------------------------------------
+# Côté worker
+# ----------------------------------------------------------------------
+_models = {}  # Modèles déjà chargés dans ce processus (un worker reçoit plusieurs lots du même checkpoint)
+
+
+def _init_worker():
+    # Un thread PyTorch par processus : c'est le pool qui fait le parallélisme
+    import torch as th
+    th.set_num_threads(1)
+
+
+def _load(path):
+    if path not in _models:
+        from stable_baselines3 import PPO
+
+        model = PPO.load(path, device="cpu")
+        _models[path] = (model, env_class_for(model))
+    return _models[path]
+
+
+def env_class_for(model):
+    """
+    Retrouve l'environnement d'entraînement d'un modèle grâce à la forme de ses observations.
+    Renvoie (classe, kwargs) : pour le CNN, le nombre de grilles empilées (frame_stack) ;
+    pour SnakeEnv, le mode d'observation s'il n'est pas "vector".
+    """
+    from envs.snake_env import SnakeEnv, LIDAR_SIZE
+    from envs.snake_env_cnn import SnakeEnvCnn
+
+    shape = model.observation_space.shape
+    if shape == SnakeEnv().observation_space.shape:
+        return SnakeEnv, {}
+    if shape == (LIDAR_SIZE,):
+        return SnakeEnv, {"obs_mode": "lidar"}
+    if len(shape) == 3 and shape[1:] == SnakeEnvCnn().observation_space.shape[1:]:
+        return SnakeEnvCnn, {"frame_stack": shape[0]}
+    raise ValueError(f"Observation {shape} inconnue")
+
+
+def evaluate_seeds(path, seeds, deterministic=True):
+    """
+    Joue une partie par seed et renvoie (env, scores, longueurs).
+    Toutes les parties du lot avancent ensemble : une seule passe du réseau par pas.
+    """
+    model, (env_cls, env_kwargs) = _load(path)
+    scores, lengths = play_games(model, env_cls, env_kwargs, seeds, deterministic)
+    return env_cls.__name__, scores, lengths
+
+
+def play_games(model, env_cls, env_kwargs, seeds, deterministic=True):
+    """Une partie par seed avec un modèle déjà chargé (aussi utilisé par sweep.py) ; renvoie (scores, longueurs)"""
+    import torch as th
+    th.manual_seed(int(seeds[0]))  # Pour que --stochastic soit aussi reproductible
+    envs = [env_cls(**env_kwargs) for _ in seeds]
+    obs = [env.reset(seed=int(seed))[0] for env, seed in zip(envs, seeds)]
+    scores = [0] * len(envs)
+    lengths = [0] * len(envs)
+    active = list(range(len(envs)))
+    while active:
+        actions, _ = model.predict(np.stack([obs[i] for i in active]), deterministic=deterministic)
+        still_active = []
+        for i, action in zip(active, actions):
+            obs[i], _, terminated, truncated, _ = envs[i].step(int(action))
+            lengths[i] += 1
+            if terminated or truncated:
+                scores[i] = envs[i].score
+            else:
+                still_active.append(i)
+        active = still_active
+    return scores, lengths
+
+
+# ----------------------------------------------------------------------
+# Côté processus principal
+# ----------------------------------------------------------------------
+def summarize(path, digest, env_name, scores, lengths):
+    scores = np.asarray(scores)
+    return {
+        "checkpoint": display_name(path),
+        "env": env_name,
+        "timesteps": parse_timesteps(path),
+        "episodes": int(scores.size),
+        "score_mean": float(scores.mean()),
+        "score_median": float(np.median(scores)),
+        "score_max": int(scores.max()),
+        "score_std": float(scores.std()),
+        "length_mean": float(np.mean(lengths)),
+        "sha256": digest,
+        "scores": scores.tolist(),
+        "lengths": list(lengths),
+    }
+
+
+def load_cache(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(cache, path):
+    # Écriture atomique : un Ctrl+C pendant l'écriture ne corrompt pas le cache
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def write_leaderboard(rows, csv_path, json_path):
+    rows = sorted(rows, key=lambda r: (-r["score_mean"], -r["score_median"], r["checkpoint"]))
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(json_path, "w") as f:
+        json.dump([{k: row[k] for k in COLUMNS} for row in rows], f, indent=2)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évalue tous les checkpoints et écrit un classement")
+    parser.add_argument("--dirs", nargs="+", default=DEFAULT_DIRS, help="Dossiers où chercher les .zip")
+    parser.add_argument("--episodes", type=int, default=200, help="Parties par checkpoint")
+    parser.add_argument("--seed", type=int, default=0, help="Seed de la première partie")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processus d'évaluation")
+    parser.add_argument("--chunk", type=int, default=50, help="Parties par tâche envoyée à un worker")
+    parser.add_argument("--stochastic", action="store_true", help="Actions échantillonnées (sinon déterministes)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="Fichier JSON du cache")
+    parser.add_argument("--no-cache", action="store_true", help="Tout réévaluer")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--json", default=DEFAULT_JSON)
+    args = parser.parse_args()
+
+    paths = find_checkpoints(args.dirs)
+    if not paths:
+        print(f"Aucun checkpoint trouvé dans : {', '.join(args.dirs)}")
+        return 1
+
+    # La clé contient aussi les réglages : changer --episodes ou --seed relance l'évaluation
+    settings = f"episodes={args.episodes},seed={args.seed},stochastic={args.stochastic}"
+    cache = {} if args.no_cache else load_cache(args.cache)
+    rows, todo = [], []
+    for path in paths:
+        digest = file_hash(path)
+        entry = cache.get(f"{digest}:{settings}")
+        if entry is not None:
+            entry["checkpoint"] = display_name(path)  # Le fichier a pu être déplacé
+            entry["timesteps"] = parse_timesteps(path)
+            rows.append(entry)
+        else:
+            todo.append((path, digest))
+    print(f"{len(paths)} checkpoints, {len(paths) - len(todo)} déjà en cache, {len(todo)} à évaluer "
+          f"({args.episodes} parties chacun, {args.workers} workers)")
+
+    seeds = list(range(args.seed, args.seed + args.episodes))
+    chunks = [seeds[i:i + args.chunk] for i in range(0, len(seeds), args.chunk)]
+    start = time.perf_counter()
+    if todo:
+        partial = {path: {} for path, _ in todo}  # path -> {numéro du lot: résultat}
+        digests = dict(todo)
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(evaluate_seeds, path, chunk, not args.stochastic): (path, k)
+                       for path, _ in todo for k, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                path, k = futures[future]
+                if path not in partial:
+                    continue  # Un autre lot de ce checkpoint a déjà échoué
+                try:
+                    partial[path][k] = future.result()
+                except Exception as e:
+                    print(f"  ÉCHEC {display_name(path)} : {e}")
+                    del partial[path]
+                    continue
+                if len(partial[path]) == len(chunks):
+                    done = partial.pop(path)
+                    results = [done[k] for k in range(len(chunks))]  # Dans l'ordre des seeds
+                    env_name = results[0][0]
+                    scores = [s for _, chunk_scores, _ in results for s in chunk_scores]
+                    lengths = [n for _, _, chunk_lengths in results for n in chunk_lengths]
+                    row = summarize(path, digests[path], env_name, scores, lengths)
+                    rows.append(row)
+                    cache[f"{digests[path]}:{settings}"] = row
+                    save_cache(cache, args.cache)  # Après chaque checkpoint : une relance reprend ici
+                    print(f"  {row['checkpoint']:<55} score moyen {row['score_mean']:6.2f}  max {row['score_max']}")
+        print(f"Évaluation : {time.perf_counter() - start:.1f} s")
+
+    rows = write_leaderboard(rows, args.csv, args.json)
+    print(f"\n{'#':>3}  {'Checkpoint':<55} {'Moyenne':>8} {'Médiane':>8} {'Max':>5} {'Longueur':>9}")
+    for row in rows[:20]:
+        print(f"{row['rank']:>3}  {row['checkpoint']:<55} {row['score_mean']:>8.2f} {row['score_median']:>8.1f} "
+              f"{row['score_max']:>5} {row['length_mean']:>9.1f}")
+    print(f"\nClassement enregistré dans : {args.csv} et {args.json}")
+    return 0
+
+
+if __name__ == "__main__":  # Obligatoire pour le pool de processus
+    sys.exit(main())
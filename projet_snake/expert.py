@@ -0,0 +1,165 @@
+from collections import deque
+
+# Expert scripté pour SnakeEnv / SnakeEnvCnn (démonstrations pour le behaviour cloning).
+#
+#   expert = SnakeExpert(env)
+#   obs, _ = env.reset()
+#   expert.reset()
+#   action = expert.act()
+#
+# 1. Plus court chemin vers la pomme (BFS sur la grille, en tenant compte du corps qui
+#    libère ses cases au fil des pas). On simule le serpent au bout du chemin : si sa tête
+#    peut encore rejoindre sa queue, le chemin est sûr et on le suit jusqu'à la pomme
+#    (sans recalculer : le jeu est déterministe tant qu'on ne mange pas).
+# 2. Sinon, on suit un cycle hamiltonien de la grille (il ne se coupe jamais), ou à défaut
+#    le coup qui garde la queue atteignable, ou celui qui laisse le plus de place.
+#
+# Travaille directement sur l'état du jeu (head, snake, food...) : aucune observation utilisée.
+
+# Action -> déplacement (0: Gauche, 1: Droite, 2: Haut, 3: Bas)
+MOVES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def hamiltonian_cycle(w, h):
+    """Cycle passant une fois par chaque case (w pair) : ligne du haut, zigzag, retour par la colonne 0"""
+    cycle = [(x, 0) for x in range(w)]
+    for i, x in enumerate(range(w - 1, 0, -1)):
+        rows = range(1, h) if i % 2 == 0 else range(h - 1, 0, -1)
+        cycle += [(x, y) for y in rows]
+    cycle += [(0, y) for y in range(h - 1, 0, -1)]
+    return cycle
+
+
+class SnakeExpert:
+    def __init__(self, env):
+        self.env = env.unwrapped
+        w, h = self.env.grid_w, self.env.grid_h
+        self.w = w
+        self.n_cells = w * h
+        # Voisins de chaque case : liste de (action, case voisine) dans la grille
+        self.neighbors = []
+        for cell in range(self.n_cells):
+            x, y = cell % w, cell // w
+            self.neighbors.append([(a, (y + dy) * w + x + dx) for a, (dx, dy) in enumerate(MOVES)
+                                   if 0 <= x + dx < w and 0 <= y + dy < h])
+        # Case suivante sur le cycle hamiltonien (None si la grille n'en a pas de simple)
+        self.next_on_cycle = None
+        if w % 2 == 0:
+            cycle = [y * w + x for x, y in hamiltonian_cycle(w, h)]
+            self.next_on_cycle = [0] * self.n_cells
+            for i, cell in enumerate(cycle):
+                self.next_on_cycle[cell] = cycle[(i + 1) % len(cycle)]
+        self.reset()
+
+    def reset(self):
+        """À appeler après env.reset() : oublie le chemin en cours"""
+        self._plan = []        # Actions restantes vers la pomme
+        self._plan_heads = []  # Case de la tête attendue avant chaque action du plan
+        self._plan_food = None
+
+    # ------------------------------------------------------------------
+    def act(self):
+        env = self.env
+        head = env.head[1] * self.w + env.head[0]
+        food = env.food[1] * self.w + env.food[0]
+
+        # Plan encore valable : même pomme et la tête est là où on l'attendait
+        if self._plan and self._plan_food == food and self._plan_heads[-1] == head:
+            self._plan_heads.pop()
+            return self._plan.pop()
+
+        body = list(env.snake)
+        path = self._search(body, head, food)
+        if path is not None and self._tail_reachable(self._advance(body, [c for _, c in path], eat=True)):
+            # On stocke le plan à l'envers : pop() donne l'action suivante
+            self._plan = [a for a, _ in reversed(path)]
+            self._plan_heads = [c for _, c in reversed(path)][1:] + [head]
+            self._plan_food = food
+            self._plan_heads.pop()
+            return self._plan.pop()
+        self._plan = []
+        return self._fallback(body, head, food)
+
+    def _fallback(self, body, head, food):
+        free_at = self._free_at(body)
+        safe, candidates = [], []
+        for action, cell in self.neighbors[head]:
+            if free_at[cell] >= 1:
+                continue  # Collision au prochain pas
+            new_body = self._advance(body, [cell], eat=cell == food)
+            candidates.append((action, cell, new_body))
+            if self._tail_reachable(new_body):
+                safe.append((action, cell, new_body))
+        if not candidates:
+            return self.env.direction  # Plus aucun coup possible : tout droit
+        if safe:
+            if self.next_on_cycle is not None:
+                for action, cell, _ in safe:
+                    if cell == self.next_on_cycle[head]:
+                        return action
+            # Le plus long détour vers la queue : laisse le temps à la place de se libérer
+            return max(safe, key=lambda c: self._distance_to_tail(c[2]))[0]
+        return max(candidates, key=lambda c: self._area(c[2]))[0]
+
+    # ------------------------------------------------------------------
+    # Recherches sur la grille
+    # ------------------------------------------------------------------
+    def _free_at(self, body):
+        """Pas à partir duquel chaque case est libre : le segment i (tête = 0) part après len - i pas"""
+        free_at = [0] * self.n_cells
+        n = len(body)
+        for i, cell in enumerate(body):
+            free_at[cell] = n - i
+        return free_at
+
+    def _search(self, body, start, target, free_at=None):
+        """Plus court chemin [(action, case), ...] de start à target, ou None"""
+        if free_at is None:
+            free_at = self._free_at(body)
+        dist = {start: 0}
+        parent = {}
+        queue = deque([start])
+        neighbors = self.neighbors
+        while queue:
+            cell = queue.popleft()
+            d = dist[cell] + 1
+            for action, nxt in neighbors[cell]:
+                if nxt in dist or free_at[nxt] >= d:
+                    continue
+                dist[nxt] = d
+                parent[nxt] = (cell, action)
+                if nxt == target:
+                    path = []
+                    while nxt != start:
+                        prev, action = parent[nxt]
+                        path.append((action, nxt))
+                        nxt = prev
+                    path.reverse()
+                    return path
+                queue.append(nxt)
+        return None
+
+    def _advance(self, body, cells, eat):
+        """Corps après avoir suivi `cells` (la dernière case est mangée si eat)"""
+        length = len(body) + (1 if eat else 0)
+        return (list(reversed(cells)) + body)[:length]
+
+    def _tail_reachable(self, body):
+        return len(body) < 2 or self._search(body, body[0], body[-1]) is not None
+
+    def _distance_to_tail(self, body):
+        path = self._search(body, body[0], body[-1])
+        return 0 if path is None else len(path)
+
+    def _area(self, body):
+        """Nombre de cases atteignables depuis la tête (remplissage)"""
+        free_at = self._free_at(body)
+        seen = {body[0]}
+        queue = deque([body[0]])
+        while queue:
+            cell = queue.popleft()
+            for _, nxt in self.neighbors[cell]:
+                if nxt not in seen and free_at[nxt] == 0:
+                    seen.add(nxt)
+                    queue.append(nxt)
+        return len(seen)
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+import torch as th
+import torch.nn as nn
+from stable_baselines3.common.preprocessing import is_image_space
+
+from evaluate_checkpoints import find_checkpoints, env_class_for, file_hash, parse_timesteps, play_games, SCRIPT_DIR
+
+# Exporte la politique d'un checkpoint PPO en un graphe autonome (TorchScript ou ONNX),
+# à jouer avec play_exported.py SANS stable-baselines3 (ni CustomCNN à redéfinir).
+#
+#   python export_policy.py                                   -> dernier checkpoint, TorchScript
+#   python export_policy.py --model checkpoints/PPO_CNN/snake_cnn_500000_steps.zip
+#   python export_policy.py --format onnx                     -> nécessite : pip install onnx onnxscript
+#   python export_policy.py --quantize static                 -> poids et activations en int8 (CPU)
+#
+# Le graphe contient tout ce que fait model.predict(obs, deterministic=True) :
+#   obs brute (int8 / uint8) -> float (/255 pour les images) -> extracteur -> MLP acteur -> logits
+# Il renvoie (action, logits) : l'action = argmax des logits, les logits servent au mode stochastique.
+# Un fichier .json à côté décrit l'env à recréer (classe, frame_stack, forme et type des obs).
+# Après l'écriture, on vérifie que le graphe choisit les mêmes actions que model.predict.
+#
+# Quantification int8 (TorchScript seulement), pour jouer plus vite sur CPU :
+#   dynamic : poids des couches Linear en int8, activations quantifiées à la volée ;
+#   static  : convolutions ET Linear en int8, plages des activations calibrées sur des parties du modèle.
+# La vérification compare alors l'accord des actions et le score moyen (--games) avec la politique fp32.
+
+EXPORT_DIR = os.path.join(SCRIPT_DIR, "exported")
+FORMATS = {"torchscript": ".pt", "onnx": ".onnx"}
+QUANTIZE_GAMES = 100  # Parties jouées par défaut pour comparer le score fp32 / int8
+
+# torch >= 2.9 annonce la fin de torch.jit, mais c'est le format que charge play_exported.py
+warnings.filterwarnings("ignore", category=FutureWarning, module="torch.jit")
+
+
+class PolicyGraph(nn.Module):
+    """
+    La partie acteur de la politique SB3 (le critique ne sert pas pour jouer).
+    Même conversion des observations que preprocess_obs de SB3, écrite ici pour que FX puisse la suivre.
+    """
+
+    def __init__(self, policy):
+        super().__init__()
+        self.normalize = policy.normalize_images and is_image_space(policy.observation_space)
+        self.features_extractor = policy.pi_features_extractor
+        self.policy_net = policy.mlp_extractor.policy_net
+        self.action_net = policy.action_net
+
+    def forward(self, obs):
+        x = obs.float()
+        if self.normalize:
+            x = x / 255.0
+        logits = self.action_net(self.policy_net(self.features_extractor(x)))
+        return logits.argmax(dim=1), logits
+
+
+def sample_observations(env_cls, env_kwargs, n, seed, model=None):
+    """
+    Observations de vraies parties pour tracer, calibrer et vérifier le graphe :
+    actions au hasard, ou celles du modèle (les situations qu'il rencontre vraiment en jouant).
+    """
+    env = env_cls(**env_kwargs)
+    rng = np.random.default_rng(seed)
+    obs, _ = env.reset(seed=seed)
+    samples = []
+    while len(samples) < n:
+        samples.append(obs)
+        action = model.predict(obs, deterministic=True)[0] if model is not None else rng.integers(4)
+        obs, _, terminated, truncated, _ = env.step(int(action))
+        if terminated or truncated:
+            obs, _ = env.reset()
+    return np.stack(samples)
+
+
+def quantize(graph, mode, calibration):
+    """Copie int8 du graphe pour le moteur de quantification de cette machine (x86, ou qnnpack sur ARM)"""
+    from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    # torch >= 2.9 renvoie vers torchao (pas dans requirements.txt) : torch.ao marche encore, sans les avertissements
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if mode == "dynamic":
+            return quantize_dynamic(graph, {nn.Linear}, dtype=th.qint8)
+        # FX : suit forward() jusqu'aux couches, fusionne Conv+ReLU / Linear+ReLU et place les observateurs
+        prepared = prepare_fx(graph, get_default_qconfig_mapping(th.backends.quantized.engine), (calibration[:1],))
+        with th.no_grad():
+            for batch in calibration.split(256):
+                prepared(batch)
+        return convert_fx(prepared)
+
+
+def export_torchscript(graph, example, path):
+    with th.no_grad():
+        traced = th.jit.trace(graph, example)
+    # freeze : poids figés en constantes, un peu moins de travail à chaque appel
+    th.jit.save(th.jit.freeze(traced), path)
+
+
+def export_onnx(graph, example, path):
+    try:
+        th.onnx.export(graph, (example,), path, input_names=["obs"], output_names=["action", "logits"],
+                       dynamic_axes={"obs": {0: "batch"}, "action": {0: "batch"}, "logits": {0: "batch"}})
+    except ImportError as e:  # onnx / onnxscript ne sont pas dans requirements.txt
+        raise SystemExit(f"Export ONNX impossible ({e}). Installer : pip install onnx onnxscript")
+    if os.path.exists(path + ".data"):
+        # Les poids sont écrits à part par l'exporteur récent : on les remet dans un seul fichier
+        import onnx
+
+        onnx.save(onnx.load(path), path)
+        os.remove(path + ".data")
+
+
+def check_export(exported, model, observations):
+    """Rejoue les observations avec le fichier exporté ; renvoie (actions identiques, écart max des logits)"""
+    actions, logits = exported.forward(observations)
+    expected, _ = model.predict(observations, deterministic=True)
+    with th.no_grad():
+        reference = model.policy.get_distribution(model.policy.obs_to_tensor(observations)[0]).distribution.logits
+    # Les logits SB3 sont normalisés (log-softmax) : on compare à une constante près par ligne
+    gap = (logits - logits.max(axis=1, keepdims=True)) - (reference.numpy() - reference.numpy().max(axis=1, keepdims=True))
+    return int((actions == expected).sum()), float(np.abs(gap).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporte un checkpoint PPO en TorchScript ou ONNX")
+    parser.add_argument("--model", help="Checkpoint .zip (par défaut : le plus récent de checkpoints/)")
+    parser.add_argument("--format", choices=FORMATS, default="torchscript")
+    parser.add_argument("--output", help=f"Fichier de sortie (par défaut : exported/<nom du checkpoint>{FORMATS['torchscript']})")
+    parser.add_argument("--quantize", choices=["dynamic", "static"], help="Quantification int8 (TorchScript)")
+    parser.add_argument("--check", type=int, default=1000, help="Observations pour vérifier l'export (0 = pas de vérif)")
+    parser.add_argument("--games", type=int,
+                        help=f"Parties pour comparer le score moyen (défaut : {QUANTIZE_GAMES} avec --quantize, sinon 0)")
+    parser.add_argument("--min-agreement", type=float,
+                        help="Accord minimal des actions, sinon code de sortie 1 (défaut : 1.0, ou 0.95 avec --quantize)")
+    args = parser.parse_args()
+    if args.quantize and args.format == "onnx":
+        parser.error("--quantize : TorchScript seulement")
+    games = args.games if args.games is not None else (QUANTIZE_GAMES if args.quantize else 0)
+    min_agreement = args.min_agreement if args.min_agreement is not None else (0.95 if args.quantize else 1.0)
+
+    from stable_baselines3 import PPO
+
+    path = args.model
+    if path is None:
+        paths = find_checkpoints([os.path.join(SCRIPT_DIR, "checkpoints")])
+        if not paths:
+            print("Aucun modèle trouvé dans le dossier 'checkpoints' !")
+            return 1
+        path = max(paths, key=os.path.getctime)
+    th.set_num_threads(1)
+    model = PPO.load(path, device="cpu")
+    model.policy.set_training_mode(False)
+    env_cls, env_kwargs = env_class_for(model)
+    print(f"Chargement de : {path} ({env_cls.__name__})")
+
+    suffix = f"_int8_{args.quantize}" if args.quantize else ""
+    output = args.output or os.path.join(
+        EXPORT_DIR, os.path.splitext(os.path.basename(path))[0] + suffix + FORMATS[args.format])
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    graph = PolicyGraph(model.policy).eval()
+    example = th.as_tensor(sample_observations(env_cls, env_kwargs, 8, seed=0))
+    if args.quantize:
+        calibration = th.as_tensor(sample_observations(env_cls, env_kwargs, 2048, seed=2, model=model))
+        graph = quantize(graph, args.quantize, calibration)
+    if args.format == "onnx":
+        export_onnx(graph, example, output)
+    else:
+        export_torchscript(graph, example, output)
+
+    space = model.observation_space
+    meta = {
+        "format": args.format,
+        "env": env_cls.__name__,
+        "env_kwargs": env_kwargs,
+        "obs_shape": list(space.shape),
+        "obs_dtype": space.dtype.name,
+        "quantize": args.quantize,
+        "quantized_engine": th.backends.quantized.engine if args.quantize else None,
+        "n_actions": int(model.action_space.n),
+        "source": os.path.relpath(os.path.abspath(path), SCRIPT_DIR),
+        "source_sha256": file_hash(path),
+        "timesteps": parse_timesteps(path) or model.num_timesteps,
+    }
+    with open(os.path.splitext(output)[0] + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Écrit : {output} ({os.path.getsize(output) / 1e6:.2f} Mo)")
+
+    from play_exported import ExportedPolicy
+
+    exported = ExportedPolicy(output)
+    if args.check:
+        # Moitié au hasard, moitié jouées par le modèle
+        observations = np.concatenate([
+            sample_observations(env_cls, env_kwargs, args.check - args.check // 2, seed=1),
+            sample_observations(env_cls, env_kwargs, args.check // 2, seed=1, model=model)])
+        same, gap = check_export(exported, model, observations)
+        print(f"Vérification sur {len(observations)} observations : {same} actions identiques "
+              f"({same / len(observations):.1%}), écart max des logits {gap:.2e}")
+        if same < min_agreement * len(observations):
+            print(f"!!! Le graphe exporté ne joue pas comme le checkpoint (accord < {min_agreement:.0%}).")
+            return 1
+    if games:
+        seeds = list(range(games))  # Les mêmes parties pour les deux politiques
+        reference, _ = play_games(model, env_cls, env_kwargs, seeds)
+        scores, _ = play_games(exported, env_cls, env_kwargs, seeds)
+        print(f"Score moyen sur {games} parties : {np.mean(reference):.2f} (checkpoint) / "
+              f"{np.mean(scores):.2f} (export){' int8 ' + args.quantize if args.quantize else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from expert import SnakeExpert
+
+# Génère des démonstrations de l'expert (expert.py) pour le behaviour cloning (pretrain_bc.py).
+#
+#   python generate_demos.py --obs vector --transitions 1000000    -> demos/vector/ (pour train_v2.py)
+#   python generate_demos.py --obs grid --transitions 1000000      -> demos/grid/   (pour train_v3.py)
+#
+# Chaque worker joue des parties complètes et écrit son propre fichier (shard_XXXX.npz, compressé) :
+# observations, actions, récompenses, fins de partie et retours actualisés (cible du réseau de valeur).
+# Un manifest.json résume le tout.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ENVS = {"vector": SnakeEnv, "grid": SnakeEnvCnn}
+GAMMA = 0.99  # Même gamma que train_v2.py / train_v3.py
+
+
+def discounted_returns(rewards, gamma):
+    returns = np.empty(len(rewards), dtype=np.float32)
+    running = 0.0
+    for t in range(len(rewards) - 1, -1, -1):
+        running = rewards[t] + gamma * running
+        returns[t] = running
+    return returns
+
+
+def generate_shard(obs_type, path, n_transitions, first_seed, max_episode_steps, gamma, frame_stack=1):
+    """Joue des parties de l'expert jusqu'à `n_transitions` pas et les écrit dans `path`"""
+    env = ENVS[obs_type](frame_stack=frame_stack) if obs_type == "grid" else ENVS[obs_type]()
+    expert = SnakeExpert(env)
+    obs_buf = np.empty((n_transitions,) + env.observation_space.shape, dtype=env.observation_space.dtype)
+    actions = np.empty(n_transitions, dtype=np.uint8)
+    rewards = np.empty(n_transitions, dtype=np.int8)
+    dones = np.zeros(n_transitions, dtype=np.bool_)
+    returns = np.empty(n_transitions, dtype=np.float32)
+    scores = []
+    t = 0
+    seed = first_seed
+    while t < n_transitions:
+        obs, _ = env.reset(seed=seed)
+        expert.reset()
+        seed += 1
+        start = t
+        done = False
+        while not done and t < n_transitions:
+            action = expert.act()
+            obs_buf[t] = obs  # Copie (la grille de SnakeEnvCnn est un buffer réutilisé)
+            actions[t] = action
+            obs, reward, terminated, truncated, _ = env.step(action)
+            rewards[t] = reward
+            t += 1
+            done = terminated or truncated or (max_episode_steps and t - start >= max_episode_steps)
+        dones[t - 1] = True
+        returns[start:t] = discounted_returns(rewards[start:t], gamma)
+        scores.append(env.score)
+    np.savez_compressed(path, obs=obs_buf, actions=actions, rewards=rewards, dones=dones, returns=returns)
+    return path, n_transitions, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Démonstrations de l'expert pour le behaviour cloning")
+    parser.add_argument("--obs", choices=list(ENVS), default="vector", help="vector (SnakeEnv) ou grid (SnakeEnvCnn)")
+    parser.add_argument("--transitions", type=int, default=1_000_000, help="Nombre total de pas")
+    parser.add_argument("--shard-size", type=int, default=100_000, help="Pas par fichier (= par tâche)")
+    parser.add_argument("--max-episode-steps", type=int, default=2000,
+                        help="Coupe les parties trop longues (0 = jamais) : plus de débuts de partie, "
+                             "comme ceux que rencontre PPO")
+    parser.add_argument("--frame-stack", type=int, default=1,
+                        help="Grilles empilées (grid seulement, même valeur que FRAME_STACK de train_v3.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Dossier (défaut : demos/<obs>)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(SCRIPT_DIR, "demos", args.obs)
+    os.makedirs(output, exist_ok=True)
+    n_shards = -(-args.transitions // args.shard_size)
+    sizes = [min(args.shard_size, args.transitions - i * args.shard_size) for i in range(n_shards)]
+    print(f"{args.transitions} pas de l'expert ({args.obs}) en {n_shards} fichiers, {args.workers} workers -> {output}")
+
+    start = time.perf_counter()
+    shards, scores = [], []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Seeds espacées d'un million : aucune partie commune entre deux fichiers
+        futures = [pool.submit(generate_shard, args.obs, os.path.join(output, f"shard_{i:04d}.npz"), size,
+                               args.seed + i * 1_000_000, args.max_episode_steps, GAMMA, args.frame_stack)
+                   for i, size in enumerate(sizes)]
+        for future in as_completed(futures):
+            path, n, shard_scores = future.result()
+            shards.append({"file": os.path.basename(path), "transitions": n, "episodes": len(shard_scores)})
+            scores += shard_scores
+            print(f"  {os.path.basename(path)} : {n} pas, {len(shard_scores)} parties, "
+                  f"score moyen {np.mean(shard_scores):.1f}")
+    elapsed = time.perf_counter() - start
+
+    manifest = {
+        "obs": args.obs,
+        "env": ENVS[args.obs].__name__,
+        "frame_stack": args.frame_stack if args.obs == "grid" else 1,
+        "transitions": args.transitions,
+        "episodes": len(scores),
+        "expert_score_mean": float(np.mean(scores)),
+        "max_episode_steps": args.max_episode_steps,
+        "gamma": GAMMA,
+        "shards": sorted(shards, key=lambda s: s["file"]),
+    }
+    with open(os.path.join(output, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"\n{args.transitions} pas en {elapsed:.1f} s ({args.transitions / elapsed:.0f} pas/s), "
+          f"score moyen de l'expert : {manifest['expert_score_mean']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":  # Obligatoire pour le pool de processus
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import time
+
+START = time.perf_counter()  # Temps de démarrage : imports compris
+
+import argparse
+import glob
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+
+# Joue une politique exportée par export_policy.py, SANS stable-baselines3.
+# TorchScript n'a besoin que de torch ; ONNX que de onnxruntime (pip install onnxruntime).
+#
+#   python play_exported.py                          -> regarder le dernier modèle exporté (fenêtre pygame)
+#   python play_exported.py --games 256              -> 256 parties sans affichage, toutes ensemble
+#   python play_exported.py --bench                  -> latence par appel et débit selon la taille du lot
+#   python play_exported.py --model exported/snake_cnn_500000_steps.onnx --threads 2
+#
+# Par défaut, un seul thread d'inférence : un processus par coeur, plein de parties par processus.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.path.join(SCRIPT_DIR, "exported")
+ENV_CLASSES = {"SnakeEnv": SnakeEnv, "SnakeEnvCnn": SnakeEnvCnn}
+
+warnings.filterwarnings("ignore", category=FutureWarning, module="torch.jit")  # Voir export_policy.py
+
+
+class ExportedPolicy:
+    """
+    Politique exportée (.pt ou .onnx) + sa description (.json à côté).
+    predict() a la même signature que celle de SB3 : (actions, None).
+    """
+
+    def __init__(self, path, threads=1, seed=None):
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            self.meta = json.load(f)
+        self.obs_shape = tuple(self.meta["obs_shape"])
+        self.obs_dtype = np.dtype(self.meta["obs_dtype"])
+        self.rng = np.random.default_rng(seed)
+
+        if path.endswith(".onnx"):
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self.forward = lambda obs: tuple(session.run(None, {"obs": obs}))
+        else:
+            import torch as th
+
+            th.set_num_threads(threads)
+            if self.meta.get("quantized_engine"):
+                th.backends.quantized.engine = self.meta["quantized_engine"]  # Celui de la quantification
+            module = th.jit.load(path, map_location="cpu")
+
+            def forward(obs):
+                with th.inference_mode():
+                    actions, logits = module(th.from_numpy(obs))
+                return actions.numpy(), logits.numpy()
+
+            self.forward = forward
+        # Échauffement : TorchScript optimise le graphe pendant les premiers appels
+        for _ in range(2):
+            self.forward(np.zeros((1, *self.obs_shape), dtype=self.obs_dtype))
+
+    def predict(self, obs, deterministic=True):
+        obs = np.ascontiguousarray(obs, dtype=self.obs_dtype)
+        single = obs.shape == self.obs_shape
+        if single:
+            obs = obs[None]
+        actions, logits = self.forward(obs)
+        if not deterministic:
+            # Tirage selon softmax(logits) (astuce de Gumbel : argmax(logits + bruit))
+            actions = np.argmax(logits - np.log(-np.log(self.rng.random(logits.shape))), axis=1)
+        return (actions[0] if single else actions), None
+
+    def make_env(self, **kwargs):
+        """L'environnement d'entraînement (même classe, mêmes frame_stack)"""
+        return ENV_CLASSES[self.meta["env"]](**self.meta["env_kwargs"], **kwargs)
+
+
+def latest_export():
+    paths = glob.glob(os.path.join(EXPORT_DIR, "*.pt")) + glob.glob(os.path.join(EXPORT_DIR, "*.onnx"))
+    return max(paths, key=os.path.getctime) if paths else None
+
+
+def watch(policy, fps, deterministic):
+    """Comme test_play.py : une partie après l'autre dans une fenêtre pygame"""
+    env = policy.make_env(render_mode="human")
+    obs, _ = env.reset()
+    print("Jeu lancé ! (Ctrl+C pour quitter)")
+    try:
+        while True:
+            action, _ = policy.predict(obs, deterministic=deterministic)
+            obs, _, terminated, truncated, _ = env.step(int(action))
+            time.sleep(1 / fps)
+            if terminated or truncated:
+                print(f"Fin de partie. Score : {env.score}")
+                obs, _ = env.reset()
+                time.sleep(1)  # Pause avant de rejouer
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
+
+
+def play_batch(policy, n_games, seed, deterministic):
+    """
+    n_games parties en même temps (seeds seed, seed+1, ...), une passe du réseau par pas.
+    Renvoie (scores, pas joués, secondes passées dans le réseau).
+    """
+    envs = [policy.make_env() for _ in range(n_games)]
+    obs = [env.reset(seed=seed + i)[0] for i, env in enumerate(envs)]
+    scores = [0] * n_games
+    steps = 0
+    inference = 0.0
+    active = list(range(n_games))
+    while active:
+        start = time.perf_counter()
+        actions, _ = policy.predict(np.stack([obs[i] for i in active]), deterministic=deterministic)
+        inference += time.perf_counter() - start
+        still_active = []
+        for i, action in zip(active, actions):
+            obs[i], _, terminated, truncated, _ = envs[i].step(int(action))
+            if terminated or truncated:
+                scores[i] = envs[i].score
+            else:
+                still_active.append(i)
+        steps += len(active)
+        active = still_active
+    return scores, steps, inference
+
+
+def bench(policy, sizes, seconds):
+    """Latence d'un appel et débit (observations/s) pour chaque taille de lot"""
+    env = policy.make_env()
+    obs, _ = env.reset(seed=0)
+    print(f"{'Lot':>6} | {'Appels':>7} | {'Obs/s':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+    print("-" * 54)
+    for size in sizes:
+        batch = np.repeat(obs[None], size, axis=0)
+        policy.predict(batch)  # Échauffement
+        durations = []
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            policy.predict(batch)
+            durations.append(time.perf_counter() - start)
+        d = np.asarray(durations)
+        print(f"{size:>6} | {d.size:>7} | {size / np.median(d):>10.0f} | "
+              f"{np.percentile(d, 50) * 1e3:>9.3f} | {np.percentile(d, 99) * 1e3:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Joue une politique exportée (TorchScript / ONNX) sans SB3")
+    parser.add_argument("--model", help="Fichier .pt ou .onnx (par défaut : le plus récent de exported/)")
+    parser.add_argument("--threads", type=int, default=1, help="Threads d'inférence")
+    parser.add_argument("--games", type=int, default=0, help="Jouer N parties sans affichage (0 = regarder)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stochastic", action="store_true", help="Tirer les actions au lieu de prendre la meilleure")
+    parser.add_argument("--fps", type=float, default=20, help="Vitesse d'affichage")
+    parser.add_argument("--bench", action="store_true", help="Mesurer latence/débit selon la taille du lot")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    parser.add_argument("--seconds", type=float, default=2, help="Durée de chaque mesure de --bench")
+    args = parser.parse_args()
+
+    path = args.model or latest_export()
+    if path is None:
+        print("Aucun modèle exporté ! Lancer d'abord : python export_policy.py")
+        return 1
+    policy = ExportedPolicy(path, threads=args.threads, seed=args.seed)
+    meta = policy.meta
+    print(f"Chargement de : {path} ({meta['env']}, {meta['timesteps']} pas, exporté de {meta['source']})")
+    print(f"Prêt en {time.perf_counter() - START:.2f} s (imports compris), "
+          f"stable_baselines3 chargé : {'oui' if 'stable_baselines3' in sys.modules else 'non'}")
+    deterministic = not args.stochastic
+
+    if args.bench:
+        bench(policy, args.sizes, args.seconds)
+        return 0
+
+    if args.games:
+        start = time.perf_counter()
+        scores, steps, inference = play_batch(policy, args.games, args.seed, deterministic)
+        elapsed = time.perf_counter() - start
+        print(f"{args.games} parties : score moyen {np.mean(scores):.2f}, max {max(scores)}")
+        print(f"{steps} pas en {elapsed:.2f} s -> {steps / elapsed:.0f} pas/s "
+              f"(réseau : {inference / elapsed:.0%} du temps)")
+        return 0
+
+    watch(policy, args.fps, deterministic)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
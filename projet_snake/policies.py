@@ -0,0 +1,57 @@
+import torch as th
+import torch.nn as nn
+from gymnasium import spaces
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+# Réseaux partagés par train_v3.py, pretrain_bc.py, sweep.py et test_play_cnn.py.
+# Les checkpoints entraînés avec policies.CustomCNN se rechargent partout où ce fichier est
+# importable ; les anciens (classe définie dans train_v3.py) se rechargent toujours aussi.
+
+
+class CustomCNN(BaseFeaturesExtractor):
+    def __init__(self, observation_space: spaces.Box, features_dim: int = 256):
+        super(CustomCNN, self).__init__(observation_space, features_dim)
+        n_input_channels = observation_space.shape[0]  # 1, ou FRAME_STACK grilles empilées
+        self.cnn = nn.Sequential(
+            nn.Conv2d(n_input_channels, 32, kernel_size=4, stride=1, padding=0),
+            nn.ReLU(),
+            nn.Conv2d(32, 64, kernel_size=4, stride=1, padding=0),
+            nn.ReLU(),
+            nn.Flatten(),
+        )
+        with th.no_grad():
+            n_flatten = self.cnn(
+                th.as_tensor(observation_space.sample()[None]).float()
+            ).shape[1]
+        self.linear = nn.Sequential(nn.Linear(n_flatten, features_dim), nn.ReLU())
+        self.channels_last = False
+
+    def set_channels_last(self, enabled=True):
+        """Poids des convolutions (et observations) en NHWC : le format préféré des convolutions oneDNN"""
+        self.channels_last = enabled
+        self.cnn.to(memory_format=th.channels_last if enabled else th.contiguous_format)
+
+    def forward(self, observations: th.Tensor) -> th.Tensor:
+        if self.channels_last:
+            observations = observations.contiguous(memory_format=th.channels_last)
+        return self.linear(self.cnn(observations))
+
+
+def speed_up_policy(policy, channels_last=False, compile_mode=None):
+    """
+    Options d'entraînement d'une politique SB3, à appliquer après PPO(...) ou PPO.load(...) :
+      channels_last : CustomCNN en NHWC ;
+      compile_mode  : torch.compile des extracteurs et du MLP ("default", "max-autotune"...).
+    Les poids et leurs noms ne changent pas : les checkpoints restent chargeables sans ces options.
+    """
+    extractors = {id(m): m for m in (policy.features_extractor, policy.pi_features_extractor,
+                                      policy.vf_features_extractor)}.values()
+    if channels_last:
+        for extractor in extractors:
+            if isinstance(extractor, CustomCNN):
+                extractor.set_channels_last()
+    if compile_mode:
+        # Module.compile() et pas th.compile(module) : pas de préfixe "_orig_mod." dans le state_dict.
+        # Seul __call__ est compilé : PPO passe par les sous-modules, pas par policy.forward.
+        for module in (*extractors, policy.mlp_extractor):
+            module.compile(mode=compile_mode)
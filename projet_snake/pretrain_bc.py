@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch as th
+import torch.nn.functional as F
+from stable_baselines3 import PPO
+
+from envs.snake_env import SnakeEnv
+from envs.snake_env_cnn import SnakeEnvCnn
+from evaluate_checkpoints import evaluate_seeds
+
+# Behaviour cloning : pré-entraîne la politique PPO sur les démonstrations de l'expert
+# (generate_demos.py), pour que PPO démarre d'un agent qui sait déjà manger des pommes.
+#
+#   python generate_demos.py --obs vector
+#   python pretrain_bc.py --obs vector        -> checkpoints/BC/snake_v2_bc.zip
+#   puis dans train_v2.py : WARM_START = ".../snake_v2_bc.zip"
+#
+# Même réseau et mêmes hyperparamètres que train_v2.py (MLP) / train_v3.py (CNN) :
+# le fichier produit se charge directement avec model.set_parameters().
+#
+# Perte : entropie croisée sur les actions de l'expert + erreur du réseau de valeur sur les
+# retours actualisés (sinon PPO part d'un critique aléatoire et abîme la politique au début).
+# Erreur de Huber pour la valeur : les retours du CNN (reward shaping) montent à plusieurs
+# centaines, une erreur quadratique écraserait le gradient de la politique.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, "checkpoints", "BC")
+
+
+def make_model(obs_type, frame_stack=1):
+    """Modèle PPO identique à celui de train_v2.py (vector) ou train_v3.py (grid)"""
+    if obs_type == "vector":
+        return PPO("MlpPolicy", SnakeEnv(), learning_rate=0.0003, gamma=0.99,
+                   policy_kwargs=dict(net_arch=[128, 128]))
+    from policies import CustomCNN
+    return PPO("CnnPolicy", SnakeEnvCnn(frame_stack=frame_stack), learning_rate=0.0003, gamma=0.99, batch_size=256, n_steps=1024,
+               policy_kwargs=dict(features_extractor_class=CustomCNN,
+                                  features_extractor_kwargs=dict(features_dim=256)))
+
+
+def load_shards(folder):
+    with open(os.path.join(folder, "manifest.json")) as f:
+        manifest = json.load(f)
+    return manifest, [os.path.join(folder, s["file"]) for s in manifest["shards"]]
+
+
+def train(model, shard_paths, epochs, batch_size, lr, vf_coef, seed):
+    """Parcourt les fichiers un par un (mémoire bornée), dans un ordre aléatoire à chaque epoch"""
+    policy = model.policy
+    policy.set_training_mode(True)
+    optimizer = th.optim.Adam(policy.parameters(), lr=lr)
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        total, correct, loss_sum, n_batches = 0, 0, 0.0, 0
+        for path in rng.permutation(shard_paths):
+            data = np.load(path)
+            obs, actions, returns = data["obs"], data["actions"], data["returns"]
+            order = rng.permutation(len(actions))
+            for i in range(0, len(order), batch_size):
+                idx = np.sort(order[i:i + batch_size])
+                obs_t = policy.obs_to_tensor(obs[idx])[0]
+                actions_t = th.as_tensor(actions[idx], device=policy.device).long()
+                returns_t = th.as_tensor(returns[idx], device=policy.device)
+                values, log_prob, _ = policy.evaluate_actions(obs_t, actions_t)
+                loss = -log_prob.mean() + vf_coef * F.smooth_l1_loss(values.flatten(), returns_t)
+                optimizer.zero_grad()
+                loss.backward()
+                th.nn.utils.clip_grad_norm_(policy.parameters(), 0.5)
+                optimizer.step()
+
+                with th.no_grad():
+                    predicted = policy.get_distribution(obs_t).mode()
+                correct += int((predicted == actions_t).sum())
+                total += len(idx)
+                loss_sum += loss.item()
+                n_batches += 1
+        print(f"Epoch {epoch + 1}/{epochs} : perte {loss_sum / n_batches:.4f}, "
+              f"accord avec l'expert {correct / total:.1%} ({time.perf_counter() - start:.1f} s)")
+    policy.set_training_mode(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-entraînement de la politique PPO par behaviour cloning")
+    parser.add_argument("--obs", choices=["vector", "grid"], default="vector")
+    parser.add_argument("--data", default=None, help="Dossier des démonstrations (défaut : demos/<obs>)")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--vf-coef", type=float, default=0.1, help="Poids de la perte du réseau de valeur")
+    parser.add_argument("--eval-episodes", type=int, default=50, help="Parties de test après l'entraînement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    data = args.data or os.path.join(SCRIPT_DIR, "demos", args.obs)
+    output = args.output or os.path.join(OUTPUT_DIR, "snake_v2_bc.zip" if args.obs == "vector" else "snake_cnn_bc.zip")
+    manifest, shard_paths = load_shards(data)
+    print(f"{manifest['transitions']} pas de l'expert ({manifest['episodes']} parties, "
+          f"score moyen {manifest['expert_score_mean']:.1f}) dans {data}")
+
+    th.manual_seed(args.seed)
+    model = make_model(args.obs, manifest.get("frame_stack", 1))
+    train(model, shard_paths, args.epochs, args.batch_size, args.lr, args.vf_coef, args.seed)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    model.save(output)
+    print(f"Politique pré-entraînée enregistrée dans : {output}")
+
+    if args.eval_episodes:
+        _, scores, lengths = evaluate_seeds(output, list(range(10_000, 10_000 + args.eval_episodes)))
+        print(f"Score moyen de la politique clonée : {np.mean(scores):.2f} (max {max(scores)}) "
+              f"sur {args.eval_episodes} parties")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
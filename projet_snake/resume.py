@@ -0,0 +1,200 @@
+import copy
+import os
+import pickle
+import random
+import re
+import sys
+import zipfile
+
+import numpy as np
+import torch as th
+from stable_baselines3 import PPO
+from stable_baselines3.common.logger import HumanOutputFormat, Logger, TensorBoardOutputFormat
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import VecEnvWrapper, VecMonitor
+
+# Reprise exacte d'un entraînement interrompu (machine préemptée, kill, coupure...).
+#
+# Les checkpoints "full" d'AsyncCheckpointCallback(resumable=True) sont pris entre deux mises
+# à jour PPO (rollout buffer vide) et contiennent, en plus du model.save() habituel (poids,
+# optimiseur, compteur de pas, dernière observation), un fichier resume_state.pkl :
+#   - l'état de chaque partie en cours (snapshot() des envs, générateur aléatoire compris)
+#     et des Monitor / VecMonitor (récompenses de la partie en cours)
+#   - les générateurs aléatoires de PyTorch, NumPy et random (tirage des actions, minibatchs)
+#   - le dossier TensorBoard du run et les métriques pas encore écrites
+#
+#   path = find_resume_checkpoint(MODELS_DIR, "snake_cnn")
+#   model = load_resumable(path, env)
+#   model.learn(TIMESTEPS - model.num_timesteps, reset_num_timesteps=False, callback=...)
+#
+# La suite de l'entraînement est alors identique (poids, courbes) à celle d'un run jamais
+# interrompu, à part les mesures de temps (fps, time/iterations).
+
+RESUME_FILE = "resume_state.pkl"  # Ignoré par PPO.load() (seuls data et *.pth sont lus)
+
+# Champs de Monitor / VecMonitor qui comptent pour les courbes (partie en cours)
+MONITOR_FIELDS = ("rewards", "needs_reset", "total_steps")
+VEC_MONITOR_FIELDS = ("episode_returns", "episode_lengths", "episode_count")
+
+
+def capture_rng():
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": th.get_rng_state()}
+    if th.cuda.is_available():
+        state["cuda"] = th.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    th.set_rng_state(state["torch"])
+    if "cuda" in state and th.cuda.is_available():
+        th.cuda.set_rng_state_all(state["cuda"])
+
+
+def capture_env_state(venv):
+    """État de toutes les parties d'un VecEnv (Dummy, Subproc, SharedMemory, Thread ou SnakeVecEnv)"""
+    wrappers = []
+    while isinstance(venv, VecEnvWrapper):
+        fields = VEC_MONITOR_FIELDS if isinstance(venv, VecMonitor) else ()
+        wrappers.append({name: getattr(venv, name) for name in fields})
+        venv = venv.venv
+    state = {"wrappers": wrappers, "monitors": None}
+    if hasattr(venv, "snapshot"):
+        state["envs"] = venv.snapshot()  # SnakeVecEnv : toutes les parties d'un coup
+    else:
+        state["envs"] = venv.env_method("snapshot")
+        if all(venv.env_is_wrapped(Monitor)):
+            state["monitors"] = {name: venv.get_attr(name) for name in MONITOR_FIELDS}
+    # Copie : avec DummyVecEnv, get_attr renvoie les listes vivantes des Monitor
+    return copy.deepcopy(state)
+
+
+def restore_env_state(venv, state):
+    for fields in state["wrappers"]:
+        for name, value in fields.items():
+            setattr(venv, name, copy.deepcopy(value))
+        venv = venv.venv
+    if hasattr(venv, "snapshot"):
+        venv.restore(state["envs"])
+        return
+    for i, env_state in enumerate(state["envs"]):
+        venv.env_method("restore", env_state, indices=[i])
+    if state["monitors"] is not None:
+        for name, values in state["monitors"].items():
+            for i, value in enumerate(values):
+                venv.set_attr(name, value, indices=[i])
+
+
+def _tensorboard_dir(logger):
+    for output in logger.output_formats:
+        if isinstance(output, TensorBoardOutputFormat):
+            return output.writer.log_dir
+    return None
+
+
+def capture_training_state(model):
+    """
+    Tout ce qui manque à model.save() pour reprendre exactement. À prendre entre deux
+    mises à jour (début de collecte) : le rollout buffer est alors vide.
+    """
+    logger = model.logger
+    return {
+        "rng": capture_rng(),
+        "env": capture_env_state(model.env),
+        "tensorboard_dir": _tensorboard_dir(logger),
+        # Métriques de la dernière optimisation (train/...), écrites au prochain dump
+        "logger": {
+            "name_to_value": dict(logger.name_to_value),
+            "name_to_count": dict(logger.name_to_count),
+            "name_to_excluded": dict(logger.name_to_excluded),
+        },
+    }
+
+
+def save_resumable(model, path):
+    """
+    model.save() + resume_state.pkl, hors de tout callback : à appeler entre deux mises à
+    jour, par exemple juste après model.learn() (utilisé par sweep.py entre deux paliers)
+    """
+    model.save(path)
+    with zipfile.ZipFile(path, mode="a") as archive:
+        archive.writestr(RESUME_FILE, pickle.dumps(capture_training_state(model)))
+
+
+class _ResumedTensorBoardOutputFormat(TensorBoardOutputFormat):
+    """Continue le même run TensorBoard ; les points écrits après le checkpoint sont effacés (purge_step)"""
+
+    def __init__(self, folder, purge_step):
+        from torch.utils.tensorboard import SummaryWriter
+
+        self.writer = SummaryWriter(log_dir=folder, purge_step=purge_step)
+        self._is_closed = False
+
+
+def find_resume_checkpoint(folder, name_prefix):
+    """Checkpoint de reprise le plus récent de `folder` (None s'il n'y en a pas)"""
+    if not os.path.isdir(folder):
+        return None
+    pattern = re.compile(rf"^{re.escape(name_prefix)}_(\d+)_steps\.zip$")
+    candidates = []
+    for name in os.listdir(folder):
+        match = pattern.match(name)
+        if match is None:
+            continue
+        path = os.path.join(folder, name)
+        try:
+            with zipfile.ZipFile(path) as archive:
+                if RESUME_FILE in archive.namelist():
+                    candidates.append((int(match.group(1)), path))
+        except zipfile.BadZipFile:
+            continue  # Fichier abîmé (ne devrait pas arriver : les checkpoints sont écrits puis renommés)
+    return max(candidates)[1] if candidates else None
+
+
+def warn_resume_overrides(model, warm_start=None, **ppo_kwargs):
+    """
+    Un modèle repris garde TOUS les réglages de son checkpoint : prévient quand le script en
+    demande d'autres (WARM_START, hyperparamètres passés à PPO(...) modifiés depuis), qui sont ignorés.
+    policy_kwargs : seules les clés données sont comparées. Renvoie la liste des avertissements.
+    """
+    warnings = []
+    if warm_start:
+        warnings.append(f"WARM_START = {warm_start!r} ignoré (poids du checkpoint)")
+    for name, wanted in ppo_kwargs.items():
+        actual = getattr(model, name, None)
+        if name == "policy_kwargs":
+            actual = {key: (actual or {}).get(key) for key in wanted}
+        if actual != wanted:
+            warnings.append(f"{name} = {wanted!r} ignoré, le checkpoint garde {actual!r}")
+    for warning in warnings:
+        print(f"!!! Reprise : {warning}")
+    if warnings:
+        print("!!! Pour appliquer ces réglages, repartir de zéro (RESUME = False) ou changer MODELS_DIR.")
+    return warnings
+
+
+def load_resumable(path, env, model_cls=PPO, **load_kwargs):
+    """
+    Recharge le modèle, remet les parties, les générateurs aléatoires et le logger
+    TensorBoard dans l'état du checkpoint. Ensuite :
+        model.learn(TIMESTEPS - model.num_timesteps, reset_num_timesteps=False, ...)
+    """
+    # force_reset=False : garde la dernière observation (sinon SB3 refait un reset des envs)
+    model = model_cls.load(path, env=env, force_reset=False, **load_kwargs)
+    with zipfile.ZipFile(path) as archive:
+        state = pickle.loads(archive.read(RESUME_FILE))
+    restore_env_state(model.env, state["env"])
+
+    tb_dir = state["tensorboard_dir"]
+    outputs = [HumanOutputFormat(sys.stdout)] if model.verbose >= 1 else []
+    if tb_dir is not None:
+        # Le point du pas du checkpoint a été écrit juste avant lui : on n'efface que ceux d'après
+        outputs.append(_ResumedTensorBoardOutputFormat(tb_dir, purge_step=model.num_timesteps + 1))
+    model.set_logger(Logger(folder=tb_dir, output_formats=outputs))
+    for name, values in state["logger"].items():
+        getattr(model.logger, name).update(values)
+
+    # En dernier : PPO.load() a consommé des nombres aléatoires (initialisation du réseau)
+    restore_rng(state["rng"])
+    return model
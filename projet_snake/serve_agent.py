@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch as th
+
+from evaluate_checkpoints import find_checkpoints, env_class_for, SCRIPT_DIR
+
+# Serveur d'inférence : UN modèle chargé une fois, BEAUCOUP de parties en même temps.
+#
+#   python serve_agent.py --games 64                     -> serveur sur 127.0.0.1:8765
+#   python serve_agent.py --watch --game 3               -> fenêtre pygame qui regarde la partie 3
+#   python serve_agent.py --bench                        -> débit/latence selon la taille du lot
+#
+# À chaque tick, les observations de toutes les parties (et des bots connectés) sont
+# empilées en un seul lot : une seule passe du réseau, puis les actions sont redistribuées.
+#
+# Protocole (TCP local, une ligne JSON par message). Le client envoie d'abord :
+#   {"mode": "watch", "game": 3}     -> reçoit l'état de la partie 3 à chaque tick ("game": null = toutes)
+#   {"mode": "act"}                  -> puis {"obs": [...]} par ligne, reçoit {"action": a}
+# Le serveur répond d'abord {"grid_w": ..., "grid_h": ..., "games": ..., "env": ...}.
+
+DEFAULT_PORT = 8765
+MAX_WRITE_BUFFER = 1 << 20  # Un spectateur trop lent perd des images au lieu de ralentir le serveur
+
+
+class BatchStats:
+    """Durée de chaque passe du réseau, regroupée par taille de lot"""
+
+    def __init__(self):
+        self.durations = {}
+
+    def record(self, batch_size, seconds):
+        self.durations.setdefault(batch_size, []).append(seconds)
+
+    def report(self, title="Inférence par taille de lot"):
+        print(f"\n{title}")
+        print(f"{'Lot':>6} | {'Passes':>7} | {'Obs/s':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+        print("-" * 54)
+        for size in sorted(self.durations):
+            d = np.asarray(self.durations[size])
+            print(f"{size:>6} | {d.size:>7} | {size / np.median(d):>10.0f} | "
+                  f"{np.percentile(d, 50) * 1e3:>9.3f} | {np.percentile(d, 99) * 1e3:>9.3f}")
+
+
+class BatchedGames:
+    """
+    N parties jouées par le même modèle. tick() fait avancer toutes les parties d'un pas
+    avec une seule passe du réseau, et répond au passage aux observations des bots.
+    """
+
+    def __init__(self, model, env_cls, n_games, seed=0, deterministic=True, env_kwargs=None):
+        self.model = model
+        self.deterministic = deterministic
+        self.envs = [env_cls(**(env_kwargs or {})) for _ in range(n_games)]
+        self.obs = [env.reset(seed=seed + i)[0] for i, env in enumerate(self.envs)]
+        self.done = [False] * n_games
+        self.episodes = 0
+        self.steps = 0
+        self.stats = BatchStats()
+
+    def tick(self, extra_obs=()):
+        """Un pas pour toutes les parties ; renvoie les actions choisies pour `extra_obs`"""
+        batch = np.stack(self.obs + list(extra_obs))
+        start = time.perf_counter()
+        actions, _ = self.model.predict(batch, deterministic=self.deterministic)
+        self.stats.record(len(batch), time.perf_counter() - start)
+
+        n = len(self.envs)
+        for i, env in enumerate(self.envs):
+            if self.done[i]:
+                # La partie finie est restée affichée un tick : on la relance
+                self.obs[i], _ = env.reset()
+                self.done[i] = False
+                continue
+            self.obs[i], _, terminated, truncated, _ = env.step(int(actions[i]))
+            self.done[i] = terminated or truncated
+            self.episodes += self.done[i]
+            self.steps += 1
+        return [int(a) for a in actions[n:]]
+
+    def state(self, i):
+        env = self.envs[i]
+        return {"game": i, "score": env.score, "frame": env.frame_iteration,
+                "snake": list(env.snake), "food": list(env.food), "done": self.done[i]}
+
+
+class AgentServer:
+    def __init__(self, games, fps):
+        self.games = games
+        self.period = 1 / fps if fps > 0 else 0
+        self.viewers = {}   # writer -> numéro de partie suivie (None = toutes)
+        self.requests = []  # (observation, future) des bots, servis au prochain tick
+        env = games.envs[0]
+        self.hello = {"grid_w": env.grid_w, "grid_h": env.grid_h, "games": len(games.envs),
+                      "env": type(env).__name__}
+        self.obs_shape = env.observation_space.shape
+        self.obs_dtype = env.observation_space.dtype
+
+    async def handle_client(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            game = request.get("game")
+            if request.get("mode") != "act" and game is not None and (
+                    type(game) is not int or not 0 <= game < len(self.games.envs)):
+                # Numéro de partie invalide : on le signale au spectateur et on ferme la connexion
+                error = f"Partie {game!r} inconnue (entre 0 et {len(self.games.envs) - 1})"
+                writer.write((json.dumps({"error": error}) + "\n").encode())
+                await writer.drain()
+                return
+            writer.write((json.dumps(self.hello) + "\n").encode())
+            if request.get("mode") == "act":
+                await self._serve_bot(reader, writer)
+            else:
+                self.viewers[writer] = game
+                await reader.read()  # Jusqu'à ce que le spectateur se déconnecte
+        except (ConnectionError, json.JSONDecodeError, ValueError):
+            pass
+        finally:
+            self.viewers.pop(writer, None)
+            writer.close()
+
+    async def _serve_bot(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        while line := await reader.readline():
+            obs = np.asarray(json.loads(line)["obs"], dtype=self.obs_dtype).reshape(self.obs_shape)
+            future = loop.create_future()
+            self.requests.append((obs, future))
+            writer.write((json.dumps({"action": await future}) + "\n").encode())
+            await writer.drain()
+
+    def _broadcast(self):
+        if not self.viewers:
+            return
+        messages = {}  # Chaque état n'est sérialisé qu'une fois, quel que soit le nombre de spectateurs
+        for writer, game in list(self.viewers.items()):
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                continue
+            for i in (range(len(self.games.envs)) if game is None else [game]):
+                if i not in messages:
+                    messages[i] = (json.dumps(self.games.state(i)) + "\n").encode()
+                writer.write(messages[i])
+
+    async def run(self, host, port, report_every):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"Serveur prêt sur {host}:{port} ({len(self.games.envs)} parties)")
+        last_report = time.perf_counter()
+        async with server:
+            while True:
+                start = time.perf_counter()
+                requests, self.requests = self.requests, []
+                actions = self.games.tick([obs for obs, _ in requests])
+                for (_, future), action in zip(requests, actions):
+                    if not future.done():
+                        future.set_result(action)
+                self._broadcast()
+                if report_every and start - last_report > report_every:
+                    self.games.stats.report(f"{self.games.steps} pas, {self.games.episodes} parties terminées")
+                    last_report = start
+                # sleep(0) au minimum : laisse la boucle asyncio lire/écrire les sockets
+                await asyncio.sleep(max(self.period - (time.perf_counter() - start), 0))
+
+
+async def watch(host, port, game):
+    """Spectateur : affiche une partie du serveur dans une fenêtre pygame"""
+    from envs.renderer import SnakeRenderer
+    from envs.snake_env import WINDOW_WIDTH, WINDOW_HEIGHT, BLOCK_SIZE
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps({"mode": "watch", "game": game}) + "\n").encode())
+    hello = json.loads(await reader.readline())
+    if "error" in hello:
+        print(hello["error"])
+        writer.close()
+        return
+    # Le serveur impose le rythme : pas de limite d'images côté client
+    renderer = SnakeRenderer(WINDOW_WIDTH, WINDOW_HEIGHT, BLOCK_SIZE, hello["grid_w"], fps=0,
+                             caption=f"🐍 Snake AI - partie {game} 🐍")
+    try:
+        while line := await reader.readline():
+            state = json.loads(line)
+            renderer.render(state["snake"], state["food"], state["score"], state["frame"])
+    finally:
+        renderer.close()
+        writer.close()
+
+
+def bench(model, env_cls, sizes, seconds, env_kwargs=None):
+    """Débit et latence d'inférence pour plusieurs nombres de parties simultanées"""
+    print(f"{'Parties':>8} | {'Pas/s':>10} | {'Inférence p50 (ms)':>19} | {'Tick p50 (ms)':>14}")
+    print("-" * 62)
+    for n in sizes:
+        games = BatchedGames(model, env_cls, n, env_kwargs=env_kwargs)
+        games.tick()  # Échauffement
+        ticks = []
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            games.tick()
+            ticks.append(time.perf_counter() - start)
+        forward = np.asarray(games.stats.durations[n][1:])
+        print(f"{n:>8} | {n * len(ticks) / sum(ticks):>10.0f} | "
+              f"{np.median(forward) * 1e3:>19.3f} | {np.median(ticks) * 1e3:>14.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sert un modèle PPO à plusieurs parties / clients en lots")
+    parser.add_argument("--model", help="Checkpoint .zip (par défaut : le plus récent de checkpoints/)")
+    parser.add_argument("--games", type=int, default=16, help="Parties jouées en même temps")
+    parser.add_argument("--fps", type=float, default=20, help="Ticks par seconde (0 = aussi vite que possible)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--report", type=float, default=30, help="Stats toutes les N secondes (0 = jamais)")
+    parser.add_argument("--watch", action="store_true", help="Client : regarder une partie du serveur")
+    parser.add_argument("--game", type=int, default=0, help="Partie à regarder avec --watch")
+    parser.add_argument("--bench", action="store_true", help="Mesurer débit/latence selon la taille du lot")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    parser.add_argument("--seconds", type=float, default=3, help="Durée de chaque mesure de --bench")
+    args = parser.parse_args()
+
+    if args.watch:
+        asyncio.run(watch(args.host, args.port, args.game))
+        return 0
+
+    from stable_baselines3 import PPO
+
+    path = args.model
+    if path is None:
+        paths = find_checkpoints([os.path.join(SCRIPT_DIR, "checkpoints")])
+        if not paths:
+            print("Aucun modèle trouvé dans le dossier 'checkpoints' !")
+            return 1
+        path = max(paths, key=os.path.getctime)
+    th.set_num_threads(1)  # Petits lots : un seul thread est plus rapide (et laisse les coeurs aux envs)
+    model = PPO.load(path, device="cpu")
+    env_cls, env_kwargs = env_class_for(model)
+    print(f"Chargement de : {path} ({env_cls.__name__})")
+
+    if args.bench:
+        bench(model, env_cls, args.sizes, args.seconds, env_kwargs)
+        return 0
+
+    server = AgentServer(BatchedGames(model, env_cls, args.games, env_kwargs=env_kwargs), args.fps)
+    try:
+        asyncio.run(server.run(args.host, args.port, args.report))
+    except KeyboardInterrupt:
+        server.games.stats.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
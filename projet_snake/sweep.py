@@ -0,0 +1,336 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+# Recherche d'hyperparamètres en parallèle, avec arrêt précoce des mauvais essais (ASHA).
+#
+#   python sweep.py --kind mlp --trials 27                  -> hyperparamètres de train_v2.py
+#   python sweep.py --kind cnn --trials 27 --cores 8        -> ceux de train_v3.py
+#   python sweep.py --kind mlp --space mon_espace.json      -> autre espace de recherche
+#   python sweep.py --kind mlp --scheduler sha              -> successive halving synchrone
+#
+# Chaque essai tire une configuration dans l'espace de recherche et s'entraîne par paliers :
+# min_steps, min_steps * eta, min_steps * eta², ... jusqu'à max_steps (arrondis à la collecte
+# PPO suivante : garder min_steps bien au-dessus de n_steps * n_envs). À chaque palier il joue
+# les mêmes parties d'évaluation (seeds fixes) ; seul le meilleur tiers (1/eta) des essais
+# d'un palier passe au suivant, les autres sont arrêtés.
+#   - asha : un coeur libre prend tout de suite la meilleure promotion possible, sinon un
+#            nouvel essai (aucun coeur n'attend les essais lents)
+#   - sha  : on attend que tous les essais d'un palier soient finis avant de promouvoir
+#
+# Un essai = un processus = un coeur (SnakeVecEnv dans le processus, PyTorch sur 1 thread) :
+# --cores essais tournent en même temps. Entre deux paliers, l'essai est sauvegardé avec son
+# état de reprise (resume.py) : le palier suivant continue exactement le même entraînement,
+# sur n'importe quel worker.
+#
+# Sorties :
+#   logs/sweep_<nom>/trial_XXX_1/     courbes TensorBoard de chaque essai (+ eval/score_mean)
+#   checkpoints/SWEEP/<nom>/          modèles des --keep meilleurs essais, sweep.json, summary.csv
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
+SWEEP_DIR = os.path.join(SCRIPT_DIR, "checkpoints/SWEEP")
+
+# Espaces de recherche : liste = choix parmi les valeurs, {"loguniform": [a, b]} = tirage log-uniforme.
+# n_envs et frame_stack vont à SnakeVecEnv, net_arch à policy_kwargs, le reste directement à PPO.
+SPACES = {
+    "mlp": {  # train_v2.py : net_arch=[128, 128], learning_rate=3e-4, gamma=0.99
+        "net_arch": [[64, 64], [128, 128], [256, 256], [128, 128, 128]],
+        "learning_rate": {"loguniform": [1e-4, 1e-3]},
+        "gamma": [0.95, 0.98, 0.99, 0.995],
+        "n_envs": [1, 4, 8],
+        "n_steps": [512, 1024, 2048],
+    },
+    "cnn": {  # train_v3.py : batch_size=256, n_steps=1024, N_ENVS=8
+        "batch_size": [64, 128, 256, 512],
+        "n_steps": [128, 256, 512, 1024],
+        "n_envs": [4, 8, 16],
+        "learning_rate": {"loguniform": [1e-4, 1e-3]},
+    },
+}
+# Valeurs des scripts d'entraînement pour ce qui n'est pas dans l'espace de recherche
+DEFAULTS = {
+    "mlp": {"net_arch": [128, 128], "learning_rate": 3e-4, "gamma": 0.99, "n_envs": 1, "n_steps": 2048},
+    "cnn": {"batch_size": 256, "n_steps": 1024, "n_envs": 8, "learning_rate": 3e-4, "gamma": 0.99,
+            "frame_stack": 1},
+}
+ENV_KEYS = ("n_envs", "frame_stack")
+EVAL_SEED = 100_000  # Parties d'évaluation distinctes de celles de l'entraînement
+
+SUMMARY_COLUMNS = ["rank", "trial", "status", "rung", "timesteps", "score_mean", "score_max",
+                   "train_time", "config"]
+
+
+def sample_config(space, rng):
+    config = {}
+    for name, values in space.items():
+        if isinstance(values, dict):
+            low, high = values["loguniform"]
+            config[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            config[name] = values[rng.integers(len(values))]
+    return config
+
+
+def rung_budgets(min_steps, max_steps, eta):
+    budgets = []
+    budget = min_steps
+    while budget < max_steps:
+        budgets.append(budget)
+        budget *= eta
+    return budgets + [max_steps]
+
+
+# ----------------------------------------------------------------------
+# Côté worker : un palier d'un essai
+# ----------------------------------------------------------------------
+def _init_worker():
+    import torch as th
+    th.set_num_threads(1)  # Un coeur par essai : c'est le pool qui fait le parallélisme
+
+
+def _make_env(kind, params):
+    from stable_baselines3.common.vec_env import VecMonitor
+    from envs.snake_vec_env import SnakeVecEnv
+
+    obs_type = "vector" if kind == "mlp" else "grid"
+    return VecMonitor(SnakeVecEnv(num_envs=params["n_envs"], obs_type=obs_type,
+                                  frame_stack=params.get("frame_stack", 1)))
+
+
+def _new_model(kind, params, env, tb_dir, seed):
+    from stable_baselines3 import PPO
+
+    ppo_kwargs = {k: v for k, v in params.items() if k not in ENV_KEYS and k != "net_arch"}
+    if kind == "mlp":
+        policy, policy_kwargs = "MlpPolicy", dict(net_arch=params["net_arch"])
+    else:
+        from buffers import PackedRolloutBuffer
+        from policies import CustomCNN
+        policy = "CnnPolicy"
+        policy_kwargs = dict(features_extractor_class=CustomCNN, features_extractor_kwargs=dict(features_dim=256))
+        ppo_kwargs["rollout_buffer_class"] = PackedRolloutBuffer  # Beaucoup d'essais en parallèle : 4x moins de mémoire
+    return PPO(policy, env, verbose=0, tensorboard_log=tb_dir, policy_kwargs=policy_kwargs,
+               seed=seed, device="cpu", **ppo_kwargs)
+
+
+def run_rung(trial_id, kind, params, budget, model_path, tb_dir, eval_episodes, seed):
+    """
+    Entraîne l'essai jusqu'à `budget` pas (en repartant de model_path s'il existe), le
+    sauvegarde avec son état de reprise et l'évalue sur les parties EVAL_SEED, EVAL_SEED+1...
+    """
+    from stable_baselines3.common.logger import TensorBoardOutputFormat
+    from evaluate_checkpoints import env_class_for, play_games
+    from resume import load_resumable, save_resumable
+
+    start = time.perf_counter()
+    env = _make_env(kind, params)
+    resumed = os.path.exists(model_path)
+    if resumed:
+        model = load_resumable(model_path, env, device="cpu")
+    else:
+        model = _new_model(kind, params, env, tb_dir, seed)
+    model.learn(total_timesteps=budget - model.num_timesteps, reset_num_timesteps=not resumed,
+                tb_log_name=f"trial_{trial_id:03d}")
+    save_resumable(model, model_path)
+    train_time = time.perf_counter() - start
+
+    # Après la sauvegarde : l'évaluation ne touche pas à l'état de reprise
+    env_cls, env_kwargs = env_class_for(model)
+    scores, _ = play_games(model, env_cls, env_kwargs, list(range(EVAL_SEED, EVAL_SEED + eval_episodes)))
+    for output in model.logger.output_formats:
+        if isinstance(output, TensorBoardOutputFormat):
+            output.writer.add_scalar("eval/score_mean", float(np.mean(scores)), model.num_timesteps)
+            output.writer.flush()
+    model.logger.close()
+    env.close()
+    return {"timesteps": int(model.num_timesteps), "score_mean": float(np.mean(scores)),
+            "score_max": int(np.max(scores)), "train_time": train_time}
+
+
+# ----------------------------------------------------------------------
+# Côté processus principal : ordonnanceur (successive halving / ASHA)
+# ----------------------------------------------------------------------
+class Scheduler:
+    """
+    Décide du prochain travail (essai, palier). rungs[k] : {id de l'essai: score} des essais
+    qui ont fini le palier k ; failed[k] : ceux qui y ont planté (jamais classés ni promus) ;
+    promoted[k] : ceux déjà envoyés au palier k+1.
+    """
+
+    def __init__(self, n_trials, n_rungs, eta, synchronous):
+        self.n_trials = n_trials
+        self.n_rungs = n_rungs
+        self.eta = eta
+        self.synchronous = synchronous
+        self.n_started = 0
+        self.rungs = [{} for _ in range(n_rungs)]
+        self.failed = [set() for _ in range(n_rungs)]
+        self.promoted = [set() for _ in range(n_rungs)]
+
+    def report(self, trial_id, rung, score, status="completed"):
+        """status="failed" : l'essai compte dans la taille du palier mais ne peut pas être promu"""
+        self.rungs[rung][trial_id] = score
+        if status == "failed":
+            self.failed[rung].add(trial_id)
+
+    def complete(self, rung):
+        """SHA : tous les essais attendus à ce palier (n_trials // eta^k) ont fini"""
+        return len(self.rungs[rung]) >= self.n_trials // self.eta ** rung
+
+    def next_job(self):
+        """(id de l'essai, palier) à lancer, ou None s'il faut attendre un résultat"""
+        # Les promotions d'abord, en partant des paliers les plus hauts
+        for k in range(self.n_rungs - 2, -1, -1):
+            if self.synchronous and not self.complete(k):
+                continue
+            # 1/eta du palier (échecs compris), choisi parmi les essais qui ont un vrai score
+            ranked = sorted((t for t in self.rungs[k] if t not in self.failed[k]), key=lambda t: -self.rungs[k][t])
+            for trial_id in ranked[:len(self.rungs[k]) // self.eta]:
+                if trial_id not in self.promoted[k]:
+                    self.promoted[k].add(trial_id)
+                    return trial_id, k + 1
+        if self.n_started < self.n_trials:
+            self.n_started += 1
+            return self.n_started - 1, 0
+        return None
+
+    def stopped(self, trial_id, rung):
+        """
+        True si l'essai ne sera plus promu. Avec ASHA un essai en pause peut toujours l'être
+        (le palier grandit) : on ne le sait qu'à la fin du sweep.
+        """
+        return self.synchronous and self.complete(rung) and trial_id not in self.promoted[rung]
+
+
+def write_summary(trials, folder):
+    # Classement : palier atteint d'abord (un essai promu a battu les autres), puis score à ce palier.
+    # Les essais qui ont planté passent après tous les autres : ni gardés (--keep) ni « meilleur modèle »
+    ranked = sorted(trials.values(), key=lambda t: (t["status"] == "failed", -t["rung"], -t["score_mean"], t["trial"]))
+    with open(os.path.join(folder, "summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for rank, trial in enumerate(ranked, start=1):
+            trial["rank"] = rank
+            writer.writerow({**trial, "config": json.dumps(trial["config"])})
+    return ranked
+
+
+def save_state(path, args, budgets, trials):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"kind": args.kind, "scheduler": args.scheduler, "eta": args.eta, "budgets": budgets,
+                   "trials": sorted(trials.values(), key=lambda t: t["trial"])}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche d'hyperparamètres PPO en parallèle (ASHA)")
+    parser.add_argument("--kind", choices=list(SPACES), default="mlp", help="mlp (train_v2.py) ou cnn (train_v3.py)")
+    parser.add_argument("--space", default=None, help="Fichier JSON d'espace de recherche (défaut : SPACES[kind])")
+    parser.add_argument("--trials", type=int, default=27, help="Nombre de configurations essayées")
+    parser.add_argument("--min-steps", type=int, default=50_000, help="Pas du premier palier")
+    parser.add_argument("--max-steps", type=int, default=1_350_000, help="Pas du dernier palier")
+    parser.add_argument("--eta", type=int, default=3, help="1/eta des essais passent au palier suivant")
+    parser.add_argument("--scheduler", choices=["asha", "sha"], default="asha")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="Essais en parallèle (un coeur chacun)")
+    parser.add_argument("--eval-episodes", type=int, default=50, help="Parties d'évaluation par palier")
+    parser.add_argument("--keep", type=int, default=3, help="Modèles gardés (les meilleurs essais)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--name", default=None, help="Nom du sweep (défaut : <kind>_<date>)")
+    args = parser.parse_args()
+
+    space = SPACES[args.kind]
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    name = args.name or f"{args.kind}_{time.strftime('%Y%m%d_%H%M%S')}"
+    folder = os.path.join(SWEEP_DIR, name)
+    tb_dir = os.path.join(LOG_DIR, f"sweep_{name}")
+    os.makedirs(folder, exist_ok=True)
+    budgets = rung_budgets(args.min_steps, args.max_steps, args.eta)
+
+    rng = np.random.default_rng(args.seed)
+    trials = {}
+    for i in range(args.trials):
+        config = sample_config(space, rng)
+        trials[i] = {"trial": i, "status": "pending", "rung": -1, "timesteps": 0, "score_mean": float("-inf"),
+                     "score_max": 0, "train_time": 0.0, "scores": [], "config": config,
+                     "model": os.path.join(folder, f"trial_{i:03d}.zip")}
+    scheduler = Scheduler(args.trials, len(budgets), args.eta, args.scheduler == "sha")
+    state_path = os.path.join(folder, "sweep.json")
+
+    print(f"Sweep {name} : {args.trials} essais ({args.kind}, {args.scheduler}), paliers {budgets}, "
+          f"{args.cores} coeurs")
+    print(f"TensorBoard : tensorboard --logdir={tb_dir}")
+    start = time.perf_counter()
+    running = {}  # future -> (essai, palier)
+    with ProcessPoolExecutor(max_workers=args.cores, initializer=_init_worker) as pool:
+        while True:
+            while len(running) < args.cores:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                trial = trials[trial_id]
+                trial["status"] = "running"
+                params = {**DEFAULTS[args.kind], **trial["config"]}
+                future = pool.submit(run_rung, trial_id, args.kind, params, budgets[rung], trial["model"],
+                                     tb_dir, args.eval_episodes, args.seed + trial_id)
+                running[future] = job
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial_id, rung = running.pop(future)
+                trial = trials[trial_id]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Configuration impossible (ex: batch_size > n_steps * n_envs) : essai abandonné
+                    print(f"  ÉCHEC essai {trial_id} : {e}")
+                    trial["status"] = "failed"
+                    scheduler.report(trial_id, rung, None, status="failed")
+                    continue
+                trial.update(result, rung=rung, status="completed" if rung == len(budgets) - 1 else "paused")
+                trial["scores"].append(result["score_mean"])
+                scheduler.report(trial_id, rung, result["score_mean"])
+                print(f"  essai {trial_id:3d} palier {rung} ({result['timesteps']:>8} pas) : score moyen "
+                      f"{result['score_mean']:6.2f}  {json.dumps(trial['config'])}")
+            for trial in trials.values():
+                if trial["status"] == "paused" and scheduler.stopped(trial["trial"], trial["rung"]):
+                    trial["status"] = "stopped"
+            save_state(state_path, args, budgets, trials)  # Suivi en direct : sweep.json
+
+    for trial in trials.values():
+        if trial["status"] == "paused":
+            trial["status"] = "stopped"
+    ranked = write_summary(trials, folder)
+    for trial in ranked[args.keep:]:  # Les modèles arrêtés tôt ne servent plus
+        if os.path.exists(trial["model"]):
+            os.remove(trial["model"])
+        trial["model"] = None
+    save_state(state_path, args, budgets, trials)
+
+    elapsed = time.perf_counter() - start
+    total = sum(t["timesteps"] for t in trials.values())
+    print(f"\n{total} pas d'entraînement en {elapsed / 60:.1f} min "
+          f"(sans arrêt précoce : {args.trials * budgets[-1]} pas)")
+    print(f"\n{'#':>3} {'Essai':>5} {'Statut':>9} {'Palier':>6} {'Pas':>9} {'Score':>7}  Configuration")
+    for trial in ranked[:10]:
+        print(f"{trial['rank']:>3} {trial['trial']:>5} {trial['status']:>9} {trial['rung']:>6} "
+              f"{trial['timesteps']:>9} {trial['score_mean']:>7.2f}  {json.dumps(trial['config'])}")
+    print(f"\nClassement : {os.path.join(folder, 'summary.csv')}")
+    print(f"Meilleur modèle : {ranked[0]['model']}")
+    return 0
+
+
+if __name__ == "__main__":  # Obligatoire pour le pool de processus
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import os
 import glob
 from stable_baselines3 import PPO
-from envs.snake_env import SnakeEnv
+from envs.snake_env import SnakeEnv, LIDAR_SIZE
 import time
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -53,13 +53,14 @@ def main():
 
     # 4. Lancement du jeu
     # On active le mode "human" pour voir le jeu
-    env = SnakeEnv(render_mode="human")
-    
     try:
-        model = PPO.load(model_path, env=env)
+        model = PPO.load(model_path)
     except Exception as e:
         print(f"Erreur lors du chargement : {e}")
         return
+    # Les modèles entraînés avec OBS_MODE = "lidar" (train_v2.py) voient les rayons
+    obs_mode = "lidar" if model.observation_space.shape == (LIDAR_SIZE,) else "vector"
+    env = SnakeEnv(render_mode="human", obs_mode=obs_mode)
 
     obs, _ = env.reset()
     score_actuel = 0
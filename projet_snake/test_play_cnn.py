@@ -4,7 +4,6 @@ import time
 
 # FIX macOS segfault: Configuration PyTorch AVANT tout import
 import torch as th
-import torch.nn as nn
 th.set_num_threads(1)
 os.environ['OMP_NUM_THREADS'] = '1'
 os.environ['MKL_NUM_THREADS'] = '1'
@@ -12,28 +11,9 @@ os.environ['MKL_NUM_THREADS'] = '1'
 from stable_baselines3 import PPO
 from envs.snake_env_cnn import SnakeEnvCnn
 
-# IMPORTANT : On doit redéfinir la classe CustomCNN ici aussi
-# pour que Python puisse charger le modèle sauvegardé.
-# (Dans un vrai projet, on mettrait cette classe dans un fichier 'utils.py' importé partout)
-from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
-from gymnasium import spaces
-
-class CustomCNN(BaseFeaturesExtractor):
-    def __init__(self, observation_space: spaces.Box, features_dim: int = 256):
-        super(CustomCNN, self).__init__(observation_space, features_dim)
-        n_input_channels = observation_space.shape[0]
-        self.cnn = nn.Sequential(
-            nn.Conv2d(n_input_channels, 32, kernel_size=4, stride=1, padding=0),
-            nn.ReLU(),
-            nn.Conv2d(32, 64, kernel_size=4, stride=1, padding=0),
-            nn.ReLU(),
-            nn.Flatten(),
-        )
-        with th.no_grad():
-            n_flatten = self.cnn(th.as_tensor(observation_space.sample()[None]).float()).shape[1]
-        self.linear = nn.Sequential(nn.Linear(n_flatten, features_dim), nn.ReLU())
-    def forward(self, observations: th.Tensor) -> th.Tensor:
-        return self.linear(self.cnn(observations))
+# Les checkpoints de train_v3.py font référence à policies.CustomCNN : plus besoin de
+# redéfinir la classe ici, il suffit que policies.py soit importable.
+# (Sans SB3 du tout : export_policy.py puis play_exported.py)
 
 # --- Le reste est standard ---
 
@@ -49,12 +29,12 @@ def main():
     latest_model = max(list_of_files, key=os.path.getctime)
     print(f"Chargement de : {latest_model}")
 
-    # 2. Créer l'environnement CNN
-    env = SnakeEnvCnn(render_mode="human")
-
-    # 3. Charger le modèle
+    # 2. Charger le modèle
     # Pas besoin de passer policy_kwargs ici, SB3 le retrouve dans le fichier zip
-    model = PPO.load(latest_model, env=env)
+    model = PPO.load(latest_model)
+
+    # 3. Créer l'environnement CNN (autant de grilles empilées qu'à l'entraînement)
+    env = SnakeEnvCnn(render_mode="human", frame_stack=model.observation_space.shape[0])
 
     obs, _ = env.reset()
     
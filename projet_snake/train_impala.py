@@ -0,0 +1,459 @@
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import torch as th
+import torch.nn.functional as F
+
+# Entraînement "IMPALA" : les parties tournent dans des processus acteurs, EN MÊME TEMPS que
+# l'apprentissage, au lieu d'attendre chacun leur tour comme PPO (collecte, puis epochs).
+#
+#   python train_impala.py --obs grid --actors 7           -> 1 apprenant + 7 acteurs locaux (CNN)
+#   python train_impala.py --obs vector --actors 3         -> MLP de train_v2.py
+#   python train_impala.py --host 0.0.0.0 --port 5555 --actors 0      -> attend des acteurs distants
+#   python train_impala.py --connect machine:5555 --actors 8          -> 8 acteurs sur une autre machine
+#
+# Acteurs : chacun joue --envs parties (SnakeEnvCnn / SnakeEnv) avec SA copie de la politique,
+# et envoie à l'apprenant des morceaux de --unroll pas (observations, actions, récompenses,
+# fins de partie, log-probabilité des actions jouées). En réponse, l'apprenant renvoie ses
+# poids quand la copie de l'acteur a --sync-every mises à jour de retard.
+# Apprenant : une mise à jour (un seul pas de gradient) par lot de --batch morceaux, dès qu'ils
+# arrivent. Les acteurs ont joué avec une politique un peu ancienne : la correction V-trace
+# (Espeholt et al., 2018) pondère chaque pas par pi/mu (tronqué à rho_bar, c_bar).
+#
+# Transport : TCP (local ou entre machines), un message = longueur + en-tête JSON + tableaux NumPy
+# bruts. Les acteurs n'envoient jamais de pickle ; les poids sont relus avec weights_only=True.
+# Tout ce dont un acteur a besoin (env, taille des morceaux, seed) lui est donné à la connexion :
+# un acteur distant n'a besoin que de ce dossier et de l'adresse de l'apprenant.
+#
+# Les checkpoints sont des modèles PPO ordinaires (même politique que train_v2.py / train_v3.py) :
+# evaluate_checkpoints.py, test_play*.py, export_policy.py et serve_agent.py les lisent tels quels.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(SCRIPT_DIR, "checkpoints/IMPALA")
+LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
+DEFAULT_PORT = 5555
+
+TIMESTEPS = 5000000
+SAVE_FREQ = 200000
+LEARNING_RATE = 0.0003
+GAMMA = 0.99
+RHO_BAR = 1.0        # Troncature des poids pi/mu de la cible (rho) et des traces (c) de V-trace
+C_BAR = 1.0
+VF_COEF = 0.5
+ENT_COEF = 0.01      # Un peu d'exploration : les acteurs jouent une politique en retard
+MAX_GRAD_NORM = 0.5  # Comme PPO
+QUEUE_SIZE = 32      # Morceaux en attente chez l'apprenant ; au-delà, les acteurs attendent
+
+_HEADER = struct.Struct("!IQ")  # Longueur de l'en-tête JSON, puis des tableaux
+
+
+def env_spec(obs, frame_stack=1):
+    """Classe et kwargs de l'env d'un mode d'observation (le même des deux côtés du réseau)"""
+    from envs.snake_env import SnakeEnv
+    from envs.snake_env_cnn import SnakeEnvCnn
+
+    if obs == "grid":
+        return SnakeEnvCnn, {"frame_stack": frame_stack}
+    if obs == "lidar":
+        return SnakeEnv, {"obs_mode": "lidar"}
+    return SnakeEnv, {}
+
+
+def make_model(obs, env, device="cpu"):
+    """Même politique que train_v3.py (grid) ou train_v2.py (vector, lidar)"""
+    from stable_baselines3 import PPO
+    from policies import CustomCNN
+
+    if obs == "grid":
+        policy_kwargs = dict(features_extractor_class=CustomCNN, features_extractor_kwargs=dict(features_dim=256))
+        return PPO("CnnPolicy", env, learning_rate=LEARNING_RATE, gamma=GAMMA, policy_kwargs=policy_kwargs,
+                   device=device)
+    return PPO("MlpPolicy", env, learning_rate=LEARNING_RATE, gamma=GAMMA, policy_kwargs=dict(net_arch=[128, 128]),
+               device=device)
+
+
+# ----------------------------------------------------------------------
+# Messages : struct (longueurs) + en-tête JSON + tableaux NumPy à la suite
+# ----------------------------------------------------------------------
+def send_message(sock, header, arrays=None):
+    arrays = {name: np.ascontiguousarray(a) for name, a in (arrays or {}).items()}
+    header = dict(header, arrays=[[name, a.dtype.str, list(a.shape)] for name, a in arrays.items()])
+    encoded = json.dumps(header).encode()
+    sock.sendall(_HEADER.pack(len(encoded), sum(a.nbytes for a in arrays.values())) + encoded)
+    for a in arrays.values():
+        sock.sendall(a.data.cast("B") if a.ndim else a.tobytes())
+
+
+def _recv_exactly(sock, n):
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("Connexion fermée")
+        view = view[received:]
+    return buffer
+
+
+def recv_message(sock):
+    """(en-tête, {nom: tableau}) ; les tableaux sont des vues sur un seul bloc reçu"""
+    header_size, payload_size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    header = json.loads(_recv_exactly(sock, header_size))
+    payload = _recv_exactly(sock, payload_size)
+    arrays, offset = {}, 0
+    for name, dtype, shape in header.pop("arrays"):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+    return header, arrays
+
+
+def _weights_to_array(state_dict):
+    stream = io.BytesIO()
+    th.save(state_dict, stream)
+    return np.frombuffer(stream.getbuffer(), dtype=np.uint8)
+
+
+def _load_weights(policy, array):
+    policy.load_state_dict(th.load(io.BytesIO(array.tobytes()), map_location="cpu", weights_only=True))
+
+
+# ----------------------------------------------------------------------
+# V-trace
+# ----------------------------------------------------------------------
+def vtrace(behaviour_log_probs, target_log_probs, rewards, values, bootstrap_value, discounts,
+           rho_bar=RHO_BAR, c_bar=C_BAR):
+    """
+    Cibles V-trace, tout en (T, B) (temps d'abord) sauf bootstrap_value (B,) = V(x_T).
+    discounts = gamma * (1 - fin de partie) : pas de valeur reprise par-dessus une fin de partie.
+      rho_t = min(rho_bar, pi/mu), c_t = min(c_bar, pi/mu)
+      v_t   = V(x_t) + rho_t * delta_t + gamma_t * c_t * (v_{t+1} - V(x_{t+1}))
+      avantage de la politique = rho_t * (r_t + gamma_t * v_{t+1} - V(x_t))
+    Renvoie (v, avantages, rho) sans gradient.
+    """
+    with th.no_grad():
+        ratios = th.exp(target_log_probs - behaviour_log_probs)
+        rhos = ratios.clamp(max=rho_bar)
+        cs = ratios.clamp(max=c_bar)
+        next_values = th.cat([values[1:], bootstrap_value[None]])
+        deltas = rhos * (rewards + discounts * next_values - values)
+        corrections = []
+        correction = th.zeros_like(bootstrap_value)
+        for t in reversed(range(len(rewards))):
+            correction = deltas[t] + discounts[t] * cs[t] * correction
+            corrections.append(correction)
+        vs = values + th.stack(corrections[::-1])
+        next_vs = th.cat([vs[1:], bootstrap_value[None]])
+        advantages = rhos * (rewards + discounts * next_vs - values)
+    return vs, advantages, rhos
+
+
+# ----------------------------------------------------------------------
+# Acteur
+# ----------------------------------------------------------------------
+def run_actor(address):
+    """Se connecte à l'apprenant, puis joue et envoie des morceaux jusqu'à ce qu'il ferme la connexion"""
+    from stable_baselines3.common.env_util import make_vec_env
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    th.set_num_threads(1)  # Un coeur par acteur
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        send_message(sock, {"hello": socket.gethostname()})
+        config, arrays = recv_message(sock)
+        env_cls, env_kwargs = env_spec(config["obs"], config["frame_stack"])
+        n_envs, unroll = config["n_envs"], config["unroll"]
+        env = make_vec_env(env_cls, n_envs=n_envs, seed=config["seed"], env_kwargs=env_kwargs,
+                           vec_env_cls=DummyVecEnv)
+        policy = make_model(config["obs"], env).policy
+        policy.set_training_mode(False)
+        _load_weights(policy, arrays["weights"])
+        version = config["version"]
+
+        space = env.observation_space
+        observations = np.zeros((unroll + 1, n_envs, *space.shape), dtype=space.dtype)
+        actions = np.zeros((unroll, n_envs), dtype=np.int64)
+        rewards = np.zeros((unroll, n_envs), dtype=np.float32)
+        dones = np.zeros((unroll, n_envs), dtype=bool)
+        log_probs = np.zeros((unroll, n_envs), dtype=np.float32)
+        obs = env.reset()
+        while True:
+            episodes = []
+            for t in range(unroll):
+                observations[t] = obs
+                with th.no_grad():
+                    action, _, log_prob = policy(th.as_tensor(obs))
+                actions[t] = action.numpy()
+                log_probs[t] = log_prob.numpy()
+                obs, rewards[t], dones[t], infos = env.step(actions[t])
+                episodes.extend([info["score"], info["episode"]["l"]] for info in infos if "episode" in info)
+            observations[unroll] = obs  # Pour la valeur de bootstrap V(x_T)
+            send_message(sock, {"version": version, "episodes": episodes},
+                         {"observations": observations, "actions": actions, "rewards": rewards,
+                          "dones": dones, "log_probs": log_probs})
+            reply, arrays = recv_message(sock)
+            if "weights" in arrays:
+                _load_weights(policy, arrays["weights"])
+                version = reply["version"]
+    except (ConnectionError, OSError, KeyboardInterrupt):
+        pass  # L'apprenant a fini (ou est tombé), ou Ctrl+C : on s'arrête
+    finally:
+        sock.close()
+
+
+# ----------------------------------------------------------------------
+# Apprenant
+# ----------------------------------------------------------------------
+class Learner:
+    """
+    Un thread par acteur connecté reçoit ses morceaux dans une file ; le thread principal en
+    prend --batch à la fois pour une mise à jour, pendant que les acteurs continuent de jouer.
+    """
+
+    def __init__(self, model, args):
+        self.model = model
+        self.policy = model.policy
+        self.args = args
+        self.env_kwargs = env_spec(args.obs, args.frame_stack)[1]
+        self.trajectories = queue.Queue(maxsize=QUEUE_SIZE)
+        self.version = 0
+        self.params_lock = threading.Lock()  # Pas de copie des poids au milieu d'optimizer.step()
+        self.weights_lock = threading.Lock()
+        self.weights = (None, None)  # (version, poids sérialisés), fait une fois par version
+        self.n_actors = 0
+        self.connections = []
+        self.stopping = False
+
+    def current_weights(self):
+        with self.weights_lock:
+            version, weights = self.weights
+            if version != self.version:
+                with self.params_lock:
+                    version = self.version
+                    # Extracteur partagé acteur/critique : 3 noms pour les mêmes tenseurs, copiés une seule fois
+                    copies = {}
+                    state = {}
+                    for k, v in self.policy.state_dict().items():
+                        ptr = v.data_ptr()
+                        if ptr not in copies:
+                            copies[ptr] = v.detach().to("cpu", copy=True)
+                        state[k] = copies[ptr]
+                weights = _weights_to_array(state)
+                self.weights = (version, weights)
+            return version, weights
+
+    def serve(self, server):
+        while not self.stopping:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # Socket fermé par stop()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections.append(conn)
+            actor_id, self.n_actors = self.n_actors, self.n_actors + 1
+            threading.Thread(target=self.handle_actor, args=(conn, actor_id), daemon=True).start()
+
+    def handle_actor(self, conn, actor_id):
+        args = self.args
+        try:
+            hello, _ = recv_message(conn)
+            version, weights = self.current_weights()
+            config = {"obs": args.obs, "frame_stack": args.frame_stack, "n_envs": args.envs, "unroll": args.unroll,
+                      "seed": args.seed + actor_id * args.envs,  # Parties distinctes d'un acteur à l'autre
+                      "version": version}
+            send_message(conn, config, {"weights": weights})
+            print(f"Acteur {actor_id} connecté ({hello['hello']})")
+            while not self.stopping:
+                header, arrays = recv_message(conn)
+                self.trajectories.put((header, arrays))  # Bloque si l'apprenant a trop de retard
+                if header["version"] <= self.version - args.sync_every:
+                    version, weights = self.current_weights()
+                    send_message(conn, {"version": version}, {"weights": weights})
+                else:
+                    send_message(conn, {"version": header["version"]})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def update(self, batch):
+        """Une mise à jour V-trace sur des morceaux (T+1, n_envs) mis côte à côte : (T+1, B)"""
+        policy = self.policy
+        device = policy.device
+        observations = np.concatenate([a["observations"] for _, a in batch], axis=1)
+        t_plus_1, n = observations.shape[:2]
+        actions = th.as_tensor(np.concatenate([a["actions"] for _, a in batch], axis=1), device=device)
+        rewards = th.as_tensor(np.concatenate([a["rewards"] for _, a in batch], axis=1), device=device)
+        dones = th.as_tensor(np.concatenate([a["dones"] for _, a in batch], axis=1), device=device)
+        behaviour_log_probs = th.as_tensor(np.concatenate([a["log_probs"] for _, a in batch], axis=1), device=device)
+
+        # Une seule passe pour les T+1 pas (le dernier ne sert qu'à V(x_T)) : action factice au pas T
+        all_actions = th.cat([actions, th.zeros_like(actions[:1])]).reshape(-1)
+        values, log_probs, entropy = policy.evaluate_actions(
+            th.as_tensor(observations.reshape(t_plus_1 * n, *observations.shape[2:]), device=device), all_actions)
+        values = values.reshape(t_plus_1, n)
+        log_probs = log_probs.reshape(t_plus_1, n)[:-1]
+        entropy = entropy.reshape(t_plus_1, n)[:-1]
+
+        discounts = GAMMA * (~dones).float()
+        vs, advantages, rhos = vtrace(behaviour_log_probs, log_probs.detach(), rewards, values[:-1].detach(),
+                                      values[-1].detach(), discounts)
+        policy_loss = -(advantages * log_probs).mean()
+        value_loss = F.mse_loss(values[:-1], vs)
+        entropy_loss = -entropy.mean()
+        loss = policy_loss + VF_COEF * value_loss + ENT_COEF * entropy_loss
+
+        policy.optimizer.zero_grad()
+        loss.backward()
+        th.nn.utils.clip_grad_norm_(policy.parameters(), MAX_GRAD_NORM)
+        with self.params_lock:
+            policy.optimizer.step()
+            self.version += 1
+        return {"train/policy_loss": policy_loss.item(), "train/value_loss": value_loss.item(),
+                "train/entropy_loss": entropy_loss.item(), "train/loss": loss.item(),
+                "impala/rho_mean": rhos.mean().item()}  # Moyenne de min(rho_bar, pi/mu) : < 1 = actions moins probables qu'à la collecte
+
+    def train(self, total_timesteps, save_freq, name_prefix):
+        model = self.model
+        logger = model.logger
+        episodes = deque(maxlen=100)  # Score et longueur des 100 dernières parties, comme ep_info_buffer
+        start = last_log = time.perf_counter()
+        steps_at_log = model.num_timesteps
+        next_save = (model.num_timesteps // save_freq + 1) * save_freq
+        waited = 0.0
+        while model.num_timesteps < total_timesteps:
+            wait_start = time.perf_counter()
+            batch = [self.trajectories.get() for _ in range(self.args.batch)]
+            waited += time.perf_counter() - wait_start
+            stats = self.update(batch)
+            lags = [self.version - 1 - header["version"] for header, _ in batch]
+            model.num_timesteps += sum(a["actions"].size for _, a in batch)
+            for header, _ in batch:
+                episodes.extend(header["episodes"])
+
+            now = time.perf_counter()
+            if now - last_log > self.args.log_every:
+                for key, value in stats.items():
+                    logger.record(key, value)
+                if episodes:
+                    logger.record("rollout/score_mean", float(np.mean([e[0] for e in episodes])))
+                    logger.record("rollout/ep_len_mean", float(np.mean([e[1] for e in episodes])))
+                logger.record("impala/policy_lag", float(np.mean(lags)))  # Mises à jour de retard des acteurs
+                logger.record("impala/queue", self.trajectories.qsize())
+                logger.record("impala/learner_wait", waited / (now - last_log))  # Part du temps sans données
+                logger.record("impala/actors", self.n_actors)
+                logger.record("time/fps", int((model.num_timesteps - steps_at_log) / (now - last_log)))
+                logger.record("time/updates", self.version)
+                logger.record("time/time_elapsed", int(now - start))
+                logger.record("time/total_timesteps", model.num_timesteps)
+                logger.dump(model.num_timesteps)
+                last_log, steps_at_log, waited = now, model.num_timesteps, 0.0
+            if model.num_timesteps >= next_save:
+                model.save(os.path.join(MODELS_DIR, f"{name_prefix}_{model.num_timesteps}_steps"))
+                next_save += save_freq
+        model.save(os.path.join(MODELS_DIR, f"{name_prefix}_{model.num_timesteps}_steps"))
+
+    def stop(self, server):
+        self.stopping = True
+        server.close()
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)  # Les acteurs voient la connexion fermée et s'arrêtent
+            except OSError:
+                pass
+        while not self.trajectories.empty():  # Débloque les threads coincés sur put()
+            self.trajectories.get_nowait()
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IMPALA : acteurs en parallèle de l'apprenant, correction V-trace")
+    parser.add_argument("--obs", choices=["grid", "vector", "lidar"], default="grid",
+                        help="grid = SnakeEnvCnn (CNN), vector / lidar = SnakeEnv (MLP)")
+    parser.add_argument("--frame-stack", type=int, default=1, help="Grilles empilées (--obs grid)")
+    parser.add_argument("--actors", type=int, default=max((os.cpu_count() or 2) - 1, 1),
+                        help="Acteurs lancés sur cette machine (défaut : un par coeur, moins celui de l'apprenant)")
+    parser.add_argument("--envs", type=int, default=8, help="Parties jouées par chaque acteur")
+    parser.add_argument("--unroll", type=int, default=32, help="Pas par morceau envoyé à l'apprenant")
+    parser.add_argument("--batch", type=int, default=4, help="Morceaux par mise à jour")
+    parser.add_argument("--sync-every", type=int,
+                        help="Un acteur reçoit les poids quand il a N mises à jour de retard (défaut : 1, 4 avec --obs grid)")
+    parser.add_argument("--timesteps", type=int, default=TIMESTEPS)
+    parser.add_argument("--save-freq", type=int, default=SAVE_FREQ)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device", default="auto", help="Pour l'apprenant ; les acteurs jouent sur CPU")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 pour accepter des acteurs d'autres machines")
+    parser.add_argument("--port", type=int, default=0, help=f"0 = port libre (ex: {DEFAULT_PORT} pour des acteurs distants)")
+    parser.add_argument("--connect", help="host:port : lancer seulement des acteurs, pour un apprenant ailleurs")
+    parser.add_argument("--log-every", type=float, default=10, help="Secondes entre deux lignes de stats")
+    args = parser.parse_args()
+    if args.sync_every is None:
+        args.sync_every = 4 if args.obs == "grid" else 1  # Poids du CNN : ~38 Mo par envoi
+
+    context = mp.get_context("spawn")  # Pas de fork d'un processus qui a déjà des threads torch
+
+    if args.connect:
+        address = parse_address(args.connect)
+        actors = [context.Process(target=run_actor, args=(address,)) for _ in range(args.actors)]
+        for actor in actors:
+            actor.start()
+        print(f"{len(actors)} acteurs connectés à {address[0]}:{address[1]}")
+        try:
+            for actor in actors:
+                actor.join()
+        except KeyboardInterrupt:
+            pass  # Les acteurs reçoivent aussi le Ctrl+C
+        return 0
+
+    from stable_baselines3.common.utils import configure_logger, set_random_seed
+
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    set_random_seed(args.seed)
+    env_cls, env_kwargs = env_spec(args.obs, args.frame_stack)
+    model = make_model(args.obs, env_cls(**env_kwargs), device=args.device)
+    name_prefix = f"snake_impala_{args.obs}"
+    model.set_logger(configure_logger(1, LOG_DIR, f"IMPALA_{args.obs}"))
+    learner = Learner(model, args)
+
+    server = socket.create_server((args.host, args.port))
+    host, port = server.getsockname()[:2]
+    threading.Thread(target=learner.serve, args=(server,), daemon=True).start()
+    print(f"Apprenant sur {host}:{port} ; autres acteurs : python train_impala.py --connect <cette machine>:{port}")
+
+    address = ("127.0.0.1" if host in ("0.0.0.0", "") else host, port)
+    actors = [context.Process(target=run_actor, args=(address,), daemon=True) for _ in range(args.actors)]
+    for actor in actors:
+        actor.start()
+    try:
+        learner.train(args.timesteps, args.save_freq, name_prefix)
+    except KeyboardInterrupt:
+        model.save(os.path.join(MODELS_DIR, f"{name_prefix}_{model.num_timesteps}_steps"))
+    finally:
+        learner.stop(server)
+        for actor in actors:
+            actor.join(timeout=10)
+            if actor.is_alive():
+                actor.terminate()
+    print(f"Fini : {model.num_timesteps} pas, {learner.version} mises à jour. Modèles dans {MODELS_DIR}")
+    return 0
+
+
+if __name__ == "__main__":  # Obligatoire pour les acteurs (processus "spawn")
+    sys.exit(main())
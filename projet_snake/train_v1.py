@@ -1,6 +1,7 @@
 import os
 from stable_baselines3 import PPO
 from envs.snake_env import SnakeEnv
+from callbacks import TimingCallback
 
 # 1. Création des dossiers pour sauvegarder les modèles et les logs
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -30,7 +31,9 @@ print("-----------------------------------------")
 # 4. Lancement de l'apprentissage
 # TIMESTEPS est le nombre de 'pas' (frames) que l'IA va jouer au total.
 TIMESTEPS = 100000 
-model.learn(total_timesteps=TIMESTEPS)
+# TimingCallback : temps passé dans l'env, le réseau et l'optimisation (TensorBoard, section "timing/")
+with TimingCallback() as timing:  # Méthodes du modèle restaurées même si learn() plante
+    model.learn(total_timesteps=TIMESTEPS, callback=timing)
 
 # 5. Sauvegarde du modèle final
 model.save(f"{models_dir}/snake_final")
@@ -1,7 +1,10 @@
 import os
 from stable_baselines3 import PPO
-from stable_baselines3.common.callbacks import CheckpointCallback
+from stable_baselines3.common.vec_env import VecMonitor
 from envs.snake_env import SnakeEnv
+from envs.snake_vec_env import SnakeVecEnv
+from callbacks import TimingCallback, AsyncCheckpointCallback, CurriculumCallback
+from resume import find_resume_checkpoint, load_resumable, warn_resume_overrides
 
 # --- CONFIGURATION v2 ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -9,20 +12,53 @@ MODELS_DIR = os.path.join(SCRIPT_DIR, "checkpoints/PPO_v2")
 LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
 TIMESTEPS = 2000000  # 2 Millions de pas (environ 20-30 min sur Mac M1/M2)
 SAVE_FREQ = 100000   # Sauvegarder une copie du cerveau tous les 100k pas
+FULL_EVERY = 5       # Une sauvegarde sur 5 avec l'optimiseur (reprise), les autres = poids seuls (évaluation)
+KEEP_LAST = 5        # On garde les 5 derniers checkpoints + le meilleur + le dernier complet
+BATCHED_ENV = False  # True : N_ENVS parties simulées ensemble par SnakeVecEnv (un seul processus)
+N_ENVS = 64
+# Politique pré-entraînée par behaviour cloning (generate_demos.py puis pretrain_bc.py), ou None
+WARM_START = None  # ex: os.path.join(SCRIPT_DIR, "checkpoints/BC/snake_v2_bc.zip")
+# True : si un checkpoint complet existe dans MODELS_DIR, on reprend exactement là où le run
+# précédent s'est arrêté (kill, SIGTERM, coupure) au lieu de repartir de zéro.
+# Le modèle repris garde les réglages du checkpoint : WARM_START et les hyperparamètres modifiés
+# depuis sont ignorés (avec un avertissement). False par défaut : un nouveau lancement repart de zéro.
+RESUME = False
+# Curriculum : [(taille du plateau, score moyen pour passer au suivant), ..., (30, None)]
+# ex: [(8, 8), (12, 12), (20, 16), (30, None)] ; None = toujours 30x30. Pas avec BATCHED_ENV (erreur).
+CURRICULUM = None
+TARGET_SCORE = 20  # Pas et temps pour atteindre ce score moyen sur 30x30 (TensorBoard, "curriculum/")
+STAGES = CURRICULUM or [(30, None)]
+# Observations du MLP : "vector" (11 booléens autour de la tête) ou "lidar" (8 rayons : distance
+# au mur, au corps et à la pomme, + direction, longueur, queue et pomme). Pas avec BATCHED_ENV.
+OBS_MODE = "vector"
 
 # Création des dossiers
 os.makedirs(MODELS_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # 1. L'environnement (Toujours sans rendu pour la vitesse)
-env = SnakeEnv()
+if BATCHED_ENV:
+    if OBS_MODE != "vector":
+        raise ValueError(f"OBS_MODE = {OBS_MODE!r} : SnakeVecEnv ne calcule que les observations \"vector\"")
+    if CURRICULUM:
+        raise ValueError("CURRICULUM avec BATCHED_ENV : SnakeVecEnv joue toujours sur 30x30")
+    # VecMonitor remplace le Monitor de chaque env pour les courbes TensorBoard
+    env = VecMonitor(SnakeVecEnv(num_envs=N_ENVS, obs_type="vector"))
+    n_envs = N_ENVS
+else:
+    env = SnakeEnv(grid_size=STAGES[0][0], obs_mode=OBS_MODE)  # Premier plateau du curriculum
+    n_envs = 1
 
 # 2. Le Callback (Votre demande de "Logging")
-# Cela va créer des fichiers : PPO_v2/rl_model_100000_steps.zip, rl_model_200000_steps.zip, etc.
-checkpoint_callback = CheckpointCallback(
-    save_freq=SAVE_FREQ,
+# Cela va créer des fichiers : PPO_v2/snake_v2_weights_100000_steps.zip, snake_v2_500000_steps.zip, etc.
+# L'écriture se fait en arrière-plan : l'entraînement ne s'arrête pas pendant la sauvegarde
+checkpoint_callback = AsyncCheckpointCallback(
+    save_freq=max(SAVE_FREQ // n_envs, 1),
     save_path=MODELS_DIR,
-    name_prefix="snake_v2"
+    name_prefix="snake_v2",
+    full_every=FULL_EVERY,
+    keep_last=KEEP_LAST,
+    resumable=True  # Les checkpoints complets contiennent aussi l'état des parties et des générateurs aléatoires
 )
 
 # 3. Architecture du Réseau de Neurones (Custom)
@@ -30,15 +66,28 @@ checkpoint_callback = CheckpointCallback(
 policy_kwargs = dict(net_arch=[128, 128])
 
 # 4. Le Modèle v2 (Avec des hyperparamètres tunés)
-model = PPO(
-    "MlpPolicy", 
-    env, 
-    verbose=1, 
-    tensorboard_log=LOG_DIR,
+ppo_kwargs = dict(
     learning_rate=0.0003,    # Vitesse d'apprentissage standard
     gamma=0.99,              # Importance du futur (0.99 = long terme)
     policy_kwargs=policy_kwargs # Notre plus gros cerveau
 )
+resume_path = find_resume_checkpoint(MODELS_DIR, "snake_v2") if RESUME else None
+if resume_path:
+    model = load_resumable(resume_path, env)
+    print(f"Reprise de l'entraînement depuis : {resume_path} ({model.num_timesteps} pas)")
+    warn_resume_overrides(model, WARM_START, **ppo_kwargs)
+else:
+    model = PPO(
+        "MlpPolicy", 
+        env, 
+        verbose=1, 
+        tensorboard_log=LOG_DIR,
+        **ppo_kwargs
+    )
+    if WARM_START:
+        # Même réseau : on part des poids appris sur l'expert au lieu de poids aléatoires
+        model.set_parameters(WARM_START)
+        print(f"Politique initialisée depuis : {WARM_START}")
 
 print("-----------------------------------------")
 print(f"Lancement de l'entraînement v2 ({TIMESTEPS} pas)...")
@@ -46,7 +95,18 @@ print(f"Checkpoints sauvegardés tous les {SAVE_FREQ} pas dans {MODELS_DIR}")
 print("Pour suivre les courbes en direct, lancez TensorBoard dans un autre terminal.")
 print("-----------------------------------------")
 
-# 5. On lance l'entraînement AVEC le callback
-model.learn(total_timesteps=TIMESTEPS, callback=checkpoint_callback)
+# 5. On lance l'entraînement AVEC les callbacks
+# TimingCallback : temps passé dans l'env, le réseau et l'optimisation (TensorBoard, section "timing/")
+# En reprise, on ne fait que les pas restants et on continue les mêmes courbes TensorBoard
+with TimingCallback() as timing:  # Méthodes du modèle restaurées même si learn() plante
+    model.learn(
+        total_timesteps=TIMESTEPS - model.num_timesteps,
+        reset_num_timesteps=resume_path is None,
+        callback=[checkpoint_callback, timing,
+                  CurriculumCallback(STAGES, target_score=TARGET_SCORE, verbose=1)]
+    )
 
-print("Entraînement v2 terminé !")
\ No newline at end of file
+if checkpoint_callback.stopped:
+    print("Entraînement interrompu (SIGTERM) : checkpoint complet écrit, relancez le script pour reprendre.")
+else:
+    print("Entraînement v2 terminé !")
\ No newline at end of file
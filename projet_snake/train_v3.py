@@ -1,41 +1,62 @@
 import os
-import torch as th
-import torch.nn as nn
-from gymnasium import spaces
 from stable_baselines3 import PPO
-from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
-from stable_baselines3.common.callbacks import CheckpointCallback
+from stable_baselines3.common.buffers import RolloutBuffer
 from stable_baselines3.common.env_util import make_vec_env # <--- Pour la vectorisation
-from stable_baselines3.common.vec_env import SubprocVecEnv # <--- Vrai parallélisme
+from stable_baselines3.common.vec_env import SubprocVecEnv, VecMonitor # <--- Vrai parallélisme
 from envs.snake_env_cnn import SnakeEnvCnn
-
-# --- 1. Définition du Cerveau Custom (Inchangé) ---
-class CustomCNN(BaseFeaturesExtractor):
-    def __init__(self, observation_space: spaces.Box, features_dim: int = 256):
-        super(CustomCNN, self).__init__(observation_space, features_dim)
-        n_input_channels = observation_space.shape[0]
-        self.cnn = nn.Sequential(
-            nn.Conv2d(n_input_channels, 32, kernel_size=4, stride=1, padding=0),
-            nn.ReLU(),
-            nn.Conv2d(32, 64, kernel_size=4, stride=1, padding=0),
-            nn.ReLU(),
-            nn.Flatten(),
-        )
-        with th.no_grad():
-            n_flatten = self.cnn(
-                th.as_tensor(observation_space.sample()[None]).float()
-            ).shape[1]
-        self.linear = nn.Sequential(nn.Linear(n_flatten, features_dim), nn.ReLU())
-
-    def forward(self, observations: th.Tensor) -> th.Tensor:
-        return self.linear(self.cnn(observations))
+from envs.snake_vec_env import SnakeVecEnv
+from envs.shared_memory_vec_env import SharedMemoryVecEnv
+from envs.thread_vec_env import ThreadVecEnv
+from callbacks import TimingCallback, AsyncCheckpointCallback, CurriculumCallback
+from resume import find_resume_checkpoint, load_resumable, warn_resume_overrides
+from policies import CustomCNN, speed_up_policy  # Le cerveau custom, partagé avec les autres scripts
+from buffers import PackedRolloutBuffer, MemmapRolloutBuffer, PackedMemmapRolloutBuffer
 
 # --- CONFIGURATION MULTI-CPU ---
 # Sur un M2, vous avez 8 coeurs. En garder un ou deux pour le système est bien.
 # 4 à 8 environnements est idéal. Au-delà, le gain diminue.
 N_ENVS = 8  
 TIMESTEPS = 5000000 
+# True : toutes les parties tournent dans CE processus via SnakeVecEnv (NumPy vectorisé).
+# Plus de pickling ni de pipes, on peut alors monter N_ENVS à plusieurs centaines.
+BATCHED_ENV = False
+# Sinon, un processus par env. "SharedMemoryVecEnv" fait passer les observations par la
+# mémoire partagée au lieu de les pickler (utile si on agrandit la grille ou empile des images)
+# Sur un Python free-threaded (3.14t, sans GIL), "ThreadVecEnv" fait la même chose avec des threads
+VEC_ENV = "SubprocVecEnv"  # ou "SharedMemoryVecEnv", ou "ThreadVecEnv"
+VEC_ENV_CLASSES = {"SubprocVecEnv": SubprocVecEnv, "SharedMemoryVecEnv": SharedMemoryVecEnv,
+                   "ThreadVecEnv": ThreadVecEnv}
+# Nombre de grilles empilées dans chaque observation (K, 30, 30) : avec K > 1 le CNN voit
+# le mouvement. Empilées dans l'env (buffer circulaire), CustomCNN s'adapte tout seul.
+FRAME_STACK = 1
 SAVE_FREQ = 200000 
+FULL_EVERY = 5  # Une sauvegarde sur 5 avec l'optimiseur (reprise), les autres = poids seuls (évaluation)
+KEEP_LAST = 5   # On garde les 5 derniers checkpoints + le meilleur + le dernier complet
+# Politique pré-entraînée par behaviour cloning (generate_demos.py --obs grid puis
+# pretrain_bc.py --obs grid), ou None pour partir de zéro
+WARM_START = None  # ex: "SY23_V2/projet_snake/checkpoints/BC/snake_cnn_bc.zip"
+# True : reprend exactement depuis le dernier checkpoint complet de MODELS_DIR s'il y en a un
+# (poids, optimiseur, parties en cours, générateurs aléatoires, courbes TensorBoard).
+# Le modèle repris garde les réglages du checkpoint : WARM_START et les hyperparamètres modifiés
+# depuis sont ignorés (avec un avertissement). False par défaut : un nouveau lancement repart de zéro.
+RESUME = False
+# Curriculum : [(taille du plateau, score moyen pour passer au suivant), ..., (30, None)].
+# Les petits plateaux sont centrés dans l'observation 30x30, entourés de murs : même réseau.
+# ex: [(8, 8), (12, 12), (20, 16), (30, None)] ; None = toujours 30x30. Pas avec BATCHED_ENV (erreur).
+CURRICULUM = None
+TARGET_SCORE = 20  # Pas et temps pour atteindre ce score moyen sur 30x30 (TensorBoard, "curriculum/")
+STAGES = CURRICULUM or [(30, None)]
+# Accélérations du CNN pendant l'entraînement (policies.speed_up_policy), sans effet sur les checkpoints.
+# À mesurer avec TimingCallback avant de les garder : sur un seul coeur CPU, gain quasi nul.
+CHANNELS_LAST = False  # Convolutions en NHWC
+COMPILE = None         # Mode de torch.compile ("default", "reduce-overhead", "max-autotune") ou None
+# True : observations du rollout buffer à 2 bits par case au lieu d'un octet (4x moins de mémoire),
+# décodées à l'identique pour chaque minibatch : même apprentissage. Utile avec beaucoup d'envs / FRAME_STACK.
+PACKED_BUFFER = True
+# Dossier sur un disque local : le rollout buffer y vit en fichiers memmap au lieu de la RAM
+# (buffers.MemmapStorage), pour monter N_ENVS x n_steps au-delà de la mémoire. None = en RAM.
+MEMMAP_DIR = None     # ex: "/tmp" ou un SSD local
+PERSIST_ROLLOUTS = None  # Dossier où garder chaque rollout terminé (buffers.StoredRollout), avec MEMMAP_DIR
 
 # --- BLOCK MAIN OBLIGATOIRE SUR MAC ---
 if __name__ == "__main__":
@@ -49,44 +70,86 @@ if __name__ == "__main__":
     print(f"--- Démarrage sur {N_ENVS} environnements en parallèle ---")
 
     # 2. Création de l'environnement vectorisé
-    # Cela va lancer N_ENVS processus Python indépendants
-    env = make_vec_env(
-        SnakeEnvCnn, 
-        n_envs=N_ENVS, 
-        vec_env_cls=SubprocVecEnv # Utilise plusieurs coeurs CPU
-    )
+    if BATCHED_ENV:
+        if CURRICULUM:
+            raise ValueError("CURRICULUM avec BATCHED_ENV : SnakeVecEnv joue toujours sur 30x30")
+        env = VecMonitor(SnakeVecEnv(num_envs=N_ENVS, obs_type="grid", frame_stack=FRAME_STACK))
+    else:
+        # Cela va lancer N_ENVS processus Python indépendants
+        env = make_vec_env(
+            SnakeEnvCnn, 
+            n_envs=N_ENVS, 
+            env_kwargs=dict(frame_stack=FRAME_STACK, grid_size=STAGES[0][0], obs_size=STAGES[-1][0]),
+            vec_env_cls=VEC_ENV_CLASSES[VEC_ENV] # Utilise plusieurs coeurs CPU
+        )
 
-    checkpoint_callback = CheckpointCallback(
+    # Écriture en arrière-plan (poids copiés en mémoire, puis .zip écrit par un thread)
+    checkpoint_callback = AsyncCheckpointCallback(
         save_freq=max(SAVE_FREQ // N_ENVS, 1), # Ajustement de la fréquence car ça va plus vite
         save_path=MODELS_DIR,
-        name_prefix="snake_cnn"
+        name_prefix="snake_cnn",
+        full_every=FULL_EVERY,
+        keep_last=KEEP_LAST,
+        resumable=True  # SIGTERM -> checkpoint complet à la fin du rollout, puis arrêt propre
     )
 
     policy_kwargs = dict(
         features_extractor_class=CustomCNN,
         features_extractor_kwargs=dict(features_dim=256),
     )
+    if MEMMAP_DIR:
+        buffer_class = PackedMemmapRolloutBuffer if PACKED_BUFFER else MemmapRolloutBuffer
+        buffer_kwargs = dict(storage_dir=MEMMAP_DIR, persist_dir=PERSIST_ROLLOUTS)
+    else:
+        buffer_class = PackedRolloutBuffer if PACKED_BUFFER else RolloutBuffer
+        buffer_kwargs = {}
 
     # 3. Le Modèle
     # device="auto" va essayer d'utiliser le GPU (MPS) ou le CPU.
     # Souvent sur les petits CNN, le CPU est aussi rapide, mais le M2 gère bien le MPS.
-    model = PPO(
-        "CnnPolicy", 
-        env, 
-        verbose=1, 
-        tensorboard_log=LOG_DIR,
+    ppo_kwargs = dict(
         learning_rate=0.0003,
         policy_kwargs=policy_kwargs,
         batch_size=256, # On augmente le batch car on a plus de données
         n_steps=1024,   # Nombre de pas PAR environnement avant update (1024 * 8 données totales)
         gamma=0.99,
-        device="auto"   # Laisse SB3 choisir (souvent CPU sur Mac pour RL, ce qui est OK)
+        rollout_buffer_class=buffer_class,
+        rollout_buffer_kwargs=buffer_kwargs,
     )
+    resume_path = find_resume_checkpoint(MODELS_DIR, "snake_cnn") if RESUME else None
+    if resume_path:
+        model = load_resumable(resume_path, env, device="auto")
+        print(f"Reprise de l'entraînement depuis : {resume_path} ({model.num_timesteps} pas)")
+        warn_resume_overrides(model, WARM_START, **ppo_kwargs)
+    else:
+        model = PPO(
+            "CnnPolicy", 
+            env, 
+            verbose=1, 
+            tensorboard_log=LOG_DIR,
+            device="auto",  # Laisse SB3 choisir (souvent CPU sur Mac pour RL, ce qui est OK)
+            **ppo_kwargs
+        )
+        if WARM_START:
+            model.set_parameters(WARM_START)  # Même réseau : on part des poids appris sur l'expert
+            print(f"Politique initialisée depuis : {WARM_START}")
+    speed_up_policy(model.policy, channels_last=CHANNELS_LAST, compile_mode=COMPILE)
 
     print("Entraînement lancé... (Regardez le Moniteur d'activité, vos coeurs vont chauffer !)")
     
-    model.learn(total_timesteps=TIMESTEPS, callback=checkpoint_callback)
+    # TimingCallback : où passe le temps (envs, réseau, optimisation) -> TensorBoard, section "timing/"
+    # En reprise : seulement les pas restants, sur les mêmes courbes TensorBoard
+    with TimingCallback() as timing:  # Méthodes du modèle restaurées même si learn() plante
+        model.learn(
+            total_timesteps=TIMESTEPS - model.num_timesteps,
+            reset_num_timesteps=resume_path is None,
+            callback=[checkpoint_callback, timing,
+                      CurriculumCallback(STAGES, target_score=TARGET_SCORE, verbose=1)]
+        )
     
-    model.save(f"{MODELS_DIR}/snake_cnn_final")
-    print("Terminé.")
+    if checkpoint_callback.stopped:
+        print("Interrompu (SIGTERM) : checkpoint complet écrit, relancez le script pour reprendre.")
+    else:
+        model.save(f"{MODELS_DIR}/snake_cnn_final")
+        print("Terminé.")
     env.close() # Important de fermer les processus
\ No newline at end of file